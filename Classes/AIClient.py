@@ -0,0 +1,270 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from Classes.AssessmentBackend import create_backend
+
+
+class AIClient:
+    """
+    Cliente de IA compartilhado por todo o processo.
+
+    O provedor (Gemini ou servidor simulado) é escolhido uma única vez por
+    HIPAI_AI_BACKEND e fica em memória, reaproveitando autenticação e
+    conexão entre as avaliações de todas as telas. Registra separadamente o
+    tempo gasto com configuração (setup) e com inferência.
+    """
+    DEFAULT_MODEL = 'gemini-2.0-flash'
+    # Amostras mínimas de latência antes de usar o p95 para o hedge
+    MIN_HEDGE_SAMPLES = 20
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """Retorna a instância única do cliente"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, model_name=None, backend=None):
+        self.model_name = model_name or os.getenv('GEMINI_MODEL', self.DEFAULT_MODEL)
+        self.timeout = float(os.getenv('HIPAI_AI_TIMEOUT', '60'))
+        self.hedge = os.getenv('HIPAI_AI_HEDGE', '0') == '1'
+        self.backend = backend or create_backend(self.model_name, timeout=self.timeout)
+        # As chamadas rodam aqui para que o chamador possa desistir no prazo;
+        # uma chamada abandonada termina sozinha pelo timeout do provedor
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ai-call")
+        self._prepared = set()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+        self._outcomes = {}
+        self._calls = deque(maxlen=200)  # Tokens e latência por chamada
+        self._metrics = {
+            'setup_count': 0,
+            'setup_seconds': 0.0,
+            'inference_count': 0,
+            'inference_seconds': 0.0,
+            'ttft_count': 0,
+            'ttft_seconds': 0.0,
+            'errors': 0,
+        }
+
+    @property
+    def backend_name(self):
+        return self.backend.name
+
+    def _record(self, kind, seconds):
+        with self._lock:
+            self._metrics[f'{kind}_count'] += 1
+            self._metrics[f'{kind}_seconds'] += seconds
+
+    def is_available(self):
+        """Indica se o provedor está configurado (chave da API ou servidor simulado)"""
+        return self.backend.is_available()
+
+    def _prepare(self, model_name=None, system_instruction=None):
+        """Configura o provedor/modelo na primeira chamada, medindo o custo"""
+        key = (model_name or self.model_name, system_instruction)
+        if key in self._prepared:
+            return
+
+        started = time.perf_counter()
+        with self._lock:
+            if key not in self._prepared:
+                self.backend.prepare(key[0], system_instruction)
+                self._prepared.add(key)
+        self._record('setup', time.perf_counter() - started)
+
+    def warm_up(self, model_name=None, system_instruction=None):
+        """
+        Antecipa a configuração do provedor/modelo (importação do SDK,
+        autenticação) para que a primeira avaliação não pague esse custo.
+        Retorna False se o provedor não estiver disponível ou falhar.
+        """
+        if not self.is_available():
+            return False
+        try:
+            self._prepare(model_name, system_instruction)
+            return True
+        except Exception as e:
+            print(f"⚠️ Erro ao preparar o cliente de IA: {e}")
+            return False
+
+    def _record_call(self, usage, seconds, system_instruction):
+        """Guarda tokens e latência de uma chamada concluída"""
+        call = {
+            'prompt_tokens': usage.get('prompt_tokens'),
+            'output_tokens': usage.get('output_tokens'),
+            'cached_tokens': usage.get('cached_tokens'),
+            'seconds': seconds,
+            'system_instruction': system_instruction is not None,
+        }
+        with self._lock:
+            self._calls.append(call)
+
+    def latency_percentile(self, percentile):
+        """Percentil das latências recentes de chamadas bem-sucedidas (None sem amostras suficientes)"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < self.MIN_HEDGE_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def record_outcome(self, outcome, seconds=None):
+        """Registra o desfecho de uma chamada: ok, hedged, timeout, error ou cancelled"""
+        with self._lock:
+            self._outcomes[outcome] = self._outcomes.get(outcome, 0) + 1
+            if outcome in ('ok', 'hedged') and seconds is not None:
+                self._latencies.append(seconds)
+
+    def generate(self, prompt, model_name=None, response_schema=None, system_instruction=None, usage=None,
+                 timeout=None):
+        """
+        Envia o prompt e retorna o texto completo da resposta
+        (um JSON no formato de response_schema, se informado).
+        A system_instruction fixa é enviada separada do prompt da chamada.
+        Se usage for informado, recebe a contagem de tokens da resposta usada.
+
+        A chamada tem prazo de timeout segundos (padrão: HIPAI_AI_TIMEOUT) e
+        levanta TimeoutError quando ele se esgota. Com HIPAI_AI_HEDGE=1,
+        se a resposta passar do p95 das latências recentes, uma segunda
+        requisição idêntica é disparada e vale a que terminar primeiro.
+        """
+        self._prepare(model_name, system_instruction)
+
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+        deadline = started + timeout
+        hedge_at = None
+        if self.hedge:
+            p95 = self.latency_percentile(95)
+            if p95 is not None:
+                hedge_at = started + p95
+
+        usages = {}
+
+        def submit():
+            usage = {}
+            future = self._executor.submit(
+                self.backend.generate, prompt, model_name, response_schema, system_instruction, usage)
+            usages[future] = usage
+            return future
+
+        pending = [submit()]
+        hedge = None
+        try:
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    self.record_outcome('timeout')
+                    raise TimeoutError(f"A IA não respondeu em {timeout:.0f}s")
+
+                if hedge_at is not None and hedge is None and now >= hedge_at:
+                    hedge = submit()
+                    pending.append(hedge)
+
+                hedge_pending = hedge_at is not None and hedge is None
+                wait_until = min(deadline, hedge_at) if hedge_pending else deadline
+                done, _ = wait(pending, timeout=max(0.0, wait_until - now), return_when=FIRST_COMPLETED)
+
+                error = None
+                for future in done:
+                    pending.remove(future)
+                    if future.exception() is None:
+                        elapsed = time.perf_counter() - started
+                        self.record_outcome('hedged' if future is hedge else 'ok', elapsed)
+                        self._record_call(usages[future], elapsed, system_instruction)
+                        if usage is not None:
+                            usage.update(usages[future])
+                        return future.result()
+                    error = future.exception()
+
+                if error is not None and not pending:
+                    # Nenhuma tentativa restante (o hedge não substitui um retry em caso de erro)
+                    self.record_outcome('error')
+                    raise error
+        except Exception:
+            with self._lock:
+                self._metrics['errors'] += 1
+            raise
+        finally:
+            self._record('inference', time.perf_counter() - started)
+
+    def generate_stream(self, prompt, on_chunk, model_name=None, system_instruction=None, usage=None,
+                        timeout=None):
+        """
+        Envia o prompt em modo streaming, repassando cada trecho para
+        on_chunk à medida que chega. Retorna o texto completo ao final.
+        Sujeito ao mesmo prazo de generate(); não usa hedge.
+        """
+        self._prepare(model_name, system_instruction)
+        timeout = timeout or self.timeout
+
+        started = time.perf_counter()
+        parts = []
+        usage = {} if usage is None else usage
+        expired = threading.Event()
+
+        def consume():
+            for text in self.backend.stream(prompt, model_name, system_instruction, usage):
+                if expired.is_set():
+                    break  # Prazo esgotado: encerra o stream e descarta o restante
+                if not text:
+                    continue
+                if not parts:
+                    self._record('ttft', time.perf_counter() - started)
+                parts.append(text)
+                on_chunk(text)
+            return "".join(parts)
+
+        try:
+            future = self._executor.submit(consume)
+            if not wait([future], timeout=timeout).done:
+                expired.set()
+                self.record_outcome('timeout')
+                raise TimeoutError(f"A IA não respondeu em {timeout:.0f}s")
+            try:
+                result = future.result()
+            except Exception:
+                self.record_outcome('error')
+                raise
+            elapsed = time.perf_counter() - started
+            self.record_outcome('ok', elapsed)
+            self._record_call(usage, elapsed, system_instruction)
+            return result
+        except Exception:
+            with self._lock:
+                self._metrics['errors'] += 1
+            raise
+        finally:
+            self._record('inference', time.perf_counter() - started)
+
+    def metrics(self):
+        """Resumo do tempo gasto com setup versus inferência"""
+        with self._lock:
+            m = dict(self._metrics)
+        m['backend'] = self.backend_name
+        m['outcomes'] = dict(self._outcomes)
+        m['p50_seconds'] = self.latency_percentile(50)
+        m['p95_seconds'] = self.latency_percentile(95)
+
+        # Tokens de entrada/saída e latência, separando chamadas com e sem system instruction
+        with self._lock:
+            calls = list(self._calls)
+        for label, with_system in (('system', True), ('full_prompt', False)):
+            group = [c for c in calls if c['system_instruction'] == with_system]
+            m[f'{label}_calls'] = len(group)
+            for field in ('prompt_tokens', 'output_tokens', 'cached_tokens'):
+                values = [c[field] for c in group if c[field] is not None]
+                m[f'{label}_avg_{field}'] = sum(values) / len(values) if values else None
+            m[f'{label}_avg_seconds'] = sum(c['seconds'] for c in group) / len(group) if group else None
+        m['avg_setup_seconds'] = m['setup_seconds'] / m['setup_count'] if m['setup_count'] else 0.0
+        m['avg_inference_seconds'] = m['inference_seconds'] / m['inference_count'] if m['inference_count'] else 0.0
+        m['avg_ttft_seconds'] = m['ttft_seconds'] / m['ttft_count'] if m['ttft_count'] else 0.0
+        return m
@@ -0,0 +1,228 @@
+import os
+import re
+import json
+import urllib.error
+import urllib.request
+
+
+class TransientAIError(RuntimeError):
+    """Falha temporária da IA (indisponível, sobrecarregada); a chamada pode ser refeita depois"""
+
+
+class RateLimitError(TransientAIError):
+    """A IA recusou a chamada por limite de requisições (HTTP 429)"""
+
+
+class AssessmentBackend:
+    """
+    Interface dos provedores de IA usados nas avaliações.
+
+    Cada implementação recebe o prompt pronto (e, opcionalmente, a system
+    instruction fixa) e devolve o texto gerado; falhas são sinalizadas com
+    exceções (TransientAIError para falhas temporárias, RateLimitError para
+    limite de taxa). Se receber o dicionário usage, preenche 'prompt_tokens',
+    'output_tokens' e 'cached_tokens' quando o provedor informar.
+    """
+    name = "base"
+
+    def __init__(self, model_name, timeout=120):
+        self.model_name = model_name
+        self.timeout = timeout
+
+    def is_available(self):
+        """Indica se o provedor está configurado para receber chamadas"""
+        return True
+
+    def prepare(self, model_name=None, system_instruction=None):
+        """Configuração prévia (autenticação, criação do modelo); opcional"""
+
+    def generate(self, prompt, model_name=None, response_schema=None, system_instruction=None, usage=None):
+        """
+        Retorna o texto completo da resposta. Com response_schema, a resposta
+        é um JSON nesse formato.
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt, model_name=None, system_instruction=None, usage=None):
+        """Itera sobre os trechos da resposta; por padrão entrega tudo de uma vez"""
+        yield self.generate(prompt, model_name, system_instruction=system_instruction, usage=usage)
+
+
+class GeminiBackend(AssessmentBackend):
+    """Google Gemini via google.generativeai"""
+    name = "gemini"
+    # request_options (prazo por chamada), system_instruction e response_schema
+    MIN_SDK_VERSION = (0, 7)
+
+    def __init__(self, model_name, timeout=120):
+        super().__init__(model_name, timeout)
+        self._configured = False
+        self._models = {}
+
+    def is_available(self):
+        return bool(os.getenv("GEMINI_API_KEY"))
+
+    def prepare(self, model_name=None, system_instruction=None):
+        """
+        Configura a API na primeira chamada e mantém os modelos em memória,
+        um por combinação de modelo e system instruction.
+        """
+        import google.generativeai as genai
+
+        model_name = model_name or self.model_name
+        if not self._configured:
+            version = tuple(int(part) for part in re.findall(r"\d+", getattr(genai, "__version__", "0"))[:2])
+            if version < self.MIN_SDK_VERSION:
+                raise RuntimeError(
+                    f"google-generativeai {getattr(genai, '__version__', '?')} é antigo demais; "
+                    f"atualize com: pip install -r requirements.txt")
+            api_key = os.getenv("GEMINI_API_KEY")
+            if not api_key:
+                raise RuntimeError("GEMINI_API_KEY não configurada no ambiente.")
+            genai.configure(api_key=api_key)
+            self._configured = True
+
+        key = (model_name, system_instruction)
+        model = self._models.get(key)
+        if model is None:
+            # Sem system instruction (AI_SYSTEM_INSTRUCTION=0) o parâmetro não é enviado
+            options = {"system_instruction": system_instruction} if system_instruction else {}
+            model = genai.GenerativeModel(model_name, **options)
+            self._models[key] = model
+        return model
+
+    @staticmethod
+    def _fill_usage(response, usage):
+        """Contagem de tokens da resposta (usage_metadata, disponível a partir do SDK 0.7)"""
+        metadata = getattr(response, "usage_metadata", None)
+        if usage is None or metadata is None:
+            return
+        usage["prompt_tokens"] = getattr(metadata, "prompt_token_count", None)
+        usage["output_tokens"] = getattr(metadata, "candidates_token_count", None)
+        # Tokens do prefixo fixo atendidos pelo cache implícito do Gemini
+        usage["cached_tokens"] = getattr(metadata, "cached_content_token_count", None)
+
+    def _translate(self, error):
+        from google.api_core import exceptions as google_exceptions
+
+        if isinstance(error, google_exceptions.ResourceExhausted):
+            return RateLimitError(str(error))
+        if isinstance(error, (google_exceptions.ServiceUnavailable,
+                              google_exceptions.DeadlineExceeded,
+                              google_exceptions.InternalServerError)):
+            return TransientAIError(str(error))
+        if isinstance(error, OSError):
+            # Falha de transporte (sem rede, conexão recusada ou interrompida, prazo do socket)
+            return TransientAIError(f"Gemini inacessível: {error}")
+        return error
+
+    def generate(self, prompt, model_name=None, response_schema=None, system_instruction=None, usage=None):
+        model = self.prepare(model_name, system_instruction)
+        generation_config = None
+        if response_schema:
+            generation_config = {
+                "response_mime_type": "application/json",
+                "response_schema": response_schema,
+            }
+        try:
+            response = model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                request_options={"timeout": self.timeout}
+            )
+            self._fill_usage(response, usage)
+            return response.text
+        except Exception as e:
+            raise self._translate(e) from e
+
+    def stream(self, prompt, model_name=None, system_instruction=None, usage=None):
+        model = self.prepare(model_name, system_instruction)
+        try:
+            for chunk in model.generate_content(prompt, stream=True, request_options={"timeout": self.timeout}):
+                # O último trecho traz a contagem de tokens da chamada inteira
+                self._fill_usage(chunk, usage)
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            raise self._translate(e) from e
+
+
+class MockHTTPBackend(AssessmentBackend):
+    """
+    Servidor HTTP local (Classes/MockAIServer.py) que devolve relatórios
+    prontos, com latência e taxa de erros configuráveis no servidor.
+    """
+    name = "mock"
+
+    def __init__(self, model_name, timeout=120, url=None):
+        super().__init__(model_name, timeout)
+        self.url = (url or os.getenv("AI_MOCK_URL") or "http://127.0.0.1:8765").rstrip("/")
+
+    def _post(self, prompt, model_name, stream, structured=False, system_instruction=None):
+        payload = json.dumps({
+            "model": model_name or self.model_name,
+            "system": system_instruction,
+            "prompt": prompt,
+            "stream": stream,
+            "json": structured
+        }).encode()
+        request = urllib.request.Request(
+            self.url + "/generate",
+            data=payload,
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise RateLimitError("Limite de requisições da IA simulada atingido") from e
+            if e.code >= 500:
+                raise TransientAIError(f"IA simulada respondeu HTTP {e.code}") from e
+            raise RuntimeError(f"IA simulada respondeu HTTP {e.code}") from e
+        except OSError as e:
+            # URLError (servidor fora do ar, conexão recusada) ou prazo do socket esgotado
+            raise TransientAIError(f"IA simulada inacessível: {e}") from e
+
+    def generate(self, prompt, model_name=None, response_schema=None, system_instruction=None, usage=None):
+        try:
+            with self._post(prompt, model_name, False, bool(response_schema), system_instruction) as response:
+                body = json.loads(response.read().decode())
+        except OSError as e:
+            raise TransientAIError(f"Conexão com a IA simulada interrompida: {e}") from e
+        if usage is not None:
+            usage.update(body.get("usage") or {})
+        return body["text"]
+
+    def stream(self, prompt, model_name=None, system_instruction=None, usage=None):
+        # Uma linha JSON por trecho ({"text": ...}); a última traz "usage"
+        try:
+            with self._post(prompt, model_name, True, False, system_instruction) as response:
+                for line in response:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    body = json.loads(line.decode())
+                    if usage is not None and body.get("usage"):
+                        usage.update(body["usage"])
+                    if body.get("text"):
+                        yield body["text"]
+        except OSError as e:
+            raise TransientAIError(f"Conexão com a IA simulada interrompida: {e}") from e
+
+
+BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    MockHTTPBackend.name: MockHTTPBackend,
+}
+
+
+def create_backend(model_name, name=None, timeout=120):
+    """
+    Cria o provedor escolhido por HIPAI_AI_BACKEND ('gemini' ou 'mock').
+    Sem a variável, usa o mock se AI_MOCK_URL estiver definida.
+    """
+    name = name or os.getenv("HIPAI_AI_BACKEND") or ("mock" if os.getenv("AI_MOCK_URL") else "gemini")
+    backend_class = BACKENDS.get(name.strip().lower())
+    if backend_class is None:
+        raise ValueError(f"Backend de IA desconhecido: {name} (opções: {', '.join(BACKENDS)})")
+    return backend_class(model_name, timeout)
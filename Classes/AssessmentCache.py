@@ -0,0 +1,107 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+
+from Classes.Helpers import get_cache_dir
+
+
+def assessment_cache_key(data, model_name, prompt_version):
+    """
+    Hash canônico da avaliação: dados de entrada (sem o timestamp), modelo e
+    versão do prompt. Entradas iguais geram sempre a mesma chave.
+    """
+    canonical = json.dumps({
+        "avaliacaoagil": data.get("avaliacaoagil"),
+        "exames": data.get("exames"),
+        "model": model_name,
+        "prompt_version": prompt_version,
+    }, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class AssessmentCache:
+    """
+    Cache local (SQLite) de resultados da IA, endereçado pelo conteúdo.
+
+    Os resultados são criptografados com a chave do sistema, expiram após o
+    TTL e, ao passar do limite de entradas, as menos usadas recentemente são
+    descartadas.
+    """
+
+    def __init__(self, cipher, path=None, ttl_seconds=None, max_entries=None):
+        self.cipher = cipher
+        self.path = path or os.path.join(get_cache_dir(), "assessment_cache.sqlite3")
+        self.ttl_seconds = ttl_seconds or float(os.getenv('AI_CACHE_TTL_HOURS', '72')) * 3600
+        self.max_entries = max_entries or int(os.getenv('AI_CACHE_MAX_ENTRIES', '500'))
+        self.create_table()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create_table(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_results (
+                    cache_key TEXT PRIMARY KEY,
+                    result_encrypted TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_results_access ON ai_results(last_access)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get(self, cache_key):
+        """Retorna o resultado em cache ou None (ausente ou expirado)"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT result_encrypted, created_at FROM ai_results WHERE cache_key = ?",
+                (cache_key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM ai_results WHERE cache_key = ?", (cache_key,))
+                conn.commit()
+                return None
+
+            conn.execute("UPDATE ai_results SET last_access = ? WHERE cache_key = ?", (now, cache_key))
+            conn.commit()
+        finally:
+            conn.close()
+
+        try:
+            return self.cipher.decrypt(row[0].encode()).decode()
+        except Exception as e:
+            print(f"❌ Erro ao ler cache de avaliações: {e}")
+            return None
+
+    def put(self, cache_key, ai_result):
+        """Armazena um resultado e aplica expiração e limite de tamanho"""
+        now = time.time()
+        encrypted = self.cipher.encrypt(ai_result.encode()).decode()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_results (cache_key, result_encrypted, created_at, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (cache_key, encrypted, now, now)
+            )
+            conn.execute("DELETE FROM ai_results WHERE created_at < ?", (now - self.ttl_seconds,))
+            # Despejo LRU: mantém apenas as entradas acessadas mais recentemente
+            conn.execute("""
+                DELETE FROM ai_results WHERE cache_key NOT IN (
+                    SELECT cache_key FROM ai_results ORDER BY last_access DESC LIMIT ?
+                )
+            """, (self.max_entries,))
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,151 @@
+import os
+import time
+import threading
+import itertools
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class AssessmentJob(QRunnable):
+    """
+    Avaliação enfileirada no pool compartilhado.
+
+    Carrega os dados de entrada e metadados livres (ex.: paciente), para que
+    quem recebe o resultado saiba a que pedido ele pertence.
+    """
+
+    def __init__(self, queue, job_id, data, ai_function, stream=False, meta=None):
+        super().__init__()
+        self.setAutoDelete(False)  # A fila mantém a referência até o fim
+        self.queue = queue
+        self.job_id = job_id
+        self.data = data
+        self.ai_function = ai_function
+        self.stream = stream
+        self.meta = meta or {}
+        self.cancel_event = threading.Event()
+        self.submitted_at = time.perf_counter()
+        self.started_at = None
+
+    def cancel(self):
+        """Pede para a avaliação deixar de aguardar a IA (thread-safe)"""
+        self.cancel_event.set()
+
+    def run(self):
+        self.queue._job_started(self)
+        try:
+            on_chunk = (lambda text: self.queue.job_chunk.emit(self.job_id, text)) if self.stream else None
+            on_status = lambda position: self.queue.job_status.emit(self.job_id, position)
+            resultado = self.ai_function(
+                self.data, on_chunk=on_chunk, cancel_event=self.cancel_event, on_status=on_status)
+        except Exception as e:
+            print(f"Erro no worker de avaliação: {e}")
+            resultado = f"Erro ao processar avaliação: {e}"
+        self.queue._job_finished(self, resultado)
+
+
+class AssessmentQueue(QObject):
+    """
+    Fila única de avaliações da IA, executadas em um QThreadPool compartilhado.
+
+    Substitui a criação de uma QThread por clique: cada pedido recebe um ID,
+    a fila tem tamanho máximo (HIPAI_AI_QUEUE_SIZE) e o número de avaliações
+    simultâneas é limitado (HIPAI_AI_WORKERS). Os resultados chegam pelo
+    sinal job_finished à medida que terminam, e a profundidade da fila e o
+    tempo de espera ficam disponíveis em metrics().
+    """
+    job_started = pyqtSignal(int)
+    job_chunk = pyqtSignal(int, str)
+    job_status = pyqtSignal(int, int)       # ID e posição na fila do agendador da IA (0 = enviado)
+    job_finished = pyqtSignal(int, object)  # ID e resultado ({'text', 'json'} ou mensagem de erro)
+    depth_changed = pyqtSignal(int, int)    # Aguardando, em execução
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """Retorna a fila compartilhada (criar na thread da interface)"""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, max_workers=None, max_pending=None):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_workers or int(os.getenv('HIPAI_AI_WORKERS', '4')))
+        self.max_pending = max_pending or int(os.getenv('HIPAI_AI_QUEUE_SIZE', '20'))
+
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._waiting = 0
+        self._running = 0
+        self._wait_count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, data, ai_function, stream=False, meta=None):
+        """
+        Enfileira uma avaliação e retorna o job (com job_id), ou None se a
+        fila estiver cheia.
+        """
+        with self._lock:
+            if self._waiting >= self.max_pending:
+                return None
+            job = AssessmentJob(self, next(self._ids), data, ai_function, stream, meta)
+            self._jobs[job.job_id] = job
+            self._waiting += 1
+        self._emit_depth()
+        self.pool.start(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancela um job: se ainda não começou, sai da fila; se já começou, deixa de aguardar a IA"""
+        job = self.get(job_id)
+        if job is None:
+            return
+        job.cancel()
+        if self.pool.tryTake(job):
+            with self._lock:
+                self._jobs.pop(job_id, None)
+                self._waiting -= 1
+            self._emit_depth()
+
+    def _job_started(self, job):
+        job.started_at = time.perf_counter()
+        waited = job.started_at - job.submitted_at
+        with self._lock:
+            self._waiting -= 1
+            self._running += 1
+            self._wait_count += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        self.job_started.emit(job.job_id)
+        self._emit_depth()
+
+    def _job_finished(self, job, resultado):
+        with self._lock:
+            self._jobs.pop(job.job_id, None)
+            self._running -= 1
+        self.job_finished.emit(job.job_id, resultado)
+        self._emit_depth()
+
+    def _emit_depth(self):
+        with self._lock:
+            waiting, running = self._waiting, self._running
+        self.depth_changed.emit(waiting, running)
+
+    def metrics(self):
+        """Profundidade da fila e tempos de espera até o início da execução"""
+        with self._lock:
+            return {
+                'waiting': self._waiting,
+                'running': self._running,
+                'max_workers': self.pool.maxThreadCount(),
+                'max_pending': self.max_pending,
+                'avg_wait_seconds': self._wait_total / self._wait_count if self._wait_count else 0.0,
+                'max_wait_seconds': self._wait_max,
+            }
@@ -0,0 +1,679 @@
+import os
+import re
+import json
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import Future, wait
+
+from Classes.AIClient import AIClient
+from Classes.AssessmentBackend import RateLimitError, TransientAIError
+from Classes.AssessmentCache import assessment_cache_key
+from Classes.RequestScheduler import RequestScheduler, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from Classes.RiskScoreEngine import RiskScoreEngine
+
+# Incrementar sempre que o prompt mudar: invalida o cache de avaliações
+PROMPT_VERSION = "2"
+
+# Resposta em JSON (pontuação, nível, fatores e recomendações) em vez de texto livre
+AI_STRUCTURED_OUTPUT = os.getenv("AI_STRUCTURED_OUTPUT", "0") == "1"
+
+# Tokens de saída esperados por avaliação, para a reserva no agendador (tokens/min)
+EXPECTED_OUTPUT_TOKENS = 700
+
+# Novas tentativas após recusa por limite de taxa (429)
+AI_RATE_LIMIT_RETRIES = int(os.getenv("AI_RATE_LIMIT_RETRIES", "3"))
+
+# Envia as instruções fixas como system instruction (0 = tudo no prompt, para comparação)
+AI_SYSTEM_INSTRUCTION = os.getenv("AI_SYSTEM_INSTRUCTION", "1") != "0"
+
+# Cadeia de modelos com prazo próprio em segundos, do principal ao mais leve;
+# "local" usa o motor de regras, sem IA. Ex.: gemini-2.0-flash:20,gemini-2.0-flash-lite:10,local
+# Sem a variável, só o modelo do cliente com o prazo HIPAI_AI_TIMEOUT (comportamento anterior)
+AI_MODEL_CHAIN = os.getenv("AI_MODEL_CHAIN", "")
+
+# Nome do "modelo" das avaliações feitas pelo motor de regras local
+LOCAL_MODEL = "local"
+
+RISK_LEVELS = ["BAIXO", "MODERADO", "ALTO", "MUITO ALTO"]
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer"},
+        "level": {"type": "string", "enum": RISK_LEVELS},
+        "risk_factors": {"type": "array", "items": {"type": "string"}},
+        "recommendations": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["score", "level", "risk_factors", "recommendations"],
+}
+
+
+def calculate_age(birth_date):
+    """Calcula idade a partir da data de nascimento"""
+    if not birth_date:
+        return 0
+    today = datetime.now()
+    return today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+
+
+# --- PROMPT PRÉ-COMPILADO ---
+# A parte fixa (papel, instruções, formato e orientações gerais) vai como
+# system instruction, montada uma única vez; a cada chamada só é enviado o
+# bloco com os dados do paciente.
+
+_INTRO = (
+    "Você é um especialista em cardiologia e medicina preventiva. Analise os dados do "
+    "paciente e forneça uma avaliação de risco de hipertensão seguindo EXATAMENTE o "
+    "formato especificado abaixo."
+)
+
+_INSTRUCTIONS = """INSTRUÇÕES PARA AVALIAÇÃO:
+=========================
+1. Analise todos os fatores de risco para hipertensão presentes nos dados.
+2. Calcule uma pontuação de risco (0-100) e classifique (BAIXO, MODERADO, ALTO, MUITO ALTO).
+3. Forneça recomendações específicas."""
+
+SYSTEM_INSTRUCTION = f"""{_INTRO}
+
+{_INSTRUCTIONS}
+
+FORMATO DE RESPOSTA OBRIGATÓRIO:
+===============================
+🏥 RELATÓRIO DE AVALIAÇÃO DE RISCO DE HIPERTENSÃO
+
+📊 PONTUAÇÃO DE RISCO: [pontuação] pontos
+🎯 NÍVEL DE RISCO: [BAIXO/MODERADO/ALTO/MUITO ALTO]
+
+⚠️ FATORES DE RISCO IDENTIFICADOS:
+[Liste numericamente cada fator de risco encontrado, um por linha]
+
+💡 RECOMENDAÇÕES:
+[Recomendações específicas baseadas no perfil do paciente]
+
+📝 ORIENTAÇÕES GERAIS:
+• Manter pressão arterial abaixo de 120/80 mmHg
+• Praticar exercícios regulares (mínimo 150min/semana)
+• Manter dieta rica em frutas, vegetais e pobre em sódio
+• Controlar peso corporal (IMC < 25)
+• Evitar tabagismo e consumo excessivo de álcool
+• Gerenciar níveis de estresse
+• Manter qualidade adequada do sono
+
+IMPORTANTE: Esta avaliação é apenas informativa. 
+Consulte sempre um médico para diagnóstico e tratamento adequados.
+
+RESPONDA APENAS COM O RELATÓRIO NO FORMATO ESPECIFICADO ACIMA."""
+
+STRUCTURED_SYSTEM_INSTRUCTION = f"""{_INTRO}
+
+{_INSTRUCTIONS}
+
+FORMATO DE RESPOSTA OBRIGATÓRIO:
+===============================
+Responda APENAS com um objeto JSON com os campos:
+- "score": pontuação de risco (inteiro de 0 a 100)
+- "level": "BAIXO", "MODERADO", "ALTO" ou "MUITO ALTO"
+- "risk_factors": lista com cada fator de risco encontrado
+- "recommendations": lista de recomendações específicas baseadas no perfil do paciente"""
+
+_PATIENT_TEMPLATE = """DADOS DO PACIENTE:
+=================
+
+DADOS DEMOGRÁFICOS E ESTILO de VIDA:
+• Idade: {idade} anos
+• Sexo: {sexo}
+• Histórico familiar de hipertensão: {historico}
+• Altura: {altura} cm
+• Peso: {peso} kg
+• IMC: {imc}
+• Porções de frutas/vegetais por dia: {frutas}
+• Minutos de exercício por semana: {exercicio}
+• Fuma atualmente: {fuma}
+• Bebidas alcoólicas por semana: {alcool}
+• Nível de estresse (0-10): {estresse}
+• Qualidade do sono ruim: {sono}
+
+EXAMES LABORATORIAIS:
+{exames}
+"""
+
+_EXAMS_TEMPLATE = """• Colesterol LDL: {colesterol_ldl_mg_dL} mg/dL
+• Colesterol HDL: {colesterol_hdl_mg_dL} mg/dL
+• Triglicerídeos: {triglicerideos_mg_dL} mg/dL
+• Glicemia de jejum: {glicemia_jejum_mg_dL} mg/dL
+• HbA1c: {hba1c_percent}%
+• Creatinina: {creatinina_mg_dL} mg/dL
+• Proteinúria: {proteinuria}
+• Diagnóstico de apneia do sono: {apneia}
+• Cortisol sérico: {cortisol_serico_ug_dL} μg/dL
+• Mutação genética para hipertensão: {mutacao}
+• BPM em repouso: {bpm_repouso}
+• Índice PM2.5: {indice_pm25}"""
+
+_EXAM_VALUE_FIELDS = [
+    "colesterol_ldl_mg_dL", "colesterol_hdl_mg_dL", "triglicerideos_mg_dL",
+    "glicemia_jejum_mg_dL", "hba1c_percent", "creatinina_mg_dL",
+    "cortisol_serico_ug_dL", "bpm_repouso", "indice_pm25",
+]
+
+
+def parse_model_chain(spec, default_model, default_budget):
+    """
+    Converte "modelo:segundos,modelo,local" em [(modelo, prazo), ...].
+    Modelos sem prazo usam default_budget; a cadeia vazia vira [(default_model, default_budget)].
+    """
+    chain = []
+    for entry in (spec or "").split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        model, _, budget = entry.partition(":")
+        try:
+            budget = float(budget) if budget.strip() else default_budget
+        except ValueError:
+            raise ValueError(f"Prazo inválido na cadeia de modelos: {entry}")
+        chain.append((model.strip(), None if model.strip() == LOCAL_MODEL else budget))
+    return chain or [(default_model, default_budget)]
+
+
+def _yes_no(value):
+    return 'Sim' if value else 'Não'
+
+
+def build_patient_block(data):
+    """Monta o trecho variável do prompt com os dados do paciente ('avaliacaoagil' e 'exames')"""
+    auto = data["avaliacaoagil"]
+    exames = data.get("exames")
+    
+    imc = None
+    if auto["altura_cm"] > 0 and auto["peso_kg"] > 0:
+        imc = auto["peso_kg"] / ((auto["altura_cm"]/100) ** 2)
+
+    if exames:
+        exam_values = {f: exames.get(f) or 'Não informado' for f in _EXAM_VALUE_FIELDS}
+        exames_str = _EXAMS_TEMPLATE.format(
+            proteinuria='Positiva' if exames.get('proteinuria_positiva', False) else 'Negativa',
+            apneia=_yes_no(exames.get('diagnostico_apneia_sono', False)),
+            mutacao=_yes_no(exames.get('mutacao_genetica_hipertensao', False)),
+            **exam_values
+        )
+    else:
+        exames_str = "Não foram fornecidos exames laboratoriais."
+
+    return _PATIENT_TEMPLATE.format(
+        idade=auto['idade_anos'],
+        sexo='Masculino' if auto['sexo_masculino'] else 'Feminino',
+        historico=_yes_no(auto['historico_familiar_hipertensao']),
+        altura=auto['altura_cm'],
+        peso=auto['peso_kg'],
+        imc=f"{imc:.1f}" if imc else "Não calculado",
+        frutas=auto['porcoes_frutas_vegetais_dia'],
+        exercicio=auto['minutos_exercicio_semana'],
+        fuma=_yes_no(auto['fuma_atualmente']),
+        alcool=auto['bebidas_alcoolicas_semana'],
+        estresse=auto['nivel_estresse_0_10'],
+        sono=_yes_no(auto['sono_qualidade_ruim']),
+        exames=exames_str,
+    )
+
+
+def compile_prompt(data, structured=False):
+    """
+    Retorna (system_instruction, prompt): a instrução fixa pré-montada e o
+    bloco do paciente. Com AI_SYSTEM_INSTRUCTION=0 tudo vai no prompt, para
+    comparar tokens e latência com o envio completo.
+    """
+    system_instruction = STRUCTURED_SYSTEM_INSTRUCTION if structured else SYSTEM_INSTRUCTION
+    prompt = build_patient_block(data)
+    if not AI_SYSTEM_INSTRUCTION:
+        return None, f"{system_instruction}\n\n{prompt}"
+    return system_instruction, prompt
+
+
+def parse_structured_result(text):
+    """Valida e normaliza a resposta JSON da IA; levanta ValueError se inválida"""
+    try:
+        result = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f"Resposta da IA não é um JSON válido: {e}") from e
+
+    level = str(result.get("level", "")).strip().upper()
+    if level not in RISK_LEVELS:
+        raise ValueError(f"Nível de risco inválido na resposta da IA: {result.get('level')}")
+
+    return {
+        "score": max(0, min(100, int(result.get("score", 0)))),
+        "level": level,
+        "risk_factors": [str(f) for f in result.get("risk_factors") or []],
+        "recommendations": [str(r) for r in result.get("recommendations") or []],
+    }
+
+
+# A data não vai no prompt: o texto da IA fica no cache e é reaproveitado em outros dias
+_DATE_LINE = re.compile(r"^⏰ Data da Avaliação:.*$", re.MULTILINE)
+
+
+def assessment_time(data):
+    """Momento da avaliação: o 'timestamp' (ISO) das entradas ou, na falta dele, agora"""
+    try:
+        return datetime.fromisoformat(data["timestamp"])
+    except (KeyError, TypeError, ValueError):
+        return datetime.now()
+
+
+def stamp_assessment_date(text, assessed_at):
+    """
+    Grava no relatório em texto a data da avaliação, substituindo a linha
+    "⏰ Data da Avaliação" se já existir ou inserindo-a antes do aviso final
+    """
+    line = f"⏰ Data da Avaliação: {assessed_at.strftime('%d/%m/%Y %H:%M')}"
+    if _DATE_LINE.search(text):
+        return _DATE_LINE.sub(lambda _: line, text, count=1)
+    head, marker, tail = text.rpartition("IMPORTANTE:")
+    if not marker:
+        return f"{text.rstrip()}\n\n{line}\n"
+    return f"{head.rstrip()}\n\n{line}\n\n{marker}{tail}"
+
+
+def render_structured_result(result, assessed_at=None):
+    """Gera o texto do relatório (mesmo formato do modo texto) a partir do JSON"""
+    assessed_at = assessed_at or datetime.now()
+    factors = "\n".join(f"{i}. {f}" for i, f in enumerate(result["risk_factors"], 1)) or "Nenhum fator de risco relevante identificado."
+    recommendations = "\n".join(f"• {r}" for r in result["recommendations"])
+
+    return f"""🏥 RELATÓRIO DE AVALIAÇÃO DE RISCO DE HIPERTENSÃO
+
+📊 PONTUAÇÃO DE RISCO: {result['score']} pontos
+🎯 NÍVEL DE RISCO: {result['level']}
+
+⚠️ FATORES DE RISCO IDENTIFICADOS:
+{factors}
+
+💡 RECOMENDAÇÕES:
+{recommendations}
+
+📝 ORIENTAÇÕES GERAIS:
+• Manter pressão arterial abaixo de 120/80 mmHg
+• Praticar exercícios regulares (mínimo 150min/semana)
+• Manter dieta rica em frutas, vegetais e pobre em sódio
+• Controlar peso corporal (IMC < 25)
+• Evitar tabagismo e consumo excessivo de álcool
+• Gerenciar níveis de estresse
+• Manter qualidade adequada do sono
+
+⏰ Data da Avaliação: {assessed_at.strftime('%d/%m/%Y %H:%M')}
+
+IMPORTANTE: Esta avaliação é apenas informativa. 
+Consulte sempre um médico para diagnóstico e tratamento adequados.
+"""
+
+
+def local_result(data):
+    """
+    Avaliação pelo motor de regras local (RiskScoreEngine), no mesmo formato
+    do modo estruturado; último recurso quando nenhum modelo responde no prazo.
+    """
+    prescore = RiskScoreEngine.score(data)
+    result_json = {
+        "score": prescore["score"],
+        "level": prescore["level"],
+        "risk_factors": prescore["factors"],
+        "recommendations": [
+            "Avaliação gerada pelas regras locais porque a IA não respondeu a tempo; "
+            "refaça a avaliação completa quando a IA estiver disponível."
+        ],
+    }
+    return {"text": render_structured_result(result_json, assessment_time(data)), "json": result_json,
+            "model": LOCAL_MODEL, "prompt_version": None}
+
+
+def build_report_data(data, result):
+    """
+    Monta o report_data salvo no banco: entradas, texto do relatório, modelo
+    e versão do prompt que o produziram (usados para identificar relatórios
+    desatualizados) e, no modo estruturado, o JSON.
+    """
+    report_data = {
+        "input_data": data,
+        "ai_result": result["text"],
+        "ai_model": result.get("model"),
+        "prompt_version": result.get("prompt_version"),
+    }
+    if result.get("json"):
+        report_data["ai_result_json"] = result["json"]
+    return report_data
+
+
+class AssessmentCancelled(Exception):
+    """O chamador desistiu de aguardar a avaliação"""
+
+
+class InFlightAssessment:
+    """
+    Avaliação em andamento compartilhada por chamadas com as mesmas entradas.
+
+    Quem inicia a chamada publica os trechos recebidos e a posição na fila do
+    agendador; quem chega depois recebe o que já foi publicado e passa a
+    acompanhar o restante. O resultado final (ou a exceção) fica no future.
+    """
+
+    def __init__(self):
+        self.future = Future()
+        self.usage = {}  # Tokens da chamada à IA (preenchido ao final)
+        self.parts = []
+        self.position = None
+        self.listeners = []
+        self.status_listeners = []
+        self.waiters = 0
+        self.lock = threading.Lock()
+
+    def subscribe(self, on_chunk=None, on_status=None):
+        with self.lock:
+            self.waiters += 1
+            if on_chunk:
+                for part in self.parts:
+                    on_chunk(part)
+                self.listeners.append(on_chunk)
+            if on_status:
+                if self.position is not None:
+                    on_status(self.position)
+                self.status_listeners.append(on_status)
+
+    def unsubscribe(self, on_chunk=None, on_status=None):
+        with self.lock:
+            self.waiters -= 1
+            if on_chunk in self.listeners:
+                self.listeners.remove(on_chunk)
+            if on_status in self.status_listeners:
+                self.status_listeners.remove(on_status)
+
+    def abandoned(self):
+        """Ninguém mais aguarda o resultado"""
+        with self.lock:
+            return self.waiters <= 0
+
+    def publish(self, chunk):
+        with self.lock:
+            self.parts.append(chunk)
+            for listener in self.listeners:
+                listener(chunk)
+
+    def publish_status(self, position):
+        """Posição na fila do agendador (0 = enviada à IA)"""
+        with self.lock:
+            self.position = position
+            for listener in self.status_listeners:
+                listener(position)
+
+
+# Avaliações em andamento no processo, por chave canônica (ver cache_key)
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+class AssessmentService:
+    """
+    Executa avaliações de risco pela IA sem depender da interface gráfica.
+
+    Usado tanto pela tela de avaliação quanto pelo processamento em lote:
+    monta o prompt, consulta o cache de resultados e chama o cliente
+    compartilhado da IA. O resultado é um dicionário {'text', 'json', 'model',
+    'prompt_version'}: 'json' só é preenchido no modo estruturado
+    (AI_STRUCTURED_OUTPUT=1), em que o texto do relatório é gerado localmente
+    a partir do JSON, e 'model' indica qual modelo da cadeia (AI_MODEL_CHAIN)
+    produziu o resultado.
+    """
+
+    def __init__(self, cache=None, client=None, structured=None, scheduler=None, telemetry=None,
+                 model_chain=None):
+        self.cache = cache
+        self.client = client or AIClient.instance()
+        self.scheduler = scheduler or RequestScheduler.instance()
+        self.telemetry = telemetry
+        self.structured = AI_STRUCTURED_OUTPUT if structured is None else structured
+        self.model_chain = model_chain or parse_model_chain(
+            AI_MODEL_CHAIN, self.client.model_name, self.client.timeout)
+
+    @property
+    def primary_model(self):
+        return self.model_chain[0][0]
+
+    @property
+    def prompt_version(self):
+        return f"{PROMPT_VERSION}-json" if self.structured else PROMPT_VERSION
+
+    def cache_key(self, data):
+        # Só o modelo principal grava no cache: um resultado de fallback não substitui o completo
+        return assessment_cache_key(data, self.primary_model, self.prompt_version)
+
+    def _to_result(self, raw, model, assessed_at):
+        """
+        Converte a resposta bruta (texto ou JSON) no resultado {'text', 'json',
+        'model', 'prompt_version'}, com a data da avaliação gravada localmente
+        """
+        if not self.structured:
+            return {"text": stamp_assessment_date(raw, assessed_at), "json": None, "model": model,
+                    "prompt_version": self.prompt_version}
+        result_json = parse_structured_result(raw)
+        return {"text": render_structured_result(result_json, assessed_at), "json": result_json, "model": model,
+                "prompt_version": self.prompt_version}
+
+    def estimate_tokens(self, data):
+        """Estimativa (entrada, saída) de tokens de uma avaliação: ~4 caracteres por token"""
+        system_instruction, prompt = compile_prompt(data, self.structured)
+        return (len(system_instruction or "") + len(prompt)) // 4, EXPECTED_OUTPUT_TOKENS
+
+    def cached_result(self, data, user_id=None):
+        """Resultado já calculado para as mesmas entradas, ou None"""
+        if self.cache is None:
+            return None
+        started = time.time()
+        raw = self.cache.get(self.cache_key(data))
+        if raw is None:
+            return None
+        try:
+            result = self._to_result(raw, self.primary_model, assessment_time(data))
+        except ValueError:
+            return None
+        self._record_telemetry(started, user_id=user_id, source='interactive', cache_hit=True)
+        return result
+
+    def _record_telemetry(self, started, **call):
+        """Registra uma chamada no armazenamento de telemetria, se configurado"""
+        if self.telemetry is None:
+            return
+        call.setdefault('model', self.primary_model)
+        self.telemetry.record(
+            started_at=started,
+            ended_at=time.time(),
+            backend=self.client.backend_name,
+            **call
+        )
+
+    def warm_up(self):
+        """Prepara o cliente de IA para os modelos da cadeia, com a mesma system instruction das avaliações"""
+        system_instruction = STRUCTURED_SYSTEM_INSTRUCTION if self.structured else SYSTEM_INSTRUCTION
+        system_instruction = system_instruction if AI_SYSTEM_INSTRUCTION else None
+        ready = False
+        for model, _ in self.model_chain:
+            if model != LOCAL_MODEL:
+                ready = self.client.warm_up(model, system_instruction) or ready
+        return ready
+
+    def assess(self, data, on_chunk=None, cancel_event=None, on_status=None, priority=PRIORITY_INTERACTIVE,
+               user_id=None):
+        """
+        Avalia os dados e retorna {'text', 'json'}.
+        Levanta exceção em caso de falha (chave ausente, erro de rede ou da
+        API, prazo esgotado) e AssessmentCancelled se cancel_event for
+        acionado antes do fim.
+
+        Chamadas simultâneas com as mesmas entradas (mesma chave canônica)
+        compartilham uma única requisição à IA; cada chamador recebe seu
+        próprio resultado e, em streaming, os mesmos trechos. A requisição
+        roda em segundo plano: quem cancela apenas deixa de aguardar, e o
+        resultado ainda é gravado no cache para os demais.
+
+        A requisição passa pelo agendador com a prioridade informada;
+        on_status(posição) acompanha a posição na fila (0 = enviada).
+        Cada chamada é registrada na telemetria (user_id identifica o médico).
+
+        Os modelos de AI_MODEL_CHAIN são tentados em ordem: quando um deles
+        esgota o prazo, fica indisponível ou recusa por limite de taxa, a
+        avaliação passa para o seguinte (possivelmente o motor de regras local).
+        """
+        if not self.client.is_available() and self.model_chain[-1][0] != LOCAL_MODEL:
+            raise RuntimeError("GEMINI_API_KEY não configurada no ambiente.")
+
+        started = time.time()
+        first_chunk = []
+        if on_chunk:
+            # Tempo até o primeiro trecho, medido do ponto de vista deste chamador
+            user_on_chunk = on_chunk
+
+            def on_chunk(text):
+                if not first_chunk:
+                    first_chunk.append(time.time() - started)
+                user_on_chunk(text)
+
+        key = self.cache_key(data)
+        with _in_flight_lock:
+            in_flight = _in_flight.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = InFlightAssessment()
+                _in_flight[key] = in_flight
+            # Inscreve antes de liberar o lock: a entrada não some sem este chamador
+            in_flight.subscribe(on_chunk, on_status)
+
+        if leader:
+            threading.Thread(
+                target=self._run_in_flight,
+                args=(key, data, in_flight, bool(on_chunk), priority),
+                daemon=True
+            ).start()
+        else:
+            print("↪️ Avaliação idêntica já em andamento: aguardando o mesmo resultado")
+
+        error = None
+        model = None
+        try:
+            while not wait([in_flight.future], timeout=0.1).done:
+                if cancel_event is not None and cancel_event.is_set():
+                    self.client.record_outcome('cancelled')
+                    raise AssessmentCancelled("Avaliação cancelada pelo usuário")
+            result = dict(in_flight.future.result())
+            # A requisição pode ter sido de outro chamador (agrupada): a data é a destas entradas
+            result["text"] = stamp_assessment_date(result["text"], assessment_time(data))
+            model = result.get("model")
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            in_flight.unsubscribe(on_chunk, on_status)
+            # Chamadas agrupadas não consomem tokens: só quem fez a requisição os registra
+            usage = in_flight.usage if leader else {}
+            self._record_telemetry(
+                started,
+                ttft_seconds=first_chunk[0] if first_chunk else None,
+                input_tokens=usage.get('prompt_tokens'),
+                output_tokens=usage.get('output_tokens'),
+                cached_tokens=usage.get('cached_tokens'),
+                model=model or self.primary_model,
+                coalesced=not leader,
+                error_class=type(error).__name__ if error else None,
+                user_id=user_id,
+                source='batch' if priority == PRIORITY_BATCH else 'interactive',
+            )
+
+    def _run_in_flight(self, key, data, in_flight, stream, priority):
+        """Executa a requisição compartilhada e publica o resultado no future"""
+        try:
+            result = self._request(data, in_flight.publish if stream else None, priority, in_flight)
+            in_flight.future.set_result(result)
+        except Exception as e:
+            in_flight.future.set_exception(e)
+        finally:
+            with _in_flight_lock:
+                _in_flight.pop(key, None)
+
+    def _request(self, data, on_chunk=None, priority=PRIORITY_INTERACTIVE, in_flight=None):
+        """
+        Percorre a cadeia de modelos até um deles responder no prazo e grava
+        no cache o resultado do modelo principal
+        """
+        system_instruction, prompt = compile_prompt(data, self.structured)
+        # Mesma estimativa de estimate_tokens(), sem montar o prompt de novo
+        estimated_tokens = (len(system_instruction or "") + len(prompt)) // 4 + EXPECTED_OUTPUT_TOKENS
+
+        for index, (model, budget) in enumerate(self.model_chain):
+            if model == LOCAL_MODEL:
+                return local_result(data)
+
+            last = index == len(self.model_chain) - 1
+            if not self.client.is_available() and not last:
+                continue  # Sem chave da API: direto para o motor de regras
+            try:
+                raw = self._call_model(
+                    model, budget, prompt, system_instruction, estimated_tokens,
+                    on_chunk, priority, in_flight, retry_rate_limit=last
+                )
+            except (TimeoutError, TransientAIError) as e:
+                if last:
+                    raise
+                print(f"⏭️ Modelo {model} não respondeu ({e}); tentando {self.model_chain[index + 1][0]}")
+                # Os trechos já exibidos são substituídos pelo resultado final;
+                # o modelo seguinte responde de uma vez, sem streaming
+                on_chunk = None
+                continue
+
+            result = self._to_result(raw, model, assessment_time(data))
+            if self.cache is not None and index == 0:
+                try:
+                    cached = json.dumps(result["json"], ensure_ascii=False) if self.structured else raw
+                    self.cache.put(self.cache_key(data), cached)
+                except Exception as e:
+                    print(f"❌ Erro ao salvar avaliação no cache: {e}")
+            return result
+
+    def _call_model(self, model, budget, prompt, system_instruction, estimated_tokens,
+                    on_chunk, priority, in_flight, retry_rate_limit=True):
+        """
+        Aguarda a vez no agendador e chama um modelo dentro do seu prazo.
+        Recusas por limite de taxa são refeitas (AI_RATE_LIMIT_RETRIES) só
+        quando não há modelo seguinte para onde desviar.
+        """
+        usage = in_flight.usage if in_flight else None
+        retries = AI_RATE_LIMIT_RETRIES if retry_rate_limit else 0
+        for attempt in range(retries + 1):
+            self.scheduler.acquire(
+                estimated_tokens,
+                priority,
+                on_position=in_flight.publish_status if in_flight else None,
+                abandoned=in_flight.abandoned if in_flight else None
+            )
+            if in_flight:
+                in_flight.publish_status(0)
+
+            try:
+                if self.structured:
+                    # JSON parcial não é exibível: o texto é gerado só ao final
+                    raw = self.client.generate(
+                        prompt, model_name=model, response_schema=RESPONSE_SCHEMA,
+                        system_instruction=system_instruction, usage=usage, timeout=budget)
+                elif on_chunk:
+                    raw = self.client.generate_stream(
+                        prompt, on_chunk, model_name=model, system_instruction=system_instruction,
+                        usage=usage, timeout=budget)
+                else:
+                    raw = self.client.generate(
+                        prompt, model_name=model, system_instruction=system_instruction,
+                        usage=usage, timeout=budget)
+                self.scheduler.report_success()
+                return raw
+            except RateLimitError:
+                self.scheduler.report_rate_limited()
+                if attempt == retries:
+                    raise
@@ -0,0 +1,58 @@
+from PyQt5.QtCore import QObject, QThread, QCoreApplication
+
+
+class BackgroundThreads(QObject):
+    """
+    Registro das QThreads de trabalho das telas (carregamentos e salvamentos).
+
+    As threads pertencem à aplicação, e não à tela que as iniciou: fechar a
+    tela ou trocar de janela (ex.: logout) com uma consulta ainda em
+    andamento não destrói uma QThread em execução. Os resultados que chegam
+    depois disso são descartados pelo Qt junto com a tela. Ao encerrar a
+    aplicação, as threads restantes são aguardadas.
+    """
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """Registro único, criado na primeira chamada (requer QApplication ativa)"""
+        if cls._instance is None:
+            cls._instance = cls(QCoreApplication.instance())
+        return cls._instance
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.workers = {}  # QThread -> worker em execução
+        if parent is not None:
+            parent.aboutToQuit.connect(self.wait_all)
+
+    def start(self, worker, done_signals, on_finished=None):
+        """
+        Executa worker.run em uma nova QThread, encerrada quando qualquer um
+        dos sinais de done_signals for emitido. Os slots do chamador devem
+        ser conectados aos sinais do worker antes desta chamada. Retorna a
+        QThread iniciada.
+        """
+        thread = QThread(self.parent())
+        worker.moveToThread(thread)
+
+        thread.started.connect(worker.run)
+        for signal in done_signals:
+            signal.connect(thread.quit)
+        thread.finished.connect(worker.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.finished.connect(self.on_finished)
+        if on_finished is not None:
+            thread.finished.connect(on_finished)
+
+        self.workers[thread] = worker  # Mantém as referências até o fim
+        thread.start()
+        return thread
+
+    def on_finished(self):
+        self.workers.pop(self.sender(), None)
+
+    def wait_all(self):
+        """Aguarda as threads ainda em execução (encerramento da aplicação)"""
+        for thread in list(self.workers):
+            thread.wait()
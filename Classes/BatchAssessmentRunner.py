@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Classes.AssessmentService import AssessmentService, build_report_data, calculate_age
+from Classes.RequestScheduler import PRIORITY_BATCH
+from Classes.TelemetryStore import TelemetryStore
+
+
+class BatchAssessmentRunner:
+    """
+    Avalia um painel de pacientes sem interface gráfica.
+
+    As entradas de cada paciente são montadas a partir do último relatório
+    salvo (com a idade recalculada), as avaliações rodam em paralelo com
+    concorrência limitada, com a taxa controlada pelo agendador compartilhado
+    (AI_RATE_RPM, AI_RATE_TPM), e os resultados são salvos via
+    create_report. O progresso fica em um arquivo de checkpoint, permitindo
+    retomar um lote interrompido sem reprocessar pacientes já concluídos.
+    O checkpoint vale só para o mesmo lote (médico, pacientes e versão do
+    prompt) e é apagado quando o lote termina sem falhas.
+    """
+
+    def __init__(self, db_manager, doctor_id, concurrency=4,
+                 checkpoint_path="batch_checkpoint.json", service=None, progress=print):
+        self.db_manager = db_manager
+        self.doctor_id = doctor_id
+        self.concurrency = max(1, concurrency)
+        self.checkpoint_path = checkpoint_path
+        self.service = service or AssessmentService(telemetry=TelemetryStore())
+        self.progress = progress
+
+        self._lock = threading.Lock()
+        self.checkpoint = self.load_checkpoint()
+
+    def load_checkpoint(self):
+        """Carrega o checkpoint de uma execução anterior, se existir"""
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        return {"done": {}, "failed": {}}
+
+    def save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)  # Escrita atômica
+
+    def fingerprint(self, patients):
+        """Identifica o lote: médico, conjunto de pacientes e versão do prompt"""
+        canonical = json.dumps({
+            "doctor_id": self.doctor_id,
+            "patients": sorted(p["id"] for p in patients),
+            "prompt_version": self.service.prompt_version,
+        }, sort_keys=True)
+        return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+    def resolve_patients(self, patient_ids=(), cpfs=()):
+        """Converte IDs e CPFs em registros de pacientes ativos (IDs em uma única consulta)"""
+        patients = {}
+        found = self.db_manager.get_users_by_ids(patient_ids)
+        for patient_id in patient_ids:
+            patient = found.get(int(patient_id))
+            if patient and patient["user_type"] == "patient" and patient.get("is_active", True):
+                patients[patient["id"]] = patient
+            else:
+                self.progress(f"⚠️ Paciente ID {patient_id} não encontrado ou inativo")
+
+        for cpf in cpfs:
+            patient = self.db_manager.get_user_by_cpf(cpf, user_type='patient')
+            if patient:
+                patients[patient["id"]] = patient
+            else:
+                self.progress(f"⚠️ Paciente CPF {cpf} não encontrado ou inativo")
+
+        return list(patients.values())
+
+    def build_input(self, patient):
+        """Monta os dados da avaliação a partir do último relatório do paciente"""
+        last_report = self.db_manager.get_latest_patient_report(patient["id"])
+        if not last_report or not isinstance(last_report.get("report_data"), dict):
+            return None
+
+        input_data = last_report["report_data"].get("input_data", {})
+        auto = input_data.get("autoavaliacao") or input_data.get("avaliacaoagil")
+        if not auto:
+            return None
+
+        auto = dict(auto)
+        age = calculate_age(patient.get("birth_date"))
+        if age:
+            auto["idade_anos"] = age
+
+        return {
+            "avaliacaoagil": auto,
+            "exames": input_data.get("exames"),
+            "timestamp": datetime.now().isoformat()
+        }
+
+    def process_patient(self, patient):
+        """Avalia e salva um paciente; retorna o ID do relatório criado"""
+        data = self.build_input(patient)
+        if data is None:
+            raise ValueError("paciente sem relatório anterior para montar as entradas")
+
+        # Prioridade de lote: avaliações interativas da interface passam na frente
+        result = self.service.assess(data, priority=PRIORITY_BATCH, user_id=self.doctor_id)
+
+        report_data = build_report_data(data, result)
+
+        # Chave estável por lote e paciente: retomar o lote não duplica relatórios já gravados
+        report_id = self.db_manager.create_report(
+            self.doctor_id, patient["id"], report_data,
+            idempotency_key=f"batch-{self.checkpoint['run_id']}-{patient['id']}"
+        )
+        if not report_id:
+            raise RuntimeError("falha ao salvar o relatório")
+        return report_id
+
+    def run(self, patient_ids=(), cpfs=()):
+        """Executa o lote e retorna um resumo com contagens e duração"""
+        patients = self.resolve_patients(patient_ids, cpfs)
+        fingerprint = self.fingerprint(patients)
+        if self.checkpoint.get("fingerprint") != fingerprint:
+            # Outro lote (médico, pacientes ou prompt diferentes): o progresso anterior não se aplica.
+            # O run_id identifica o lote nas chaves de idempotência; gravado antes do primeiro relatório
+            self.checkpoint = {"done": {}, "failed": {}, "fingerprint": fingerprint, "run_id": uuid.uuid4().hex}
+            self.save_checkpoint()
+        pending = [p for p in patients if str(p["id"]) not in self.checkpoint["done"]]
+        skipped = len(patients) - len(pending)
+        if skipped:
+            self.progress(f"↪️ {skipped} paciente(s) já concluído(s) em execução anterior")
+
+        total = len(pending)
+        completed = 0
+        failed = 0
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {executor.submit(self.process_patient, p): p for p in pending}
+            for future in as_completed(futures):
+                patient = futures[future]
+                key = str(patient["id"])
+                try:
+                    report_id = future.result()
+                    with self._lock:
+                        self.checkpoint["done"][key] = report_id
+                        self.checkpoint["failed"].pop(key, None)
+                        self.save_checkpoint()
+                    completed += 1
+                    status = f"✅ {patient['name']} (relatório #{report_id})"
+                except Exception as e:
+                    with self._lock:
+                        self.checkpoint["failed"][key] = str(e)
+                        self.save_checkpoint()
+                    failed += 1
+                    status = f"❌ {patient['name']}: {e}"
+
+                self.progress(f"[{completed + failed}/{total}] {status}")
+
+        if failed == 0 and self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            # Lote concluído: nada a retomar
+            os.remove(self.checkpoint_path)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "total": total,
+            "completed": completed,
+            "failed": failed,
+            "skipped": skipped,
+            "elapsed_seconds": elapsed,
+        }
@@ -0,0 +1,89 @@
+import json
+import select
+import time
+import psycopg2
+from psycopg2 import extensions
+from PyQt5.QtCore import QThread, pyqtSignal
+
+
+class DatabaseListener(QThread):
+    """
+    Thread que escuta os canais LISTEN/NOTIFY do PostgreSQL e repassa as
+    alterações nas tabelas de relatórios e usuários como sinais Qt.
+
+    Usa uma conexão dedicada (fora do pool), em modo autocommit, já que a
+    conexão fica presa no LISTEN enquanto a aplicação estiver aberta.
+    """
+    report_changed = pyqtSignal(dict)  # {'op', 'id', 'doctor_id', 'patient_id'}
+    user_changed = pyqtSignal(dict)    # {'op', 'id', 'user_type', 'is_active'}
+
+    CHANNELS = ('report_changes', 'user_changes')
+    POLL_TIMEOUT = 1.0      # segundos entre verificações do pedido de parada
+    MAX_RECONNECT_DELAY = 30
+
+    def __init__(self, db_config, parent=None):
+        super().__init__(parent)
+        self.db_config = db_config
+        self._running = False
+
+    def stop(self):
+        """Solicita a parada da thread e aguarda o término"""
+        self._running = False
+        self.wait()
+
+    def _open_connection(self):
+        conn = psycopg2.connect(**self.db_config)
+        conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        cursor = conn.cursor()
+        for channel in self.CHANNELS:
+            cursor.execute(f"LISTEN {channel};")
+        cursor.close()
+        return conn
+
+    def run(self):
+        self._running = True
+        reconnect_delay = 1
+        conn = None
+
+        while self._running:
+            try:
+                if conn is None:
+                    conn = self._open_connection()
+                    reconnect_delay = 1
+                    print("✅ Escutando notificações do PostgreSQL")
+
+                ready, _, _ = select.select([conn], [], [], self.POLL_TIMEOUT)
+                if not ready:
+                    continue
+
+                conn.poll()
+                while conn.notifies:
+                    self._dispatch(conn.notifies.pop(0))
+
+            except Exception as e:
+                print(f"❌ Erro no listener do PostgreSQL: {e}")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+                # Backoff exponencial até o limite, sem bloquear a parada
+                deadline = time.monotonic() + reconnect_delay
+                while self._running and time.monotonic() < deadline:
+                    time.sleep(0.2)
+                reconnect_delay = min(reconnect_delay * 2, self.MAX_RECONNECT_DELAY)
+
+        if conn is not None:
+            conn.close()
+
+    def _dispatch(self, notify):
+        try:
+            payload = json.loads(notify.payload)
+        except ValueError:
+            return
+
+        if notify.channel == 'report_changes':
+            self.report_changed.emit(payload)
+        elif notify.channel == 'user_changes':
+            self.user_changed.emit(payload)
@@ -1,4 +1,7 @@
 import hashlib
+import itertools
+import threading
+import time
 from datetime import datetime, date
 import psycopg2
 from psycopg2.extras import RealDictCursor, execute_values
@@ -22,6 +25,28 @@ class DatabaseManager:
             'user': os.getenv('POSTGRES_USER', 'medicSys'),
             'password': os.getenv('POSTGRES_PASSWORD', 'Sysmedical')
         }
+
+        # Réplicas de leitura (opcional): DSNs separados por vírgula
+        self.replica_dsns = [
+            dsn.strip() for dsn in os.getenv('POSTGRES_REPLICA_DSNS', '').split(',') if dsn.strip()
+        ]
+        # Após uma escrita, as leituras vão ao primário por esta janela (read-your-writes)
+        self.read_your_writes_seconds = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+        self.replica_pools = []
+        self._replica_cycle = None
+        self._connection_origin = {}  # id(conn) -> pool de origem
+        self._last_write_at = 0.0
+
+        # Cache de curta duração para buscas de usuário por ID
+        self.user_cache_ttl = float(os.getenv('USER_CACHE_TTL', '30'))
+        self._user_cache = {}  # id -> (expira_em, usuário)
+        self._user_cache_generation = 0  # Incrementada a cada invalidação
+        self._user_cache_lock = threading.Lock()
+
+        # Cache versionado das listagens por tipo: (user_type, include_inactive) -> (versão, expira_em, usuários)
+        self.users_cache_ttl = float(os.getenv('USERS_CACHE_TTL', '60'))
+        self._users_by_type_cache = {}
+        self._users_versions = {'admin': 0, 'doctor': 0, 'patient': 0}
         
         # Chave de criptografia (deve estar no .env em produção)
         encryption_key = os.getenv('ENCRYPTION_KEY')
@@ -32,6 +57,8 @@ class DatabaseManager:
         self.cipher = Fernet(encryption_key.encode() if isinstance(encryption_key, str) else encryption_key)
         
         self.connection_pool = None
+        self.listener = None
+        self.offline_drainer = None
         self.connect()
 
     def encrypt_data(self, data):
@@ -63,12 +90,15 @@ class DatabaseManager:
         """Conecta ao PostgreSQL e cria as tabelas necessárias"""
         try:
             # Cria um pool de conexões
-            self.connection_pool = psycopg2.pool.SimpleConnectionPool(
+            # Thread-safe: as telas também consultam o banco em threads de fundo
+            self.connection_pool = psycopg2.pool.ThreadedConnectionPool(
                 1, 20,  # mínimo e máximo de conexões
                 **self.db_config
             )
             
             print("✅ Conectado ao PostgreSQL com sucesso!")
+
+            self.connect_replicas()
             
             # Cria as tabelas e dados iniciais
             self.create_tables()
@@ -79,13 +109,89 @@ class DatabaseManager:
             return False
         return True
 
+    def connect_replicas(self):
+        """Cria os pools das réplicas de leitura; réplicas inacessíveis são ignoradas"""
+        for dsn in self.replica_dsns:
+            try:
+                self.replica_pools.append(psycopg2.pool.ThreadedConnectionPool(1, 10, dsn))
+            except Exception as e:
+                print(f"❌ Erro ao conectar à réplica de leitura: {e}")
+
+        if self.replica_pools:
+            self._replica_cycle = itertools.cycle(self.replica_pools)
+            print(f"✅ {len(self.replica_pools)} réplica(s) de leitura configurada(s)")
+
     def get_connection(self):
         """Obtém uma conexão do pool"""
         return self.connection_pool.getconn()
 
-    def return_connection(self, conn):
-        """Retorna uma conexão ao pool"""
-        self.connection_pool.putconn(conn)
+    def get_read_connection(self):
+        """
+        Obtém uma conexão para consultas somente leitura.
+        Usa uma réplica (round-robin) quando configurada, exceto logo após
+        uma escrita, quando o primário é usado para garantir read-your-writes.
+        """
+        if self.replica_pools and time.monotonic() - self._last_write_at >= self.read_your_writes_seconds:
+            replica_pool = next(self._replica_cycle)
+            try:
+                conn = replica_pool.getconn()
+                self._connection_origin[id(conn)] = replica_pool
+                return conn
+            except Exception as e:
+                print(f"❌ Réplica indisponível, usando o primário: {e}")
+        return self.get_connection()
+
+    def return_connection(self, conn, discard=False):
+        """Retorna uma conexão ao pool de origem (primário ou réplica)"""
+        origin = self._connection_origin.pop(id(conn), self.connection_pool)
+        # Conexões quebradas (ex.: queda de rede) são descartadas em vez de reutilizadas
+        origin.putconn(conn, close=discard or bool(conn.closed))
+
+    @staticmethod
+    def _fetch(conn, query, params, fetch_one):
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        try:
+            cursor.execute(query, params)
+            if fetch_one:
+                row = cursor.fetchone()
+                return dict(row) if row else None
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def execute_read(self, query, params=None, fetch_one=False, primary=False):
+        """
+        Executa uma consulta somente leitura e retorna as linhas como
+        dicionários (ou só a primeira, com fetch_one). Se a conexão da réplica
+        falhar durante a consulta (réplica fora do ar ou conexão morta no
+        pool), ela é descartada e a consulta é repetida uma vez no primário.
+        Com primary=True a consulta vai direto ao primário (ex.: releitura
+        após um NOTIFY, antes de a réplica ter recebido a alteração).
+        """
+        if not primary:
+            conn = self.get_read_connection()
+            from_replica = id(conn) in self._connection_origin
+            try:
+                return self._fetch(conn, query, params, fetch_one)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if not from_replica:
+                    raise
+                print(f"❌ Réplica falhou durante a consulta, repetindo no primário: {e}")
+                self.return_connection(conn, discard=True)
+                conn = None
+            finally:
+                if conn is not None:
+                    self.return_connection(conn)
+
+        conn = self.get_connection()
+        try:
+            return self._fetch(conn, query, params, fetch_one)
+        finally:
+            self.return_connection(conn)
+
+    def mark_write(self):
+        """Registra uma escrita para abrir a janela de read-your-writes"""
+        self._last_write_at = time.monotonic()
 
     def create_tables(self):
         """Cria as tabelas do sistema com campos de segurança"""
@@ -132,12 +238,21 @@ class DatabaseManager:
                     -- Dados criptografados
                     report_data_encrypted TEXT NOT NULL,
                     
+                    -- Chave de idempotência: repetir um salvamento nunca duplica o relatório
+                    idempotency_key VARCHAR(64),
+                    
+                    -- Versão anterior do relatório (reavaliação após mudança de prompt ou modelo)
+                    supersedes_id INTEGER REFERENCES reports(id),
                                         
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             
+            # Bancos criados antes da chave de idempotência e do versionamento
+            cursor.execute("ALTER TABLE reports ADD COLUMN IF NOT EXISTS idempotency_key VARCHAR(64)")
+            cursor.execute("ALTER TABLE reports ADD COLUMN IF NOT EXISTS supersedes_id INTEGER REFERENCES reports(id)")
+            
             # Índices para melhorar performance
             cursor.execute(r"""
                 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
@@ -147,6 +262,8 @@ class DatabaseManager:
                 CREATE INDEX IF NOT EXISTS idx_reports_doctor ON reports(doctor_id);
                 CREATE INDEX IF NOT EXISTS idx_reports_patient ON reports(patient_id);
                 CREATE INDEX IF NOT EXISTS idx_reports_created ON reports(created_at);
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_reports_idempotency ON reports(idempotency_key);
+                CREATE INDEX IF NOT EXISTS idx_reports_supersedes ON reports(supersedes_id);
             """)
             
             # Trigger para atualizar updated_at automaticamente
@@ -175,7 +292,56 @@ class DatabaseManager:
                     FOR EACH ROW 
                     EXECUTE FUNCTION update_updated_at_column();
             """)
-            
+
+            # Notificações (LISTEN/NOTIFY) para atualização das telas abertas.
+            # O payload leva apenas identificadores: o limite do NOTIFY é de 8000 bytes
+            # e os dados criptografados do relatório nunca devem trafegar por ele.
+            cursor.execute(r"""
+                CREATE OR REPLACE FUNCTION notify_report_change()
+                RETURNS TRIGGER AS $$
+                BEGIN
+                    PERFORM pg_notify('report_changes', json_build_object(
+                        'op', TG_OP,
+                        'id', NEW.id,
+                        'doctor_id', NEW.doctor_id,
+                        'patient_id', NEW.patient_id
+                    )::text);
+                    RETURN NEW;
+                END;
+                $$ language 'plpgsql';
+            """)
+
+            cursor.execute(r"""
+                CREATE OR REPLACE FUNCTION notify_user_change()
+                RETURNS TRIGGER AS $$
+                BEGIN
+                    PERFORM pg_notify('user_changes', json_build_object(
+                        'op', TG_OP,
+                        'id', NEW.id,
+                        'user_type', NEW.user_type,
+                        'is_active', NEW.is_active
+                    )::text);
+                    RETURN NEW;
+                END;
+                $$ language 'plpgsql';
+            """)
+
+            cursor.execute(r"""
+                DROP TRIGGER IF EXISTS notify_reports_change ON reports;
+                CREATE TRIGGER notify_reports_change
+                    AFTER INSERT OR UPDATE ON reports
+                    FOR EACH ROW
+                    EXECUTE FUNCTION notify_report_change();
+            """)
+
+            cursor.execute(r"""
+                DROP TRIGGER IF EXISTS notify_users_change ON users;
+                CREATE TRIGGER notify_users_change
+                    AFTER INSERT OR UPDATE ON users
+                    FOR EACH ROW
+                    EXECUTE FUNCTION notify_user_change();
+            """)
+
             conn.commit()
             print("✅ Tabelas criadas/verificadas com sucesso!")
             
@@ -294,6 +460,8 @@ class DatabaseManager:
             
             user_id = cursor.fetchone()[0]
             conn.commit()
+            self.mark_write()
+            self.invalidate_users_by_type(user_type)
             
             return user_id
             
@@ -310,23 +478,49 @@ class DatabaseManager:
             cursor.close()
             self.return_connection(conn)
 
-    def get_users_by_type(self, user_type, include_inactive=False):
-        """Retorna todos os usuários de um tipo específico"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            if include_inactive:
-                query = "SELECT * FROM users WHERE user_type = %s ORDER BY is_active DESC, created_at DESC"
-            else:
-                query = "SELECT * FROM users WHERE user_type = %s AND is_active = TRUE ORDER BY created_at DESC"
-            
-            cursor.execute(query, (user_type,))
-            users = cursor.fetchall()
-            return [dict(user) for user in users]
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+    def users_version(self, user_type=None):
+        """
+        Versão atual das listagens de usuários (de um tipo ou de todos).
+        Consulta barata, em memória: as telas comparam com a versão que
+        exibiram para decidir se precisam recarregar.
+        """
+        with self._user_cache_lock:
+            if user_type is None:
+                return sum(self._users_versions.values())
+            return self._users_versions.get(user_type, 0)
+
+    def invalidate_users_by_type(self, *user_types):
+        """Incrementa a versão dos tipos alterados (todos, se nenhum for informado)"""
+        with self._user_cache_lock:
+            for user_type in (user_types or tuple(self._users_versions)):
+                if user_type in self._users_versions:
+                    self._users_versions[user_type] += 1
+
+    def get_users_by_type(self, user_type, include_inactive=False, primary=False):
+        """
+        Retorna todos os usuários de um tipo específico.
+        Com primary=True ignora o cache e lê do primário (recarga após um NOTIFY).
+        """
+        key = (user_type, bool(include_inactive))
+        with self._user_cache_lock:
+            version = self._users_versions.get(user_type, 0)
+            cached = self._users_by_type_cache.get(key)
+            if not primary and cached and cached[0] == version and cached[1] > time.monotonic():
+                return [dict(user) for user in cached[2]]
+
+        if include_inactive:
+            query = "SELECT * FROM users WHERE user_type = %s ORDER BY is_active DESC, created_at DESC"
+        else:
+            query = "SELECT * FROM users WHERE user_type = %s AND is_active = TRUE ORDER BY created_at DESC"
+        users = self.execute_read(query, (user_type,), primary=primary)
+
+        with self._user_cache_lock:
+            # Só guarda se nenhuma escrita aconteceu durante a consulta
+            if self._users_versions.get(user_type, 0) == version:
+                self._users_by_type_cache[key] = (
+                    version, time.monotonic() + self.users_cache_ttl, users
+                )
+        return [dict(user) for user in users]
 
     def update_user(self, user_id, data, updated_by=None):
         """Atualiza um usuário"""
@@ -355,6 +549,12 @@ class DatabaseManager:
             
             rows_affected = cursor.rowcount
             conn.commit()
+            self.mark_write()
+            self.invalidate_user_cache(user_id)
+            if old_user:
+                self.invalidate_users_by_type(old_user['user_type'], data.get('user_type'))
+            else:
+                self.invalidate_users_by_type()
             
             return rows_affected > 0
             
@@ -378,10 +578,16 @@ class DatabaseManager:
                 UPDATE users 
                 SET is_active = FALSE
                 WHERE id = %s AND user_type IN ('doctor', 'patient')
+                RETURNING user_type
             """, (user_id,))
             
             rows_affected = cursor.rowcount
+            changed = cursor.fetchone()
             conn.commit()
+            self.mark_write()
+            self.invalidate_user_cache(user_id)
+            if changed:
+                self.invalidate_users_by_type(changed[0])
             
             return rows_affected > 0
         except Exception as e:
@@ -401,10 +607,16 @@ class DatabaseManager:
                 UPDATE users 
                 SET is_active = TRUE
                 WHERE id = %s
+                RETURNING user_type
             """, (user_id,))
             
             rows_affected = cursor.rowcount
+            changed = cursor.fetchone()
             conn.commit()
+            self.mark_write()
+            self.invalidate_user_cache(user_id)
+            if changed:
+                self.invalidate_users_by_type(changed[0])
             
             
             return rows_affected > 0
@@ -424,6 +636,9 @@ class DatabaseManager:
             cursor.execute("DELETE FROM users WHERE id = %s AND user_type = 'admin'", (user_id,))
             rows_affected = cursor.rowcount
             conn.commit()
+            self.mark_write()
+            self.invalidate_user_cache(user_id)
+            self.invalidate_users_by_type('admin')
             return rows_affected > 0
         except Exception as e:
             conn.rollback()
@@ -433,8 +648,16 @@ class DatabaseManager:
             cursor.close()
             self.return_connection(conn)
 
-    def create_report(self, doctor_id, patient_id, report_data, created_by=None):
-        """Cria um novo relatório com dados criptografados"""
+    def create_report(self, doctor_id, patient_id, report_data, created_by=None, idempotency_key=None,
+                      supersedes_id=None):
+        """
+        Cria um novo relatório com dados criptografados.
+        Com idempotency_key, repetir a chamada (ex.: nova tentativa após uma
+        falha de rede) retorna o ID do relatório já criado em vez de duplicá-lo.
+        supersedes_id marca o relatório como nova versão de outro (reavaliação):
+        a nova versão mantém a data do original e as listagens passam a
+        exibir apenas ela.
+        """
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
@@ -443,16 +666,23 @@ class DatabaseManager:
             encrypted_data = self.encrypt_data(report_data)
             
             cursor.execute("""
-                INSERT INTO reports (doctor_id, patient_id, report_data_encrypted)
-                VALUES (%s, %s, %s)
+                INSERT INTO reports (doctor_id, patient_id, report_data_encrypted, idempotency_key, supersedes_id,
+                                     created_at)
+                VALUES (%s, %s, %s, %s, %s,
+                        COALESCE((SELECT created_at FROM reports WHERE id = %s), CURRENT_TIMESTAMP))
+                ON CONFLICT (idempotency_key) DO NOTHING
                 RETURNING id
-            """, (doctor_id, patient_id, encrypted_data))
+            """, (doctor_id, patient_id, encrypted_data, idempotency_key, supersedes_id, supersedes_id))
             
-            report_id = cursor.fetchone()[0]
+            row = cursor.fetchone()
+            if row is None:
+                # Já salvo por uma tentativa anterior com a mesma chave
+                cursor.execute("SELECT id FROM reports WHERE idempotency_key = %s", (idempotency_key,))
+                row = cursor.fetchone()
             conn.commit()
+            self.mark_write()
             
-            
-            return report_id
+            return row[0]
             
         except Exception as e:
             conn.rollback()
@@ -462,88 +692,146 @@ class DatabaseManager:
             cursor.close()
             self.return_connection(conn)
 
-    def get_patient_reports(self, patient_id, include_inactive=False):
-        """Retorna todos os relatórios de um paciente com dados descriptografados"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            cursor.execute("""
-                SELECT r.*, 
-                       row_to_json(d.*) as doctor,
-                       row_to_json(p.*) as patient
-                FROM reports r
-                LEFT JOIN users d ON r.doctor_id = d.id
-                LEFT JOIN users p ON r.patient_id = p.id
-                WHERE r.patient_id = %s
-                ORDER BY r.created_at DESC
-            """, (patient_id,))
-            
-            reports = cursor.fetchall()
-            
-            # Descriptografa os dados
-            for report in reports:
-                report['report_data'] = self.decrypt_data(report['report_data_encrypted'])
-                del report['report_data_encrypted']
-            
-            return [dict(report) for report in reports]
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+    def get_patient_reports(self, patient_id, include_inactive=False, limit=None):
+        """
+        Retorna os relatórios de um paciente com dados descriptografados,
+        do mais recente ao mais antigo (apenas os 'limit' últimos, se informado)
+        """
+        reports = self.execute_read("""
+            SELECT r.*, 
+                   row_to_json(d.*) as doctor,
+                   row_to_json(p.*) as patient
+            FROM reports r
+            LEFT JOIN users d ON r.doctor_id = d.id
+            LEFT JOIN users p ON r.patient_id = p.id
+            WHERE r.patient_id = %s
+              AND NOT EXISTS (SELECT 1 FROM reports n WHERE n.supersedes_id = r.id)
+            ORDER BY r.created_at DESC
+            LIMIT %s
+        """, (patient_id, limit))
+        
+        # Descriptografa os dados
+        for report in reports:
+            report['report_data'] = self.decrypt_data(report['report_data_encrypted'])
+            del report['report_data_encrypted']
+        
+        return reports
+
+    @staticmethod
+    def format_cpf(cpf):
+        """Normaliza o CPF para o formato armazenado (000.000.000-00); outros valores voltam inalterados"""
+        digits = ''.join(filter(str.isdigit, cpf or ''))
+        if len(digits) != 11:
+            return cpf
+        return f"{digits[:3]}.{digits[3:6]}.{digits[6:9]}-{digits[9:]}"
 
     def get_user_by_cpf(self, cpf, user_type='patient'):
-        """Busca um usuário ATIVO pelo CPF e tipo."""
-        conn = self.get_connection()
+        """Busca um usuário ATIVO pelo CPF (com ou sem pontuação) e tipo."""
+        cpf = self.format_cpf(cpf)
         try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(
+            return self.execute_read(
                 "SELECT * FROM users WHERE cpf = %s AND user_type = %s AND is_active = TRUE",
-                (cpf, user_type)
+                (cpf, user_type), fetch_one=True
             )
-            user = cursor.fetchone()
-            return dict(user) if user else None
         except Exception as e:
             print(f"❌ Erro ao buscar usuário por CPF: {e}")
             return None
-        finally:
-            cursor.close()
-            self.return_connection(conn)
 
     def get_doctor_reports(self, doctor_id, include_inactive=False):
         """Retorna todos os relatórios criados por um médico"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
-            cursor.execute("""
-                SELECT r.*,
-                       row_to_json(d.*) as doctor,
-                       row_to_json(p.*) as patient
-                FROM reports r
-                LEFT JOIN users d ON r.doctor_id = d.id
-                LEFT JOIN users p ON r.patient_id = p.id
-                WHERE r.doctor_id = %s
-                ORDER BY r.created_at DESC
-            """, (doctor_id,))
-            
-            reports = cursor.fetchall()
-            
-            # Descriptografa os dados
-            for report in reports:
-                report['report_data'] = self.decrypt_data(report['report_data_encrypted'])
-                del report['report_data_encrypted']
-            
-            return [dict(report) for report in reports]
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        reports = self.execute_read("""
+            SELECT r.*,
+                   row_to_json(d.*) as doctor,
+                   row_to_json(p.*) as patient
+            FROM reports r
+            LEFT JOIN users d ON r.doctor_id = d.id
+            LEFT JOIN users p ON r.patient_id = p.id
+            WHERE r.doctor_id = %s
+              AND NOT EXISTS (SELECT 1 FROM reports n WHERE n.supersedes_id = r.id)
+            ORDER BY r.created_at DESC
+        """, (doctor_id,))
+        
+        # Descriptografa os dados
+        for report in reports:
+            report['report_data'] = self.decrypt_data(report['report_data_encrypted'])
+            del report['report_data_encrypted']
+        
+        return reports
 
     def get_all_reports(self, include_inactive=False):
         """Retorna todos os relatórios com dados de médico e paciente"""
+        reports = self.execute_read("""
+            SELECT r.*,
+                   COALESCE(row_to_json(d.*), '{"name": "Médico não encontrado"}'::json) as doctor,
+                   COALESCE(row_to_json(p.*), '{"name": "Paciente não encontrado"}'::json) as patient
+            FROM reports r
+            LEFT JOIN users d ON r.doctor_id = d.id
+            LEFT JOIN users p ON r.patient_id = p.id
+            WHERE NOT EXISTS (SELECT 1 FROM reports n WHERE n.supersedes_id = r.id)
+            ORDER BY r.created_at DESC
+        """)
+        
+        # Descriptografa os dados
+        for report in reports:
+            report['report_data'] = self.decrypt_data(report['report_data_encrypted'])
+            del report['report_data_encrypted']
+        
+        return reports
+
+    def iter_current_reports(self, after_id=0, page_size=200, doctor_id=None):
+        """
+        Percorre, em ordem de ID, os relatórios que ainda não têm versão mais
+        nova, descriptografando um de cada vez. A leitura é feita em páginas
+        por chave (id > último lido): cada página é uma consulta curta, sem
+        manter transação aberta enquanto quem consome processa os relatórios.
+        Relatórios que não puderem ser descriptografados são ignorados.
+        """
+        last_id = after_id
+        while True:
+            rows = self.execute_read("""
+                SELECT r.id, r.doctor_id, r.patient_id, r.report_data_encrypted, r.created_at
+                FROM reports r
+                WHERE r.id > %s
+                  AND (%s IS NULL OR r.doctor_id = %s)
+                  AND NOT EXISTS (SELECT 1 FROM reports n WHERE n.supersedes_id = r.id)
+                ORDER BY r.id
+                LIMIT %s
+            """, (last_id, doctor_id, doctor_id, page_size))
+
+            for row in rows:
+                report = dict(row)
+                report['report_data'] = self.decrypt_data(report.pop('report_data_encrypted'))
+                if isinstance(report['report_data'], dict):
+                    yield report
+
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+
+    def get_latest_patient_report(self, patient_id):
+        """Retorna o último relatório de um paciente"""
+        report = self.execute_read("""
+            SELECT * FROM reports r
+            WHERE r.patient_id = %s
+              AND NOT EXISTS (SELECT 1 FROM reports n WHERE n.supersedes_id = r.id)
+            ORDER BY r.created_at DESC 
+            LIMIT 1
+        """, (patient_id,), fetch_one=True)
+        
+        if report:
+            report['report_data'] = self.decrypt_data(report['report_data_encrypted'])
+            del report['report_data_encrypted']
+        return report
+
+    def get_report_by_id(self, report_id):
+        """
+        Retorna um relatório específico com dados de médico e paciente.
+        Sempre lê do primário: é chamado logo após um NOTIFY, antes de a
+        réplica ter necessariamente recebido a linha.
+        """
         conn = self.get_connection()
         try:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
-            
             cursor.execute("""
                 SELECT r.*,
                        COALESCE(row_to_json(d.*), '{"name": "Médico não encontrado"}'::json) as doctor,
@@ -551,33 +839,9 @@ class DatabaseManager:
                 FROM reports r
                 LEFT JOIN users d ON r.doctor_id = d.id
                 LEFT JOIN users p ON r.patient_id = p.id
-                ORDER BY r.created_at DESC
-            """)
-            
-            reports = cursor.fetchall()
-            
-            # Descriptografa os dados
-            for report in reports:
-                report['report_data'] = self.decrypt_data(report['report_data_encrypted'])
-                del report['report_data_encrypted']
-            
-            return [dict(report) for report in reports]
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+                WHERE r.id = %s
+            """, (report_id,))
 
-    def get_latest_patient_report(self, patient_id):
-        """Retorna o último relatório de um paciente"""
-        conn = self.get_connection()
-        try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute("""
-                SELECT * FROM reports 
-                WHERE patient_id = %s
-                ORDER BY created_at DESC 
-                LIMIT 1
-            """, (patient_id,))
-            
             report = cursor.fetchone()
             if report:
                 report = dict(report)
@@ -589,23 +853,98 @@ class DatabaseManager:
             cursor.close()
             self.return_connection(conn)
 
-    def get_user_by_id(self, user_id):
-        """Busca um usuário específico pelo seu ID."""
-        conn = self.get_connection()
+    def get_users_by_ids(self, user_ids, primary=False):
+        """
+        Busca vários usuários de uma vez (WHERE id = ANY), usando o cache
+        de curta duração. Retorna um dicionário {id: usuário}.
+        Com primary=True ignora o cache e lê do primário: usado logo após
+        um NOTIFY, para não guardar no cache uma linha antiga da réplica.
+        """
+        ids = {int(user_id) for user_id in user_ids if user_id is not None}
+        users = {}
+        now = time.monotonic()
+
+        with self._user_cache_lock:
+            generation = self._user_cache_generation
+            for user_id in ids:
+                cached = self._user_cache.get(user_id)
+                if not primary and cached and cached[0] > now:
+                    users[user_id] = dict(cached[1])
+
+        missing = ids - users.keys()
+        if not missing:
+            return users
+
         try:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
-            user = cursor.fetchone()
-            return user 
+            rows = self.execute_read("SELECT * FROM users WHERE id = ANY(%s)", (list(missing),), primary=primary)
         except Exception as e:
-            print(f"❌ Erro ao buscar usuário por ID: {e}")
+            print(f"❌ Erro ao buscar usuários por ID: {e}")
+            return users
+
+        expires_at = time.monotonic() + self.user_cache_ttl
+        with self._user_cache_lock:
+            # Uma invalidação durante a consulta pode ter chegado depois da linha lida: não guarda
+            if self._user_cache_generation == generation:
+                for row in rows:
+                    self._user_cache[row['id']] = (expires_at, row)
+
+        for row in rows:
+            users[row['id']] = dict(row)
+        return users
+
+    def get_user_by_id(self, user_id, primary=False):
+        """Busca um usuário específico pelo seu ID."""
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
             return None
-        finally:
-            cursor.close()
-            self.return_connection(conn)
+        return self.get_users_by_ids([user_id], primary=primary).get(user_id)
+
+    def invalidate_user_cache(self, user_id=None):
+        """Remove um usuário (ou todos, se None) do cache de busca por ID"""
+        with self._user_cache_lock:
+            self._user_cache_generation += 1
+            if user_id is None:
+                self._user_cache.clear()
+            else:
+                self._user_cache.pop(int(user_id), None)
+
+    def on_user_notification(self, payload):
+        """Invalida os caches de usuário a partir de um NOTIFY de outra instância"""
+        self.invalidate_user_cache(payload.get('id'))
+        if payload.get('user_type'):
+            self.invalidate_users_by_type(payload['user_type'])
+        else:
+            self.invalidate_users_by_type()
+
+    def start_listener(self):
+        """Inicia a thread de LISTEN/NOTIFY (requer QApplication ativa)"""
+        if self.listener is None:
+            from Classes.DatabaseListener import DatabaseListener
+            self.listener = DatabaseListener(self.db_config)
+            # Alterações feitas por outras instâncias também invalidam o cache local
+            self.listener.user_changed.connect(self.on_user_notification)
+            self.listener.start()
+        return self.listener
+
+    def start_offline_drainer(self):
+        """Inicia a thread que salva as avaliações da fila offline (requer QApplication ativa)"""
+        if self.offline_drainer is None:
+            from Classes.OfflineQueueDrainer import OfflineQueueDrainer
+            self.offline_drainer = OfflineQueueDrainer(self)
+            self.offline_drainer.start()
+        return self.offline_drainer
 
     def close(self):
         """Fecha o pool de conexões"""
+        if self.offline_drainer:
+            self.offline_drainer.stop()
+            self.offline_drainer = None
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+        for replica_pool in self.replica_pools:
+            replica_pool.closeall()
         if self.connection_pool:
             self.connection_pool.closeall()
             print("✅ Conexões fechadas com sucesso!")
\ No newline at end of file
@@ -0,0 +1,49 @@
+import os
+import re
+
+
+RISK_LEVEL_PATTERN = re.compile(
+    r"N[ÍI]VEL DE RISCO:\s*\**\s*(MUITO ALTO|ALTO|MODERADO|BAIXO)", re.IGNORECASE
+)
+
+RISK_SCORE_PATTERN = re.compile(r"PONTUA[ÇC][ÃA]O DE RISCO:\s*\**\s*(\d{1,3})", re.IGNORECASE)
+
+
+def parse_risk_level(ai_result):
+    """Extrai o nível de risco (BAIXO/MODERADO/ALTO/MUITO ALTO) do texto da IA"""
+    if not ai_result or not isinstance(ai_result, str):
+        return None
+    match = RISK_LEVEL_PATTERN.search(ai_result)
+    return match.group(1).upper() if match else None
+
+
+def report_risk_level(report):
+    """Nível de risco de um relatório: coluna, JSON estruturado ou texto da IA"""
+    report_data = report.get("report_data") or {}
+    return (report.get("risk_level")
+            or (report_data.get("ai_result_json") or {}).get("level")
+            or parse_risk_level(report_data.get("ai_result")))
+
+
+def parse_risk_score(ai_result):
+    """Extrai a pontuação de risco (0-100) do texto da IA"""
+    if not ai_result or not isinstance(ai_result, str):
+        return None
+    match = RISK_SCORE_PATTERN.search(ai_result)
+    return min(100, int(match.group(1))) if match else None
+
+
+def report_risk_score(report):
+    """Pontuação de risco de um relatório: JSON estruturado ou texto da IA"""
+    report_data = report.get("report_data") or {}
+    score = (report_data.get("ai_result_json") or {}).get("score")
+    if score is not None:
+        return int(score)
+    return parse_risk_score(report_data.get("ai_result"))
+
+
+def get_cache_dir():
+    """Diretório local dos caches da aplicação"""
+    cache_dir = os.getenv('HIPAI_CACHE_DIR', os.path.join(os.path.expanduser("~"), ".hip-ai"))
+    os.makedirs(cache_dir, exist_ok=True)
+    return cache_dir
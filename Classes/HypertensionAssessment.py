@@ -1,5 +1,8 @@
 import os
 import re
+import time
+import uuid
+import threading
 from datetime import datetime
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QFormLayout, QGroupBox,
@@ -7,18 +10,35 @@ from PyQt5.QtWidgets import (
     QPlainTextEdit, QHBoxLayout, QLineEdit, QScrollArea,
     QMessageBox, QFrame, QDialog, QProgressBar
 )
-from PyQt5.QtGui import QFont, QIntValidator, QDoubleValidator
-from PyQt5.QtCore import Qt, QThread, QObject, pyqtSignal
-import google.generativeai as genai
+from PyQt5.QtGui import QFont, QIntValidator, QDoubleValidator, QTextCursor
+from PyQt5.QtCore import Qt, QObject, pyqtSignal
 from Classes.MedicalReportPDFWriter import MedicalReportPDFWriter
+from Classes.AssessmentCache import AssessmentCache
+from Classes.TelemetryStore import TelemetryStore
+from Classes.AssessmentService import AssessmentService, AssessmentCancelled, LOCAL_MODEL, build_report_data
+from Classes.AssessmentQueue import AssessmentQueue
+from Classes.BackgroundThreads import BackgroundThreads
+from Classes.AssessmentBackend import RateLimitError
+from Classes.OfflineAssessmentQueue import RetryableErrorMessage, is_transient_error
+from Classes.RiskScoreEngine import RiskScoreEngine
+from Classes.RiskModel import RiskModel
+from Classes.Helpers import report_risk_level
+
+# Exibe a resposta da IA progressivamente (desative com AI_STREAMING=0)
+AI_STREAMING = os.getenv("AI_STREAMING", "1") != "0"
 
 # --- HELPER CLASSES PARA POPUP E THREADING ---
 
 class LoadingDialog(QDialog):
     """
     Popup de carregamento modal para operações demoradas.
+    Com cancellable=True exibe os botões "Cancelar" e "Continuar em segundo
+    plano", que emitem cancelled e background.
     """
-    def __init__(self, parent=None):
+    cancelled = pyqtSignal()
+    background = pyqtSignal()
+
+    def __init__(self, parent=None, detail=None, cancellable=False):
         super().__init__(parent)
         self.setWindowTitle("Processando...")
         self.setModal(True)
@@ -33,6 +53,14 @@ class LoadingDialog(QDialog):
         self.msg_label.setFont(QFont("Segoe UI", 12))
         self.msg_label.setAlignment(Qt.AlignCenter)
         layout.addWidget(self.msg_label)
+
+        if detail:
+            # Pré-avaliação local exibida enquanto a IA responde
+            self.detail_label = QLabel(detail)
+            self.detail_label.setAlignment(Qt.AlignCenter)
+            self.detail_label.setWordWrap(True)
+            self.detail_label.setStyleSheet("font-size: 10pt; color: #2c3e50;")
+            layout.addWidget(self.detail_label)
         
         self.progress_bar = QProgressBar()
         self.progress_bar.setRange(0, 0) # Modo indeterminado
@@ -43,29 +71,194 @@ class LoadingDialog(QDialog):
         self.gemini_label.setStyleSheet("font-size: 8pt; color: #7f8c8d;")
         self.gemini_label.setAlignment(Qt.AlignRight)
         layout.addWidget(self.gemini_label)
+
+        if cancellable:
+            buttons = QHBoxLayout()
+            self.background_button = QPushButton("Continuar em segundo plano")
+            self.background_button.clicked.connect(self.background.emit)
+            buttons.addWidget(self.background_button)
+            self.cancel_button = QPushButton("Cancelar")
+            self.cancel_button.clicked.connect(self.cancelled.emit)
+            buttons.addWidget(self.cancel_button)
+            layout.addLayout(buttons)
         
         self.setMinimumWidth(350)
 
-class AssessmentWorker(QObject):
+    def set_queue_position(self, position):
+        """Mostra a posição na fila de envio da IA (0 = já enviado)"""
+        if position > 0:
+            self.msg_label.setText(f"Aguardando vez na fila da IA (posição {position})...")
+        else:
+            self.msg_label.setText("Enviando dados para análise da IA...")
+
+# --- PRÉ-CARREGAMENTO DO PACIENTE SELECIONADO ---
+
+class PatientPrefetcher(QObject):
     """
-    Worker para executar a avaliação da IA em uma thread separada.
+    Worker que busca o último relatório e o histórico recente do paciente em
+    uma thread separada, preparando o cliente de IA ao mesmo tempo.
     """
-    finished = pyqtSignal(str) # Emite o resultado (string)
+    loaded = pyqtSignal(int, list)  # ID do paciente e relatórios (mais recente primeiro)
+    failed = pyqtSignal(int, str)
+
+    HISTORY_SIZE = 5
 
-    def __init__(self, assessment_data, ai_function):
+    def __init__(self, db_manager, assessment_service, patient_id):
         super().__init__()
-        self.assessment_data = assessment_data
-        self.ai_function = ai_function
+        self.db_manager = db_manager
+        self.assessment_service = assessment_service
+        self.patient_id = patient_id
 
     def run(self):
-        """Executa a tarefa demorada"""
+        # A preparação da IA roda em paralelo com a consulta ao banco
+        threading.Thread(target=self.assessment_service.warm_up, daemon=True).start()
         try:
-            resultado = self.ai_function(self.assessment_data)
-            self.finished.emit(resultado)
+            reports = self.db_manager.get_patient_reports(self.patient_id, limit=self.HISTORY_SIZE)
+            self.loaded.emit(self.patient_id, reports)
         except Exception as e:
-            print(f"Erro no worker de avaliação: {e}")
-            self.finished.emit(f"Erro ao processar avaliação: {e}")
+            print(f"❌ Erro ao carregar dados do paciente: {e}")
+            self.failed.emit(self.patient_id, str(e))
+
+# --- SALVAMENTO DO RELATÓRIO EM SEGUNDO PLANO ---
+
+class ReportSaver(QObject):
+    """
+    Worker que criptografa e grava o relatório no PostgreSQL em uma thread
+    separada. As novas tentativas usam a mesma chave de idempotência, então
+    nunca criam relatórios duplicados.
+    """
+    saved = pyqtSignal(str, int)   # Chave de idempotência e ID do relatório
+    failed = pyqtSignal(str, str)
+
+    RETRY_DELAYS = (0.5, 1.0, 2.0)
+
+    def __init__(self, db_manager, doctor_id, patient_id, report_data, idempotency_key):
+        super().__init__()
+        self.db_manager = db_manager
+        self.doctor_id = doctor_id
+        self.patient_id = patient_id
+        self.report_data = report_data
+        self.idempotency_key = idempotency_key
+
+    @classmethod
+    def save(cls, db_manager, doctor_id, patient_id, report_data, idempotency_key):
+        """Grava o relatório com novas tentativas; retorna o ID ou None"""
+        for delay in cls.RETRY_DELAYS + (None,):
+            report_id = db_manager.create_report(
+                doctor_id, patient_id, report_data, idempotency_key=idempotency_key)
+            if report_id:
+                return report_id
+            if delay is not None:
+                time.sleep(delay)
+        return None
+
+    def run(self):
+        report_id = self.save(
+            self.db_manager, self.doctor_id, self.patient_id, self.report_data, self.idempotency_key)
+        if report_id:
+            self.saved.emit(self.idempotency_key, report_id)
+        else:
+            self.failed.emit(self.idempotency_key, "Erro ao salvar relatório!")
 
+# --- PIPELINE AVALIAR -> SALVAR -> PDF ---
+
+def pdf_user_info(user):
+    """Dados do profissional (ou paciente) que assina o laudo"""
+    return {
+        "name": user["name"],
+        "user_type": user.get("user_type", "patient"),
+        "crm": user.get("crm", ""),
+    }
+
+
+class AssessmentPipeline(QObject):
+    """
+    Avaliação com IA, gravação do relatório e geração do PDF em sequência,
+    executadas como um único job da fila de avaliações.
+
+    Usa apenas dados já em memória (entradas, médico, paciente e arquivo de
+    destino escolhido antes do envio). Cada etapa anuncia início e duração
+    por sinais; o resultado final é o {'text', 'json'} da avaliação com
+    'report_id', 'pdf', 'timings' e, se uma etapa posterior à IA falhar,
+    'error'. Falhas da própria IA retornam a mensagem de erro, como em
+    ai_assessment.
+    """
+    stage_started = pyqtSignal(str)            # Nome da etapa
+    stage_finished = pyqtSignal(str, float)    # Nome da etapa e duração em segundos
+
+    STAGE_LABELS = {
+        "avaliacao": "Avaliando com a IA",
+        "salvamento": "Salvando relatório",
+        "pdf": "Gerando PDF",
+    }
+
+    def __init__(self, ai_function, db_manager, user, patient_id, patient_data, filename,
+                 cached_result=None):
+        super().__init__()
+        self.ai_function = ai_function
+        self.db_manager = db_manager
+        self.user = user
+        self.patient_id = patient_id
+        self.patient_data = patient_data
+        self.filename = filename
+        self.cached_result = cached_result
+        self.idempotency_key = uuid.uuid4().hex
+        self.timings = {}
+        self.job_id = None  # Definido ao entrar na fila
+
+    @property
+    def stages(self):
+        # Pacientes não salvam relatórios: apenas avaliação e PDF
+        if self.user["user_type"] == "doctor":
+            return ("avaliacao", "salvamento", "pdf")
+        return ("avaliacao", "pdf")
+
+    def _run_stage(self, stage, function):
+        self.stage_started.emit(stage)
+        started = time.perf_counter()
+        try:
+            return function()
+        finally:
+            self.timings[stage] = time.perf_counter() - started
+            self.stage_finished.emit(stage, self.timings[stage])
+
+    def __call__(self, data, on_chunk=None, cancel_event=None, on_status=None):
+        def assess():
+            cached = self.cached_result(data) if self.cached_result else None
+            return cached or self.ai_function(
+                data, on_chunk=on_chunk, cancel_event=cancel_event, on_status=on_status)
+
+        resultado = self._run_stage("avaliacao", assess)
+        if isinstance(resultado, str):
+            return resultado
+        resultado = dict(resultado, timings=self.timings)
+
+        if cancel_event is not None and cancel_event.is_set():
+            return "Avaliação cancelada."
+
+        report_data = build_report_data(data, resultado)
+
+        if "salvamento" in self.stages:
+            report_id = self._run_stage("salvamento", lambda: ReportSaver.save(
+                self.db_manager, self.user["id"], self.patient_id, report_data, self.idempotency_key))
+            if not report_id:
+                resultado["error"] = "Erro ao salvar relatório!"
+                return resultado
+            resultado["report_id"] = report_id
+            resultado["idempotency_key"] = self.idempotency_key
+
+        pdf_data = {
+            "avaliacaoagil": data["avaliacaoagil"],
+            "exames": data.get("exames"),
+            "ai_result": resultado["text"],
+        }
+        try:
+            resultado["pdf"] = self._run_stage("pdf", lambda: MedicalReportPDFWriter().generate_pdf(
+                pdf_data, pdf_user_info(self.user), self.patient_data, filename=self.filename))
+        except Exception as e:
+            print(f"❌ Erro ao gerar laudo: {e}")
+            resultado["error"] = f"Erro ao gerar laudo: {e}"
+        return resultado
 
 # --- CLASSE PARA FORMATAÇÃO E VALIDAÇÃO DE CPF ---
 
@@ -280,18 +473,36 @@ class HypertensionAssessment(QWidget):
         
         # Estado
         self.selected_patient_id = None
+        self.selected_patient = None  # Registro do paciente encontrado pelo CPF
         self.last_assessment = None
         self.last_assessment_report_id = None
+        self.last_assessment_key = None  # Chave de idempotência do salvamento
         self.current_assessment_data = None
 
+        # Serviço de avaliação com cache local (mesmas entradas -> mesmo resultado) e telemetria
+        self.assessment_service = AssessmentService(
+            AssessmentCache(self.db_manager.cipher), telemetry=TelemetryStore())
+        # Modelo treinado com os relatórios da IA (train_risk_model.py); None se ainda não treinado
+        self.risk_model = RiskModel.load()
+
         #flags
         self.flag_avaliar_concluida = False
         self.flag_salvar_concluido = False
         
-        # Para o threading
-        self.thread = None
-        self.worker = None
+        # Fila compartilhada de avaliações (pool de threads único)
+        self.queue = AssessmentQueue.instance()
+        self.queue.job_chunk.connect(self.on_job_chunk)
+        self.queue.job_status.connect(self.on_job_status)
+        self.queue.job_finished.connect(self.on_job_finished)
+        self.queue.depth_changed.connect(self.on_queue_depth_changed)
+        self.jobs = {}                # Jobs desta tela ainda em andamento, por ID
+        self.current_job_id = None    # Job exibido no diálogo / área de resultado
+        self.background_results = {}  # Resultados prontos em segundo plano, por paciente
         self.loading_dialog = None
+        self.streaming_started = False
+
+        # Salvamento em andamento (QThread do BackgroundThreads)
+        self.save_thread = None
         
         self.init_ui()
 
@@ -743,6 +954,17 @@ class HypertensionAssessment(QWidget):
         self.btn_pdf.clicked.connect(self.gerar_pdf)
         self.btn_pdf.setMinimumHeight(45)
         btns.addWidget(self.btn_pdf)
+
+        # Avaliação, gravação e PDF de uma vez, em segundo plano
+        pipeline_text = "⚡ Avaliar, Salvar e Gerar PDF" if self.user["user_type"] == "doctor" else "⚡ Avaliar e Gerar PDF"
+        self.btn_pipeline = QPushButton(pipeline_text)
+        self.btn_pipeline.clicked.connect(self.avaliar_salvar_pdf)
+        self.btn_pipeline.setMinimumHeight(45)
+        btns.addWidget(self.btn_pipeline)
+
+        self.chk_forcar = QCheckBox("🔁 Forçar nova avaliação")
+        self.chk_forcar.setToolTip("Ignora o resultado em cache e consulta a IA novamente")
+        btns.addWidget(self.chk_forcar)
         
         content_layout.addWidget(btns_container)
 
@@ -769,12 +991,36 @@ class HypertensionAssessment(QWidget):
             }
         """)
         result_layout.addWidget(lbl)
+
+        self.prescore_label = QLabel("")
+        self.prescore_label.setWordWrap(True)
+        self.prescore_label.setStyleSheet("font-size: 10pt; color: #2c3e50; border: none;")
+        self.prescore_label.hide()
+        result_layout.addWidget(self.prescore_label)
         
         self.result = QPlainTextEdit()
         self.result.setReadOnly(True)
         self.result.setMinimumHeight(250)
         self.result.setPlaceholderText("Os resultados da avaliação aparecerão aqui após clicar em 'Avaliar Hipertensão'...")
         result_layout.addWidget(self.result)
+
+        self.result_info_label = QLabel("")
+        self.result_info_label.setStyleSheet("font-size: 9pt; font-style: italic; color: #7f8c8d; border: none;")
+        result_layout.addWidget(self.result_info_label)
+
+        self.history_label = QLabel("")
+        self.history_label.setWordWrap(True)
+        self.history_label.setStyleSheet("font-size: 9pt; color: #2c3e50; border: none;")
+        result_layout.addWidget(self.history_label)
+
+        self.background_label = QLabel("")
+        self.background_label.setWordWrap(True)
+        self.background_label.setStyleSheet("font-size: 9pt; color: #2c3e50; border: none;")
+        result_layout.addWidget(self.background_label)
+
+        self.queue_label = QLabel("")
+        self.queue_label.setStyleSheet("font-size: 8pt; color: #7f8c8d; border: none;")
+        result_layout.addWidget(self.queue_label)
         
         content_layout.addWidget(result_container)
 
@@ -835,6 +1081,7 @@ class HypertensionAssessment(QWidget):
         
         if patient:
             self.selected_patient_id = patient['id']
+            self.selected_patient = patient
             self.patient_name_label.setText(f"{patient['name']}")
             self.patient_name_label.setStyleSheet("font-weight: bold; color: #27ae60; font-size: 11pt;")
             self.patient_status_icon.setText("✅")
@@ -846,9 +1093,14 @@ class HypertensionAssessment(QWidget):
             self.flag_salvar_concluido = False
             
             self.result.clear()
+            self.prescore_label.hide()
+            self.result_info_label.setText("")
             
-            # Carrega os dados do paciente encontrado
-            self.load_initial_data()
+            # Carrega os dados do paciente encontrado (em segundo plano)
+            self.load_initial_data(patient)
+
+            if patient['id'] in self.background_results:
+                self.show_background_result(patient['id'])
             
             # Feedback visual de sucesso
             QMessageBox.information(
@@ -858,11 +1110,13 @@ class HypertensionAssessment(QWidget):
             )
         else:
             self.selected_patient_id = None
+            self.selected_patient = None
             self.patient_name_label.setText("Paciente não encontrado ou inativo")
             self.patient_name_label.setStyleSheet("font-weight: bold; color: #e74c3c; font-size: 11pt;")
             self.patient_status_icon.setText("❌")
             self.clear_form_fields()
             self.idade.clear()
+            self.history_label.setText("")
             
             QMessageBox.warning(
                 self,
@@ -900,10 +1154,13 @@ class HypertensionAssessment(QWidget):
         self.bpm.clear()
         self.pm25.clear()
     
-    def load_initial_data(self):
-        """Carrega dados iniciais baseado no usuário ou paciente selecionado"""
+    def load_initial_data(self, patient_data=None):
+        """
+        Carrega dados iniciais baseado no usuário ou paciente selecionado.
+        A idade é exibida na hora; o último relatório e o histórico chegam
+        depois, pelo pré-carregamento em segundo plano.
+        """
         patient_id = None
-        patient_data = None
         
         # Define qual paciente buscar
         if self.user["user_type"] == "patient":
@@ -913,7 +1170,7 @@ class HypertensionAssessment(QWidget):
         elif self.user["user_type"] == "doctor":
             patient_id = self.selected_patient_id
             if patient_id:
-                patient_data = self.db_manager.get_user_by_id(patient_id)
+                patient_data = patient_data or self.db_manager.get_user_by_id(patient_id)
             else:
                 self.clear_form_fields()
                 self.idade.clear()
@@ -928,35 +1185,65 @@ class HypertensionAssessment(QWidget):
         else:
             self.idade.setText("N/A")
         
-        # Busca último relatório do paciente
+        # Busca último relatório e histórico do paciente sem travar a tela
         if patient_id:
             self.clear_form_fields() 
-            
-            last_report = self.db_manager.get_latest_patient_report(patient_id)
-            
-            if last_report and "report_data" in last_report:
-                report_data = last_report["report_data"]
-                input_data = report_data.get("input_data", {})
-                
-                # 'avaliacaoagil' ou 'autoavaliacao'
-                auto = input_data.get("autoavaliacao") or input_data.get("avaliacaoagil")
-                
-                if auto:
-                    # Preenche campos de avaliação ágil
-                    self.sexo_m.setChecked(auto.get("sexo_masculino", False))
-                    self.hist_fam.setChecked(auto.get("historico_familiar_hipertensao", False))
-                    
-                    if auto.get("altura_cm"):
-                        self.altura.set_value(auto["altura_cm"])
-                    if auto.get("peso_kg"):
-                        self.peso.set_value(auto["peso_kg"])
-                    
-                    self.frutas.set_value(auto.get("porcoes_frutas_vegetais_dia", 0))
-                    self.exercicio.set_value(auto.get("minutos_exercicio_semana", 0))
-                    self.fuma.setChecked(auto.get("fuma_atualmente", False))
-                    self.alcool.set_value(auto.get("bebidas_alcoolicas_semana", 0))
-                    self.estresse.set_value(auto.get("nivel_estresse_0_10", 0))
-                    self.sono.setChecked(auto.get("sono_qualidade_ruim", False))
+            self.start_prefetch(patient_id)
+
+    def start_prefetch(self, patient_id):
+        """Inicia o pré-carregamento do paciente e a preparação da IA"""
+        self.history_label.setText("🔄 Carregando última avaliação...")
+
+        prefetcher = PatientPrefetcher(self.db_manager, self.assessment_service, patient_id)
+        prefetcher.loaded.connect(self.on_prefetch_loaded)
+        prefetcher.failed.connect(self.on_prefetch_failed)
+        BackgroundThreads.instance().start(prefetcher, [prefetcher.loaded, prefetcher.failed])
+
+    def current_patient_id(self):
+        if self.user["user_type"] == "patient":
+            return self.user["id"]
+        return self.selected_patient_id
+
+    def on_prefetch_loaded(self, patient_id, reports):
+        """Aplica o último relatório ao formulário e exibe o histórico recente"""
+        if patient_id != self.current_patient_id():
+            return  # Outro paciente foi selecionado enquanto carregava
+
+        if reports:
+            input_data = (reports[0].get("report_data") or {}).get("input_data", {})
+            # 'avaliacaoagil' ou 'autoavaliacao'
+            auto = input_data.get("autoavaliacao") or input_data.get("avaliacaoagil")
+            if auto:
+                self.fill_form_fields(auto)
+
+            history = ", ".join(
+                f"{r['created_at'].strftime('%d/%m/%Y')} ({report_risk_level(r) or 'N/A'})"
+                for r in reports
+            )
+            self.history_label.setText(f"📋 Últimas avaliações: {history}")
+        else:
+            self.history_label.setText("📋 Nenhuma avaliação anterior")
+
+    def on_prefetch_failed(self, patient_id, error):
+        if patient_id == self.current_patient_id():
+            self.history_label.setText("⚠️ Não foi possível carregar as avaliações anteriores")
+
+    def fill_form_fields(self, auto):
+        """Preenche campos de avaliação ágil"""
+        self.sexo_m.setChecked(auto.get("sexo_masculino", False))
+        self.hist_fam.setChecked(auto.get("historico_familiar_hipertensao", False))
+        
+        if auto.get("altura_cm"):
+            self.altura.set_value(auto["altura_cm"])
+        if auto.get("peso_kg"):
+            self.peso.set_value(auto["peso_kg"])
+        
+        self.frutas.set_value(auto.get("porcoes_frutas_vegetais_dia", 0))
+        self.exercicio.set_value(auto.get("minutos_exercicio_semana", 0))
+        self.fuma.setChecked(auto.get("fuma_atualmente", False))
+        self.alcool.set_value(auto.get("bebidas_alcoolicas_semana", 0))
+        self.estresse.set_value(auto.get("nivel_estresse_0_10", 0))
+        self.sono.setChecked(auto.get("sono_qualidade_ruim", False))
             
 
     def calcular_imc(self):
@@ -978,15 +1265,16 @@ class HypertensionAssessment(QWidget):
         except:
             return 0
 
-    def avaliar_hipertensao(self):
+    def collect_assessment_data(self):
+        """Valida o formulário e monta as entradas da avaliação (None se faltar algo)"""
         if self.user["user_type"] == "doctor" and self.selected_patient_id is None:
             QMessageBox.warning(self, "Ação Necessária", "Você deve buscar e selecionar um paciente ativo pelo CPF antes de avaliar.")
-            return
+            return None
 
         idade_atual = self.get_current_age()
         if idade_atual == 0:
             QMessageBox.warning(self, "Dados Incompletos", "Não foi possível determinar a idade do paciente.")
-            return
+            return None
             
         # Monta dados de Avaliação Ágil
         auto = {
@@ -1022,168 +1310,347 @@ class HypertensionAssessment(QWidget):
                 "indice_pm25":              None if self.pm25.get_value() == 0 else self.pm25.get_value()
             }
 
-        # Armazena dados para o worker
-        self.current_assessment_data = {
+        return {
             "avaliacaoagil": auto,
             "exames": exames,
             "timestamp": datetime.now().isoformat()
         }
 
-        # Inicia popup e thread
-        self.loading_dialog = LoadingDialog(self)
-        
-        # Configura a thread e o worker
-        self.thread = QThread(self)
-        self.worker = AssessmentWorker(self.current_assessment_data, self.ai_assessment)
-        self.worker.moveToThread(self.thread)
-        
-        # Conecta os sinais
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.on_assessment_finished)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        
-        # Inicia a thread
-        self.thread.start()
-        
+    def avaliar_hipertensao(self):
+        data = self.collect_assessment_data()
+        if data is not None:
+            self.submit_assessment(data)
+
+    def avaliar_salvar_pdf(self):
+        """Avalia, salva o relatório e gera o PDF em um único job em segundo plano"""
+        data = self.collect_assessment_data()
+        if data is None:
+            return
+
+        # O arquivo é escolhido agora, na thread da interface; o resto roda no job
+        patient_data = self.pdf_patient_data()
+        filename = MedicalReportPDFWriter().get_save_filename(patient_data)
+        if not filename:
+            return
+        if not filename.lower().endswith('.pdf'):
+            filename += '.pdf'
+
+        pipeline = AssessmentPipeline(
+            self.ai_assessment, self.db_manager, self.user, self.selected_patient_id, patient_data, filename,
+            cached_result=None if self.chk_forcar.isChecked() else (
+                lambda d: self.assessment_service.cached_result(d, user_id=self.user["id"]))
+        )
+        pipeline.stage_started.connect(lambda stage: self.on_pipeline_stage(pipeline, stage))
+        pipeline.stage_finished.connect(lambda stage, seconds: self.on_pipeline_stage_finished(pipeline, stage, seconds))
+        self.submit_assessment(data, pipeline)
+
+    def submit_assessment(self, data, pipeline=None):
+        """Envia a avaliação (ou o pipeline completo) para a fila e exibe o diálogo de carregamento"""
+        # Armazena dados para o worker
+        self.current_assessment_data = data
+
+        # Pré-avaliação local instantânea (também fica visível se a IA falhar)
+        prescore_text = self.show_prescore(self.current_assessment_data)
+
+        # Mesmas entradas já avaliadas: devolve o resultado em cache instantaneamente
+        # (o pipeline consulta o cache dentro do job, para seguir com as demais etapas)
+        if pipeline is None and not self.chk_forcar.isChecked():
+            cached = self.assessment_service.cached_result(self.current_assessment_data, user_id=self.user["id"])
+            if cached:
+                self.on_assessment_finished(cached)
+                self.result_info_label.setText(
+                    "⚡ Resultado reaproveitado de uma avaliação anterior com os mesmos dados "
+                    "(marque 'Forçar nova avaliação' para consultar a IA novamente)")
+                return
+
+        # Envia para a fila compartilhada
+        job = self.queue.submit(
+            self.current_assessment_data,
+            pipeline or self.ai_assessment,
+            stream=AI_STREAMING,
+            meta={
+                "patient_id": self.selected_patient_id,
+                "patient_name": self.patient_name_label.text() if self.user["user_type"] == "doctor" else self.user["name"],
+                "pipeline": pipeline,
+            }
+        )
+        if job is None:
+            QMessageBox.warning(
+                self, "Fila Cheia",
+                "Há muitas avaliações aguardando. Aguarde algumas terminarem e tente novamente.")
+            return
+
+        if pipeline is not None:
+            pipeline.job_id = job.job_id
+        self.jobs[job.job_id] = job
+        self.current_job_id = job.job_id
+        self.streaming_started = False
+
         # Exibe o diálogo de carregamento
+        self.loading_dialog = LoadingDialog(self, detail=prescore_text, cancellable=True)
+        self.loading_dialog.cancelled.connect(self.cancel_assessment)
+        self.loading_dialog.background.connect(self.send_to_background)
         self.loading_dialog.exec_()
     
+    def cancel_assessment(self):
+        """
+        Abandona a avaliação em primeiro plano: sai da fila se ainda não
+        começou, ou deixa de aguardar a IA se já está em execução.
+        """
+        job_id = self.current_job_id
+        if job_id is None:
+            return
+        self.current_job_id = None
+        self.jobs.pop(job_id, None)
+        self.queue.cancel(job_id)
+
+        if self.loading_dialog:
+            self.loading_dialog.reject()
+        if self.streaming_started:
+            self.result.clear()
+        self.result_info_label.setText("⏹️ Avaliação cancelada")
+        self.flag_avaliar_concluida = False
+        self.flag_salvar_concluido = False
+
+    def send_to_background(self):
+        """Fecha o diálogo e deixa a avaliação atual terminar em segundo plano"""
+        job = self.jobs.get(self.current_job_id)
+        self.current_job_id = None
+        if self.loading_dialog:
+            self.loading_dialog.accept()
+        if job is not None:
+            self.result_info_label.setText(
+                f"⏳ Avaliação de {job.meta['patient_name']} continua em segundo plano")
+
+    def on_job_chunk(self, job_id, texto):
+        if job_id == self.current_job_id:
+            self.on_assessment_chunk(texto)
+
+    def on_job_status(self, job_id, position):
+        if job_id == self.current_job_id and self.loading_dialog:
+            self.loading_dialog.set_queue_position(position)
+
+    def on_pipeline_stage(self, pipeline, stage):
+        if pipeline.job_id != self.current_job_id:
+            return
+        index = pipeline.stages.index(stage) + 1
+        texto = f"⚙️ Etapa {index}/{len(pipeline.stages)}: {pipeline.STAGE_LABELS[stage]}..."
+        if self.loading_dialog and self.loading_dialog.isVisible():
+            self.loading_dialog.msg_label.setText(texto)
+        if stage != "avaliacao":
+            self.result_info_label.setText(texto)
+
+    def on_pipeline_stage_finished(self, pipeline, stage, seconds):
+        print(f"⏱️ Pipeline #{pipeline.job_id}: {pipeline.STAGE_LABELS[stage]} em {seconds:.2f}s")
+
+    def on_pipeline_finished(self, resultado):
+        """Resumo do pipeline: tempos por etapa, arquivo gerado e eventual falha"""
+        timings = "  ·  ".join(
+            f"{AssessmentPipeline.STAGE_LABELS[stage]}: {seconds:.1f}s"
+            for stage, seconds in resultado.get("timings", {}).items()
+        )
+        self.result_info_label.setText(f"⏱️ {timings}")
+        if resultado.get("error"):
+            QMessageBox.warning(self, "Erro", resultado["error"])
+        elif resultado.get("pdf"):
+            QMessageBox.information(
+                self,
+                "✅ Laudo Gerado",
+                f"Avaliação concluída{' e relatório salvo' if resultado.get('report_id') else ''}.\n\n"
+                f"📁 Laudo salvo em:\n{resultado['pdf']}"
+            )
+
+    def on_job_finished(self, job_id, resultado):
+        """Recebe o resultado de qualquer job da fila e o encaminha"""
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return  # Job de outra tela ou cancelado
+
+        if isinstance(resultado, RetryableErrorMessage) and self.queue_offline(job, resultado):
+            self.on_queued_offline(job)
+            return
+
+        if job_id == self.current_job_id:
+            self.current_job_id = None
+            self.current_assessment_data = job.data
+            self.on_assessment_finished(resultado)
+            if job.meta.get("pipeline") is not None and isinstance(resultado, dict):
+                self.on_pipeline_finished(resultado)
+            return
+
+        # Terminou em segundo plano
+        if isinstance(resultado, str):
+            self.background_label.setText(
+                f"❌ Avaliação de {job.meta['patient_name']} em segundo plano falhou: {resultado}")
+            return
+
+        self.background_results[job.meta["patient_id"]] = (job.data, resultado)
+        if job.meta["patient_id"] == self.selected_patient_id and self.current_job_id is None:
+            self.show_background_result(job.meta["patient_id"])
+        else:
+            self.update_background_label()
+
+    def queue_offline(self, job, erro):
+        """Guarda na fila offline uma avaliação que falhou por indisponibilidade; retorna True se guardou"""
+        drainer = getattr(self.db_manager, "offline_drainer", None)
+        if drainer is None or self.user["user_type"] != "doctor" or not job.meta.get("patient_id"):
+            return False
+        try:
+            drainer.enqueue(self.user["id"], job.meta["patient_id"], job.data, error=erro)
+            return True
+        except Exception as e:
+            print(f"❌ Erro ao guardar avaliação na fila offline: {e}")
+            return False
+
+    def on_queued_offline(self, job):
+        message = (f"📴 IA indisponível: a avaliação de {job.meta['patient_name']} foi guardada e será "
+                   "feita e salva automaticamente quando a conexão voltar (veja em 'Meus Relatórios').")
+        if job.job_id != self.current_job_id:
+            self.background_label.setText(message)
+            return
+
+        self.current_job_id = None
+        if self.loading_dialog:
+            self.loading_dialog.accept()
+        if self.streaming_started:
+            self.result.clear()
+        self.result_info_label.setText("📴 Avaliação guardada na fila offline")
+        self.flag_avaliar_concluida = False
+        self.flag_salvar_concluido = False
+        QMessageBox.information(self, "Avaliação Pendente", message)
+
+    def show_background_result(self, patient_id):
+        """Exibe um resultado concluído em segundo plano para o paciente selecionado"""
+        data, resultado = self.background_results.pop(patient_id)
+        self.fill_form_fields(data["avaliacaoagil"])
+        self.current_assessment_data = data
+        self.on_assessment_finished(resultado)
+        self.result_info_label.setText("📥 Resultado concluído em segundo plano")
+        self.update_background_label()
+
+    def update_background_label(self):
+        names = [job.meta["patient_name"] for job in self.jobs.values() if job.job_id != self.current_job_id]
+        ready = len(self.background_results)
+        parts = []
+        if names:
+            parts.append(f"⏳ Em segundo plano: {', '.join(names)}")
+        if ready:
+            parts.append(f"📥 {ready} resultado(s) pronto(s) — selecione o paciente para ver")
+        self.background_label.setText("  ·  ".join(parts))
+
+    def on_queue_depth_changed(self, waiting, running):
+        metrics = self.queue.metrics()
+        self.queue_label.setText(
+            f"Fila de avaliações: {waiting} aguardando, {running} em execução · "
+            f"espera média {metrics['avg_wait_seconds']:.1f}s")
+        self.update_background_label()
+
+    def show_prescore(self, data):
+        """Calcula e exibe a pontuação local por regras; retorna o texto exibido"""
+        try:
+            prescore = RiskScoreEngine.score(data)
+        except Exception as e:
+            print(f"❌ Erro na pré-avaliação local: {e}")
+            self.prescore_label.hide()
+            return None
+
+        text = f"🧮 Pré-avaliação local: {prescore['score']} pontos — {prescore['level']}"
+        if prescore["factors"]:
+            text += f"\n{', '.join(prescore['factors'])}"
+        tooltip = "Pontuação calculada por regras fixas, sem IA."
+
+        if self.risk_model is not None:
+            try:
+                opinion = self.risk_model.predict(data)
+                text += f"\n📈 Segunda opinião (modelo treinado): {opinion['score']} pontos — {opinion['level']}"
+                agreement = self.risk_model.metrics.get("level_agreement")
+                if agreement is not None:
+                    tooltip += (f"\nSegunda opinião: modelo treinado com avaliações anteriores da IA, "
+                                f"mesmo nível da IA em {agreement:.0%} dos casos de teste.")
+            except Exception as e:
+                print(f"❌ Erro na segunda opinião do modelo treinado: {e}")
+
+        self.prescore_label.setText(text)
+        self.prescore_label.setToolTip(f"{tooltip}\nO relatório da IA abaixo é a avaliação completa.")
+        self.prescore_label.show()
+        return text
+
+    def on_assessment_chunk(self, texto):
+        """Recebe um trecho da resposta em streaming e o exibe imediatamente"""
+        if not self.streaming_started:
+            # Primeiro token: fecha o popup e começa a preencher o resultado
+            self.streaming_started = True
+            if self.loading_dialog:
+                self.loading_dialog.accept()
+            self.result.clear()
+            self.result_info_label.setText("⏳ Recebendo avaliação da IA...")
+
+        self.result.moveCursor(QTextCursor.End)
+        self.result.insertPlainText(texto)
+
     def on_assessment_finished(self, resultado):
         """Chamado quando a thread de avaliação termina"""
         # Fecha o popup
         if self.loading_dialog:
             self.loading_dialog.accept()
+
+        self.result_info_label.setText("")
             
-        # Lida com o resultado
-        if "Erro" in resultado:
+        # Lida com o resultado (mensagens de erro chegam como texto)
+        if isinstance(resultado, str):
+            # Descarta uma resposta parcial recebida antes da falha
+            self.result.clear()
             QMessageBox.critical(self, "Erro na Avaliação", resultado)
             self.flag_avaliar_concluida = False
             self.flag_salvar_concluido = False
             return
 
-        self.result.setPlainText(resultado)
+        self.result.setPlainText(resultado["text"])
         
-        # Armazena o último resultado
-        self.last_assessment = {
-            "input_data": self.current_assessment_data,
-            "ai_result": resultado
-        }
+        # Armazena o último resultado (no modo estruturado, com o JSON de pontuação, nível e listas)
+        self.last_assessment = build_report_data(self.current_assessment_data, resultado)
         
-        # Reseta o ID do relatório salvo
+        if resultado.get("model") and resultado["model"] != self.assessment_service.primary_model:
+            origem = "regras locais" if resultado["model"] == LOCAL_MODEL else f"modelo {resultado['model']}"
+            self.result_info_label.setText(f"⚠️ A IA principal não respondeu a tempo: resultado gerado por {origem}")
+
+        # Reseta o ID do relatório salvo; a nova avaliação ganha sua própria chave de salvamento
         self.last_assessment_report_id = None
+        self.last_assessment_key = uuid.uuid4().hex
         
         self.flag_avaliar_concluida = True
         self.flag_salvar_concluido = False
+
+        if resultado.get("report_id"):
+            # Já salvo pelo pipeline: um novo "Salvar" reutiliza a mesma chave e não duplica
+            self.last_assessment_report_id = resultado["report_id"]
+            self.last_assessment_key = resultado["idempotency_key"]
+            self.flag_salvar_concluido = True
              
              
-    def ai_assessment(self, data):
-        """Avaliação de risco de hipertensão usando Gemini AI"""
-        
-        API_KEY = os.getenv("GEMINI_API_KEY")
-        if not API_KEY:
-             return "Erro: GEMINI_API_KEY não configurada no ambiente."
-
+    def ai_assessment(self, data, on_chunk=None, cancel_event=None, on_status=None):
+        """
+        Avaliação de risco de hipertensão usando Gemini AI.
+        Se on_chunk for informado, a resposta é recebida em streaming;
+        on_status recebe a posição na fila de envio da IA.
+        Retorna {'text', 'json'} ou uma mensagem de erro (RetryableErrorMessage
+        se a falha for temporária e a avaliação puder ir para a fila offline).
+        Sem a chave da API, assess() recorre ao motor de regras se ele estiver
+        em AI_MODEL_CHAIN e só falha quando a cadeia não tem opção utilizável.
+        """
         try:
-            genai.configure(api_key=API_KEY)
-            model = genai.GenerativeModel('gemini-2.0-flash')
-            chat = model.start_chat(history=[])
-            
-            auto = data["avaliacaoagil"]
-            exames = data.get("exames")
-            
-            imc = None
-            if auto["altura_cm"] > 0 and auto["peso_kg"] > 0:
-                imc = auto["peso_kg"] / ((auto["altura_cm"]/100) ** 2)
-            
-            imc_str = f"{imc:.1f}" if imc else "Não calculado"
-            
-            # Constrói prompt estruturado
-            prompt = f"""
-Você é um especialista em cardiologia e medicina preventiva. Analise os dados do paciente e forneça uma avaliação de risco de hipertensão seguindo EXATAMENTE o formato especificado abaixo.
-
-DADOS DO PACIENTE:
-=================
-
-DADOS DEMOGRÁFICOS E ESTILO de VIDA:
-• Idade: {auto['idade_anos']} anos
-• Sexo: {'Masculino' if auto['sexo_masculino'] else 'Feminino'}
-• Histórico familiar de hipertensão: {'Sim' if auto['historico_familiar_hipertensao'] else 'Não'}
-• Altura: {auto['altura_cm']} cm
-• Peso: {auto['peso_kg']} kg
-• IMC: {imc_str}
-• Porções de frutas/vegetais por dia: {auto['porcoes_frutas_vegetais_dia']}
-• Minutos de exercício por semana: {auto['minutos_exercicio_semana']}
-• Fuma atualmente: {'Sim' if auto['fuma_atualmente'] else 'Não'}
-• Bebidas alcoólicas por semana: {auto['bebidas_alcoolicas_semana']}
-• Nível de estresse (0-10): {auto['nivel_estresse_0_10']}
-• Qualidade do sono ruim: {'Sim' if auto['sono_qualidade_ruim'] else 'Não'}
-
-EXAMES LABORATORIAIS:
-"""
-
-            if exames:
-                prompt += f"""
-• Colesterol LDL: {exames.get('colesterol_ldl_mg_dL', 'Não informado') or 'Não informado'} mg/dL
-• Colesterol HDL: {exames.get('colesterol_hdl_mg_dL', 'Não informado') or 'Não informado'} mg/dL
-• Triglicerídeos: {exames.get('triglicerideos_mg_dL', 'Não informado') or 'Não informado'} mg/dL
-• Glicemia de jejum: {exames.get('glicemia_jejum_mg_dL', 'Não informado') or 'Não informado'} mg/dL
-• HbA1c: {exames.get('hba1c_percent', 'Não informado') or 'Não informado'}%
-• Creatinina: {exames.get('creatinina_mg_dL', 'Não informado') or 'Não informado'} mg/dL
-• Proteinúria: {'Positiva' if exames.get('proteinuria_positiva', False) else 'Negativa'}
-• Diagnóstico de apneia do sono: {'Sim' if exames.get('diagnostico_apneia_sono', False) else 'Não'}
-• Cortisol sérico: {exames.get('cortisol_serico_ug_dL', 'Não informado') or 'Não informado'} μg/dL
-• Mutação genética para hipertensão: {'Sim' if exames.get('mutacao_genetica_hipertensao', False) else 'Não'}
-• BPM em repouso: {exames.get('bpm_repouso', 'Não informado') or 'Não informado'}
-• Índice PM2.5: {exames.get('indice_pm25', 'Não informado') or 'Não informado'}
-"""
-            else:
-                prompt += "Não foram fornecidos exames laboratoriais.\n"
-
-            prompt += f"""
-
-INSTRUÇÕES PARA AVALIAÇÃO:
-=========================
-1. Analise todos os fatores de risco para hipertensão presentes nos dados.
-2. Calcule uma pontuação de risco (0-100) e classifique (BAIXO, MODERADO, ALTO, MUITO ALTO).
-3. Forneça recomendações específicas.
-
-FORMATO DE RESPOSTA OBRIGATÓRIO:
-===============================
-🏥 RELATÓRIO DE AVALIAÇÃO DE RISCO DE HIPERTENSÃO
-
-📊 PONTUAÇÃO DE RISCO: [pontuação] pontos
-🎯 NÍVEL DE RISCO: [BAIXO/MODERADO/ALTO/MUITO ALTO]
-
-⚠️ FATORES DE RISCO IDENTIFICADOS:
-[Liste numericamente cada fator de risco encontrado, um por linha]
-
-💡 RECOMENDAÇÕES:
-[Recomendações específicas baseadas no perfil do paciente]
-
-📝 ORIENTAÇÕES GERAIS:
-• Manter pressão arterial abaixo de 120/80 mmHg
-• Praticar exercícios regulares (mínimo 150min/semana)
-• Manter dieta rica em frutas, vegetais e pobre em sódio
-• Controlar peso corporal (IMC < 25)
-• Evitar tabagismo e consumo excessivo de álcool
-• Gerenciar níveis de estresse
-• Manter qualidade adequada do sono
-
-⏰ Data da Avaliação: {datetime.now().strftime('%d/%m/%Y %H:%M')}
-
-IMPORTANTE: Esta avaliação é apenas informativa. 
-Consulte sempre um médico para diagnóstico e tratamento adequados.
-
-RESPONDA APENAS COM O RELATÓRIO NO FORMATO ESPECIFICADO ACIMA.
-"""
-
-            response = chat.send_message(prompt)
-            return response.text
-            
+            return self.assessment_service.assess(
+                data, on_chunk=on_chunk, cancel_event=cancel_event, on_status=on_status,
+                user_id=self.user["id"])
+        except AssessmentCancelled:
+            return "Avaliação cancelada."
+        except RateLimitError:
+            return RetryableErrorMessage(
+                "Erro: limite de requisições da IA atingido. Tente novamente em alguns instantes.")
         except Exception as e:
             print(f"Erro na avaliação com Gemini: {e}")
+            if is_transient_error(e):
+                return RetryableErrorMessage(f"Erro ao avaliar com Gemini: {str(e)}")
             return f"Erro ao avaliar com Gemini: {str(e)}"
 
     def salvar_relatorio(self):
@@ -1200,24 +1667,62 @@ RESPONDA APENAS COM O RELATÓRIO NO FORMATO ESPECIFICADO ACIMA.
             QMessageBox.warning(self, "Erro", "Nenhum paciente selecionado!")
             return
 
-        patient_id = self.selected_patient_id
+        if self.save_thread is not None:
+            return  # Já existe um salvamento em andamento
+
+        if self.flag_salvar_concluido:
+            QMessageBox.information(self, "Sucesso", "Este relatório já foi salvo.")
+            return
+
+        # Criptografia e gravação rodam em segundo plano; a tela mostra "Salvando..."
+        self.btn_salvar.setEnabled(False)
+        self.btn_salvar.setText("💾 Salvando...")
+        self.result_info_label.setText("💾 Salvando relatório...")
 
-        # Salva no banco
-        report_id = self.db_manager.create_report(
-            self.user["id"],
-            patient_id,
-            self.last_assessment
+        saver = ReportSaver(
+            self.db_manager, self.user["id"], self.selected_patient_id,
+            self.last_assessment, self.last_assessment_key
         )
+        saver.saved.connect(self.on_report_saved)
+        saver.failed.connect(self.on_report_save_failed)
+        self.save_thread = BackgroundThreads.instance().start(
+            saver, [saver.saved, saver.failed], on_finished=self.on_save_finished)
+
+    def on_save_finished(self):
+        self.save_thread = None
+        self.btn_salvar.setEnabled(True)
+        self.btn_salvar.setText("💾 Salvar Relatório")
+
+    def on_report_saved(self, idempotency_key, report_id):
+        if idempotency_key != self.last_assessment_key:
+            return  # Uma nova avaliação já substituiu a que foi salva
+        self.last_assessment_report_id = report_id
+        self.flag_salvar_concluido = True
+        self.result_info_label.setText("✅ Relatório salvo")
+        QMessageBox.information(
+            self, "Sucesso", "Relatório salvo com sucesso!")
+
+    def on_report_save_failed(self, idempotency_key, error):
+        if idempotency_key != self.last_assessment_key:
+            return
+        self.flag_salvar_concluido = False
+        self.result_info_label.setText("")
+        QMessageBox.warning(self, "Erro", error)
 
-        if report_id:
-            QMessageBox.information(
-                self, "Sucesso", "Relatório salvo com sucesso!")
-            self.last_assessment_report_id = report_id
-            self.flag_salvar_concluido = True
-        else:
-            QMessageBox.warning(self, "Erro", "Erro ao salvar relatório!")
-            self.flag_salvar_concluido = False
 
+    def pdf_patient_data(self):
+        """Nome e CPF do paciente para o laudo, a partir dos dados já em memória"""
+        if self.user["user_type"] == "doctor" and self.selected_patient:
+            return {
+                "name": self.selected_patient.get("name"),
+                "cpf": self.selected_patient.get("cpf", "N/A")
+            }
+        elif self.user["user_type"] == "patient":
+            return {
+                "name": self.user["name"],
+                "cpf": self.user.get("cpf", "N/A")
+            }
+        return None
 
     def gerar_pdf(self):
         """Método para gerar PDF no estilo oficial preto e branco"""
@@ -1238,31 +1743,9 @@ RESPONDA APENAS COM O RELATÓRIO NO FORMATO ESPECIFICADO ACIMA.
                 "ai_result": self.last_assessment["ai_result"]
             }
             
-            user_info = {
-                "name": self.user["name"],
-                "user_type": self.user.get("user_type", "patient"),
-                "crm": self.user.get("crm", ""),
-            }
-            
-            # Monta dados do paciente com nome e CPF
-            patient_data = None
-            if self.user["user_type"] == "doctor" and self.selected_patient_id:
-                # Busca dados completos do paciente
-                patient = self.db_manager.get_user_by_id(self.selected_patient_id)
-                if patient:
-                    patient_data = {
-                        "name": patient.get("name"),
-                        "cpf": patient.get("cpf", "N/A")
-                    }
-            elif self.user["user_type"] == "patient":
-                patient_data = {
-                    "name": self.user["name"],
-                    "cpf": self.user.get("cpf", "N/A")
-                }
-            
             # Gera o PDF
             generator = MedicalReportPDFWriter()
-            filename = generator.generate_pdf(data, user_info, patient_data)
+            filename = generator.generate_pdf(data, pdf_user_info(self.user), self.pdf_patient_data())
         
             if filename:
                 QMessageBox.information(
@@ -203,14 +203,15 @@ class MedicalReportPDFWriter:
         
         return y_pos - box_height
 
-    def generate_pdf(self, data, user_info, patient_data=None):
+    def generate_pdf(self, data, user_info, patient_data=None, filename=None):
         """
         Gera o PDF com os dados fornecidos
-        Abre diálogo para o usuário escolher onde salvar
+        Sem filename, abre diálogo para o usuário escolher onde salvar
+        (com filename já escolhido, pode rodar fora da thread da interface)
         Abre automaticamente o PDF após salvar
         Retorna o caminho do arquivo salvo ou None se cancelado
         """
-        self.filename = self.get_save_filename(patient_data)
+        self.filename = filename or self.get_save_filename(patient_data)
         
         if not self.filename:
             return None
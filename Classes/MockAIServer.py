@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Servidor HTTP local que imita a IA para testes, benchmarks e lotes.
+Responde a POST /generate com um relatório fixo no formato esperado, com
+latência e taxas de erro configuráveis para medir vazão e timeouts.
+
+Uso: python -m Classes.MockAIServer --port 8765 --latency-ms 1500 --error-rate 0.05
+e no .env: HIPAI_AI_BACKEND=mock e AI_MOCK_URL=http://localhost:8765
+
+Para testar a cadeia de modelos (AI_MODEL_CHAIN), --model-latency define a
+latência de um modelo específico: --model-latency gemini-2.0-flash=30000
+"""
+
+import json
+import time
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+CANNED_REPORT = """🏥 RELATÓRIO DE AVALIAÇÃO DE RISCO DE HIPERTENSÃO
+
+📊 PONTUAÇÃO DE RISCO: 42 pontos
+🎯 NÍVEL DE RISCO: MODERADO
+
+⚠️ FATORES DE RISCO IDENTIFICADOS:
+1. Sobrepeso
+2. Sedentarismo
+
+💡 RECOMENDAÇÕES:
+Aumentar a atividade física e reduzir o consumo de sódio.
+
+📝 ORIENTAÇÕES GERAIS:
+• Manter pressão arterial abaixo de 120/80 mmHg
+• Praticar exercícios regulares (mínimo 150min/semana)
+
+IMPORTANTE: Esta avaliação é apenas informativa.
+Consulte sempre um médico para diagnóstico e tratamento adequados.
+"""
+
+
+CANNED_JSON = {
+    "score": 42,
+    "level": "MODERADO",
+    "risk_factors": ["Sobrepeso", "Sedentarismo"],
+    "recommendations": ["Aumentar a atividade física e reduzir o consumo de sódio."],
+}
+
+
+class MockAIHandler(BaseHTTPRequestHandler):
+    # Ajustados por main() a partir da linha de comando
+    latency_ms = 0
+    jitter_ms = 0
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    chunks = 8
+    model_latency_ms = {}  # Latência própria por modelo, em vez de latency_ms
+
+    def do_POST(self):
+        if self.path != '/generate':
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self.send_error(400, "JSON inválido")
+            return
+
+        latency_ms = self.model_latency_ms.get(request.get("model"), self.latency_ms)
+        latency = max(0.0, random.gauss(latency_ms, self.jitter_ms) / 1000) if self.jitter_ms else latency_ms / 1000
+
+        draw = random.random()
+        if draw < self.rate_limit_rate:
+            self._send_json(429, {"error": "Limite de requisições atingido"})
+            return
+        if draw < self.rate_limit_rate + self.error_rate:
+            time.sleep(latency)
+            self._send_json(500, {"error": "Falha simulada"})
+            return
+
+        if request.get("json"):
+            text = json.dumps(CANNED_JSON, ensure_ascii=False)
+        else:
+            text = CANNED_REPORT
+        # Estimativa grosseira (~4 caracteres por token), só para comparações relativas;
+        # a system instruction simula um prefixo atendido pelo cache
+        system = request.get("system") or ""
+        usage = {
+            "prompt_tokens": (len(system) + len(request.get("prompt") or "")) // 4,
+            "output_tokens": len(text) // 4,
+            "cached_tokens": len(system) // 4,
+        }
+        if request.get("stream"):
+            self._send_stream(text, latency, usage)
+        else:
+            time.sleep(latency)
+            self._send_json(200, {"text": text, "usage": usage})
+
+    def _send_stream(self, text, latency, usage):
+        """Envia o texto em trechos (uma linha JSON cada), distribuindo a latência"""
+        size = max(1, len(text) // self.chunks + 1)
+        parts = [text[i:i + size] for i in range(0, len(text), size)]
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.end_headers()
+        lines = [{"text": part} for part in parts] + [{"usage": usage}]
+        try:
+            for line in lines:
+                if "text" in line:
+                    time.sleep(latency / len(parts))
+                self.wfile.write(json.dumps(line, ensure_ascii=False).encode() + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # O cliente desistiu (timeout)
+        self.close_connection = True
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # O cliente desistiu (timeout ou hedge)
+
+    def log_message(self, format, *args):
+        pass  # Silencioso: o volume de requisições em lote poluiria o terminal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita a IA")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0, help="Latência média de cada resposta")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Desvio padrão da latência")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fração de respostas HTTP 500")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="Fração de respostas HTTP 429")
+    parser.add_argument('--chunks', type=int, default=8, help="Trechos por resposta em streaming")
+    parser.add_argument('--model-latency', action='append', default=[], metavar='MODELO=MS',
+                        help="Latência de um modelo específico (pode repetir)")
+    args = parser.parse_args()
+
+    for entry in args.model_latency:
+        model, _, latency_ms = entry.partition('=')
+        try:
+            MockAIHandler.model_latency_ms[model.strip()] = float(latency_ms)
+        except ValueError:
+            parser.error(f"--model-latency inválido: {entry} (formato MODELO=MS)")
+
+    MockAIHandler.latency_ms = args.latency_ms
+    MockAIHandler.jitter_ms = args.jitter_ms
+    MockAIHandler.error_rate = args.error_rate
+    MockAIHandler.rate_limit_rate = args.rate_limit_rate
+    MockAIHandler.chunks = max(1, args.chunks)
+
+    server = ThreadingHTTPServer((args.host, args.port), MockAIHandler)
+    print(f"✅ Servidor de IA simulada em http://{args.host}:{args.port} "
+          f"(latência {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, "
+          f"erros {args.error_rate:.0%}, 429 {args.rate_limit_rate:.0%})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import random
+import sqlite3
+
+from Classes.Helpers import get_cache_dir
+from Classes.AssessmentBackend import TransientAIError
+
+
+def is_transient_error(error):
+    """Falhas de rede, prazo esgotado ou indisponibilidade temporária da IA"""
+    return isinstance(error, (TransientAIError, TimeoutError, OSError))
+
+
+class RetryableErrorMessage(str):
+    """
+    Mensagem de erro de uma avaliação que falhou por indisponibilidade
+    temporária e pode ser refeita depois (continua sendo uma str comum).
+    """
+
+
+class OfflineAssessmentQueue:
+    """
+    Fila persistente (SQLite) de avaliações que não puderam ser feitas porque
+    a rede, o banco ou a IA estavam indisponíveis.
+
+    Os dados de entrada ficam criptografados com a chave do sistema até serem
+    avaliados e salvos pelo OfflineQueueDrainer. Falhas temporárias (rede,
+    IA indisponível) adiam a próxima tentativa com espera exponencial
+    (AI_OFFLINE_RETRY_SECONDS até AI_OFFLINE_MAX_RETRY_SECONDS); as demais
+    só são refeitas até AI_OFFLINE_MAX_ATTEMPTS tentativas, depois a
+    avaliação fica no estado terminal 'failed' até o médico descartá-la.
+    """
+
+    def __init__(self, cipher, path=None, base_delay=None, max_delay=None, max_attempts=None):
+        self.cipher = cipher
+        self.path = path or os.path.join(get_cache_dir(), "offline_queue.sqlite3")
+        self.base_delay = base_delay or float(os.getenv('AI_OFFLINE_RETRY_SECONDS', '30'))
+        self.max_delay = max_delay or float(os.getenv('AI_OFFLINE_MAX_RETRY_SECONDS', '1800'))
+        self.max_attempts = max_attempts or int(os.getenv('AI_OFFLINE_MAX_ATTEMPTS', '3'))
+        self.create_table()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create_table(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_assessments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    doctor_id INTEGER NOT NULL,
+                    patient_id INTEGER NOT NULL,
+                    payload_encrypted TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending'
+                )
+            """)
+            # Filas criadas antes do estado terminal 'failed'
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(pending_assessments)")}
+            if "status" not in columns:
+                conn.execute("ALTER TABLE pending_assessments ADD COLUMN status TEXT NOT NULL DEFAULT 'pending'")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pending_next_attempt ON pending_assessments(next_attempt_at)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def enqueue(self, doctor_id, patient_id, data, error=None):
+        """Guarda uma avaliação pendente, pronta para a próxima tentativa; retorna o ID"""
+        now = time.time()
+        encrypted = self.cipher.encrypt(json.dumps(data).encode()).decode()
+        conn = self._connect()
+        try:
+            cursor = conn.execute(
+                "INSERT INTO pending_assessments "
+                "(doctor_id, patient_id, payload_encrypted, created_at, next_attempt_at, last_error) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (doctor_id, patient_id, encrypted, now, now, error)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def due(self, limit=10):
+        """Avaliações cuja próxima tentativa já chegou, das mais antigas às mais novas"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, doctor_id, patient_id, payload_encrypted, created_at, attempts "
+                "FROM pending_assessments WHERE status = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY created_at LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        items = []
+        for row in rows:
+            try:
+                data = json.loads(self.cipher.decrypt(row[3].encode()).decode())
+            except Exception as e:
+                print(f"❌ Erro ao ler avaliação pendente {row[0]}: {e}")
+                continue
+            items.append({
+                "id": row[0],
+                "doctor_id": row[1],
+                "patient_id": row[2],
+                "data": data,
+                "created_at": row[4],
+                "attempts": row[5],
+                # Estável entre tentativas: salvar de novo após uma falha não duplica o relatório
+                "idempotency_key": f"offline-{row[1]}-{row[2]}-{row[4]:.6f}",
+            })
+        return items
+
+    def mark_failed(self, item_id, error, transient=True):
+        """
+        Registra a falha e adia a próxima tentativa (espera exponencial com
+        variação). Falhas não temporárias levam a avaliação ao estado
+        terminal 'failed' ao atingir max_attempts. Retorna True se a
+        avaliação continua na fila.
+        """
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT attempts FROM pending_assessments WHERE id = ?", (item_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            attempts = row[0] + 1
+            if not transient and attempts >= self.max_attempts:
+                conn.execute(
+                    "UPDATE pending_assessments SET attempts = ?, status = 'failed', last_error = ? WHERE id = ?",
+                    (attempts, str(error), item_id)
+                )
+                conn.commit()
+                return False
+            delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1)) * random.uniform(0.8, 1.2)
+            conn.execute(
+                "UPDATE pending_assessments SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (attempts, time.time() + delay, str(error), item_id)
+            )
+            conn.commit()
+            return True
+        finally:
+            conn.close()
+
+    def remove(self, item_id):
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM pending_assessments WHERE id = ?", (item_id,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def count(self, doctor_id=None):
+        """Quantidade de avaliações pendentes (de um médico, se informado)"""
+        conn = self._connect()
+        try:
+            if doctor_id is None:
+                return conn.execute(
+                    "SELECT COUNT(*) FROM pending_assessments WHERE status = 'pending'").fetchone()[0]
+            return conn.execute(
+                "SELECT COUNT(*) FROM pending_assessments WHERE status = 'pending' AND doctor_id = ?",
+                (doctor_id,)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    def failed(self, doctor_id):
+        """Avaliações de um médico que falharam definitivamente (sem os dados de entrada)"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id, patient_id, created_at, attempts, last_error FROM pending_assessments "
+                "WHERE status = 'failed' AND doctor_id = ? ORDER BY created_at",
+                (doctor_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [
+            {"id": row[0], "patient_id": row[1], "created_at": row[2], "attempts": row[3], "last_error": row[4]}
+            for row in rows
+        ]
+
+    def discard_failed(self, doctor_id):
+        """Remove as avaliações de um médico que falharam definitivamente"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM pending_assessments WHERE status = 'failed' AND doctor_id = ?", (doctor_id,))
+            conn.commit()
+        finally:
+            conn.close()
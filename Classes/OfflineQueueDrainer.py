@@ -0,0 +1,119 @@
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from Classes.AssessmentCache import AssessmentCache
+from Classes.AssessmentService import AssessmentService, AssessmentCancelled, build_report_data
+from Classes.OfflineAssessmentQueue import OfflineAssessmentQueue, is_transient_error
+from Classes.RequestScheduler import PRIORITY_BATCH
+from Classes.TelemetryStore import TelemetryStore
+
+
+class OfflineQueueDrainer(QThread):
+    """
+    Thread que esvazia a fila offline: refaz as avaliações pendentes quando
+    a IA volta a responder e salva o relatório com create_report, em nome
+    do médico que pediu a avaliação.
+
+    Cada relatório salvo é anunciado por report_saved, no mesmo formato das
+    notificações do DatabaseListener, para que a ReportsView do médico se
+    atualize. Uma falha temporária (IA ou banco indisponíveis) interrompe a
+    rodada e a avaliação volta para a fila com espera exponencial; as demais
+    falhas seguem para a próxima avaliação e, esgotadas as tentativas, são
+    anunciadas por assessment_failed para que o médico refaça a avaliação.
+    """
+    report_saved = pyqtSignal(dict)       # {'op', 'id', 'doctor_id', 'patient_id'}
+    pending_changed = pyqtSignal(int)     # Avaliações ainda pendentes
+    assessment_failed = pyqtSignal(dict)  # {'id', 'doctor_id', 'patient_id', 'created_at', 'error'}
+
+    POLL_INTERVAL = 5.0  # segundos entre verificações da fila
+    BATCH_SIZE = 10
+
+    def __init__(self, db_manager, parent=None):
+        super().__init__(parent)
+        self.db_manager = db_manager
+        self.queue = OfflineAssessmentQueue(db_manager.cipher)
+        self.service = AssessmentService(AssessmentCache(db_manager.cipher), telemetry=TelemetryStore())
+        self._running = False
+        self._wake = threading.Event()
+        self._stop_event = threading.Event()
+
+    def enqueue(self, doctor_id, patient_id, data, error=None):
+        """Guarda uma avaliação para ser refeita e salva automaticamente; retorna o ID"""
+        item_id = self.queue.enqueue(doctor_id, patient_id, data, error)
+        print(f"📴 Avaliação guardada na fila offline (#{item_id})")
+        self.pending_changed.emit(self.queue.count())
+        self._wake.set()
+        return item_id
+
+    def pending_count(self, doctor_id=None):
+        return self.queue.count(doctor_id)
+
+    def failed_items(self, doctor_id):
+        return self.queue.failed(doctor_id)
+
+    def discard_failed(self, doctor_id):
+        self.queue.discard_failed(doctor_id)
+
+    def stop(self):
+        """Solicita a parada da thread (interrompendo a espera pela IA) e aguarda o término"""
+        self._running = False
+        self._stop_event.set()
+        self._wake.set()
+        self.wait()
+
+    def run(self):
+        self._running = True
+        while self._running:
+            for item in self.queue.due(self.BATCH_SIZE):
+                if not self._running or not self._process(item):
+                    break
+            self._wake.wait(self.POLL_INTERVAL)
+            self._wake.clear()
+
+    def _fail(self, item, error, transient):
+        """Registra a falha de uma avaliação; retorna False se a rodada deve ser interrompida"""
+        if self.queue.mark_failed(item["id"], error, transient):
+            print(f"⚠️ Avaliação pendente #{item['id']} ainda não pôde ser feita: {error}")
+        else:
+            print(f"❌ Avaliação pendente #{item['id']} falhou definitivamente: {error}")
+            self.assessment_failed.emit({
+                "id": item["id"],
+                "doctor_id": item["doctor_id"],
+                "patient_id": item["patient_id"],
+                "created_at": item["created_at"],
+                "error": str(error),
+            })
+            self.pending_changed.emit(self.queue.count())
+        return not transient
+
+    def _process(self, item):
+        """Avalia e salva uma avaliação pendente; retorna False se a rodada deve ser interrompida"""
+        try:
+            result = self.service.assess(
+                item["data"],
+                cancel_event=self._stop_event,
+                priority=PRIORITY_BATCH,
+                user_id=item["doctor_id"]
+            )
+        except AssessmentCancelled:
+            return False
+        except Exception as e:
+            return self._fail(item, e, is_transient_error(e))
+
+        report_data = build_report_data(item["data"], result)
+        report_id = self.db_manager.create_report(
+            item["doctor_id"], item["patient_id"], report_data, idempotency_key=item["idempotency_key"])
+        if not report_id:
+            # create_report só falha assim quando o banco está inacessível
+            return self._fail(item, "Erro ao salvar relatório no banco", transient=True)
+
+        self.queue.remove(item["id"])
+        print(f"✅ Avaliação pendente #{item['id']} salva como relatório {report_id}")
+        self.report_saved.emit({
+            "op": "INSERT",
+            "id": report_id,
+            "doctor_id": item["doctor_id"],
+            "patient_id": item["patient_id"],
+        })
+        self.pending_changed.emit(self.queue.count())
+        return True
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from Classes.AIClient import AIClient
+from Classes.AssessmentService import (
+    AssessmentService, AI_MODEL_CHAIN, LOCAL_MODEL, build_report_data, parse_model_chain
+)
+from Classes.RequestScheduler import PRIORITY_BATCH
+from Classes.TelemetryStore import TelemetryStore, percentile
+
+
+class ReportBackfillRunner:
+    """
+    Reavalia relatórios antigos depois de uma mudança de prompt ou de modelo.
+
+    Percorre os relatórios atuais (sem versão mais nova) em ordem de ID e
+    refaz pela IA os que foram gerados com outra versão do prompt
+    (PROMPT_VERSION) ou outro modelo, salvando o resultado como um novo
+    relatório que aponta para o anterior (supersedes_id). As chamadas passam
+    pelo agendador compartilhado com prioridade de lote.
+
+    O progresso fica em um arquivo de checkpoint (último ID processado e
+    relatórios que falharam), gravado ao fim de cada página: um backfill
+    interrompido continua de onde parou, começando por uma nova tentativa
+    dos que falharam, e as chaves de idempotência evitam versões duplicadas
+    de um relatório já salvo antes da interrupção.
+    """
+
+    def __init__(self, db_manager, concurrency=4, page_size=20, doctor_id=None,
+                 checkpoint_path="backfill_checkpoint.json", service=None, progress=print):
+        self.db_manager = db_manager
+        self.concurrency = max(1, concurrency)
+        self.page_size = max(1, page_size)
+        self.doctor_id = doctor_id
+        self.checkpoint_path = checkpoint_path
+        self.progress = progress
+        if service is None:
+            # Só o modelo principal: um fallback mais leve não deve substituir relatórios antigos
+            client = AIClient.instance()
+            chain = parse_model_chain(AI_MODEL_CHAIN, client.model_name, client.timeout)[:1]
+            service = AssessmentService(telemetry=TelemetryStore(), model_chain=chain)
+        self.service = service
+        if self.service.primary_model == LOCAL_MODEL:
+            raise ValueError("O backfill precisa de um modelo de IA como principal em AI_MODEL_CHAIN")
+
+        self.target = {"prompt_version": self.service.prompt_version, "model": self.service.primary_model}
+        self.checkpoint = self.load_checkpoint()
+        if self.checkpoint.get("target") != self.target:
+            if self.checkpoint.get("run_id"):
+                self.progress("↪️ Prompt ou modelo mudou desde o último checkpoint: iniciando novo backfill")
+            self.checkpoint = {
+                "run_id": uuid.uuid4().hex,
+                "target": self.target,
+                "last_id": 0,
+                "completed": 0,
+                "failed": {},
+            }
+
+    def load_checkpoint(self):
+        """Carrega o checkpoint de uma execução anterior, se existir"""
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    def save_checkpoint(self):
+        if not self.checkpoint_path:
+            return
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoint, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)  # Escrita atômica
+
+    def is_stale(self, report):
+        """Relatório gerado com outra versão do prompt ou outro modelo (ou sem registro deles)"""
+        report_data = report["report_data"]
+        return (report_data.get("prompt_version") != self.target["prompt_version"]
+                or report_data.get("ai_model") != self.target["model"])
+
+    @staticmethod
+    def build_input(report):
+        """
+        Entradas originais do relatório, no formato atual ('avaliacaoagil' e
+        'exames'); o timestamp é o do relatório original, que a nova versão mantém
+        """
+        input_data = report["report_data"].get("input_data") or {}
+        auto = input_data.get("avaliacaoagil") or input_data.get("autoavaliacao")
+        if not auto:
+            return None
+        created_at = report.get("created_at")
+        return {
+            "avaliacaoagil": auto,
+            "exames": input_data.get("exames"),
+            "timestamp": created_at.isoformat() if created_at else input_data.get("timestamp"),
+        }
+
+    def failed_reports(self):
+        """
+        Relatórios que falharam em execuções anteriores deste backfill,
+        lidos um a um pelo ID (ficam antes de last_id, fora da leitura por páginas)
+        """
+        for key in list(self.checkpoint["failed"]):
+            report = self.db_manager.get_report_by_id(int(key))
+            if report is None or not isinstance(report.get("report_data"), dict):
+                self.progress(f"⚠️ Relatório #{key} não encontrado ou ilegível; removido das falhas")
+                self.checkpoint["failed"].pop(key, None)
+                continue
+            if self.doctor_id is not None and report["doctor_id"] != self.doctor_id:
+                continue
+            yield report
+
+    def stale_reports(self):
+        """
+        Gera (relatório, entradas) dos relatórios desatualizados: primeiro os
+        que falharam antes, depois os posteriores ao checkpoint. O ID de cada
+        relatório lido na sequência, atual ou não, fica em self.last_seen_id
+        para avançar o checkpoint.
+        """
+        self.last_seen_id = self.checkpoint["last_id"]
+        for report in self.failed_reports():
+            data = self.build_input(report) if self.is_stale(report) else None
+            if data is None:
+                self.checkpoint["failed"].pop(str(report["id"]), None)
+                continue
+            yield report, data
+
+        for report in self.db_manager.iter_current_reports(self.checkpoint["last_id"], doctor_id=self.doctor_id):
+            self.last_seen_id = report["id"]
+            if not self.is_stale(report):
+                continue
+            data = self.build_input(report)
+            if data is None:
+                self.progress(f"⚠️ Relatório #{report['id']} sem entradas reaproveitáveis; ignorado")
+                continue
+            yield report, data
+
+    def estimate(self, price_input=0.0, price_output=0.0):
+        """
+        Simulação (dry-run): quantos relatórios seriam refeitos, tokens
+        estimados, custo (preços em US$ por milhão de tokens) e duração
+        mínima pelos limites de requisições e tokens por minuto.
+        """
+        reports = input_tokens = output_tokens = 0
+        for _, data in self.stale_reports():
+            tokens_in, tokens_out = self.service.estimate_tokens(data)
+            reports += 1
+            input_tokens += tokens_in
+            output_tokens += tokens_out
+
+        scheduler = self.service.scheduler
+        minutes = max(reports / scheduler.requests.capacity,
+                      (input_tokens + output_tokens) / scheduler.tokens.capacity)
+        return {
+            "reports": reports,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": (input_tokens * price_input + output_tokens * price_output) / 1_000_000,
+            "min_minutes": minutes,
+            "target": self.target,
+        }
+
+    def process_report(self, report, data):
+        """Reavalia um relatório e salva a nova versão; retorna (ID novo, segundos)"""
+        started = time.perf_counter()
+        result = self.service.assess(data, priority=PRIORITY_BATCH, user_id=report["doctor_id"])
+        report_id = self.db_manager.create_report(
+            report["doctor_id"], report["patient_id"], build_report_data(data, result),
+            idempotency_key=f"backfill-{self.checkpoint['run_id']}-{report['id']}",
+            supersedes_id=report["id"]
+        )
+        if not report_id:
+            raise RuntimeError("falha ao salvar a nova versão do relatório")
+        return report_id, time.perf_counter() - started
+
+    def _run_page(self, executor, page, stats):
+        futures = {executor.submit(self.process_report, report, data): report for report, data in page}
+        wait(futures)
+        for future, report in futures.items():
+            key = str(report["id"])
+            try:
+                new_id, seconds = future.result()
+                stats["latencies"].append(seconds)
+                stats["completed"] += 1
+                self.checkpoint["completed"] += 1
+                self.checkpoint["failed"].pop(key, None)
+                self.progress(f"✅ Relatório #{report['id']} → nova versão #{new_id} ({seconds:.1f}s)")
+            except Exception as e:
+                stats["failed"] += 1
+                self.checkpoint["failed"][key] = str(e)
+                self.progress(f"❌ Relatório #{report['id']}: {e}")
+
+    def run(self, limit=None):
+        """
+        Executa o backfill (no máximo 'limit' relatórios) e retorna o
+        relatório de vazão: contagens, duração, relatórios por minuto,
+        percentis de latência e tokens consumidos no período.
+        """
+        self.save_checkpoint()
+        stats = {"completed": 0, "failed": 0, "latencies": []}
+        started_at = time.time()
+        started = time.perf_counter()
+        submitted = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            page = []
+            for report, data in self.stale_reports():
+                page.append((report, data))
+                submitted += 1
+                if len(page) < self.page_size and (limit is None or submitted < limit):
+                    continue
+
+                self._run_page(executor, page, stats)
+                page = []
+                self.checkpoint["last_id"] = self.last_seen_id
+                self.save_checkpoint()
+
+                elapsed = time.perf_counter() - started
+                self.progress(f"📈 {stats['completed']} reavaliados, {stats['failed']} falhas · "
+                              f"{stats['completed'] / (elapsed / 60):.1f} relatórios/min")
+                if limit is not None and submitted >= limit:
+                    break
+            else:
+                if page:
+                    self._run_page(executor, page, stats)
+                # Leitura completa: o checkpoint avança até o último relatório lido
+                self.checkpoint["last_id"] = self.last_seen_id
+                self.save_checkpoint()
+
+        elapsed = time.perf_counter() - started
+        latencies = sorted(stats["latencies"])
+        summary = {
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "elapsed_seconds": elapsed,
+            "throughput_per_minute": stats["completed"] / (elapsed / 60) if elapsed > 0 else 0.0,
+            "p50_seconds": percentile(latencies, 50),
+            "p95_seconds": percentile(latencies, 95),
+            "last_id": self.checkpoint["last_id"],
+            "input_tokens": None,
+            "output_tokens": None,
+        }
+        if self.service.telemetry is not None:
+            usage = self.service.telemetry.summary(since=started_at)
+            summary["input_tokens"] = usage["input_tokens"]
+            summary["output_tokens"] = usage["output_tokens"]
+        return summary
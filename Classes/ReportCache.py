@@ -0,0 +1,116 @@
+import os
+import json
+import sqlite3
+from datetime import datetime
+
+from Classes.Helpers import get_cache_dir, report_risk_level
+
+
+class ReportCache:
+    """
+    Cache local (SQLite) dos metadados de relatórios por usuário.
+
+    Guarda apenas o necessário para montar a listagem (id, nomes, data e nível
+    de risco), criptografado com a mesma chave Fernet do banco. Permite que a
+    tela de relatórios abra instantaneamente e continue navegável, em modo
+    somente leitura, quando o PostgreSQL estiver inacessível.
+    """
+
+    def __init__(self, cipher, path=None):
+        self.cipher = cipher
+        self.path = path or os.path.join(get_cache_dir(), "reports_cache.sqlite3")
+        self.create_table()
+
+    def _connect(self):
+        # Uma conexão por operação: o cache é usado a partir de threads diferentes
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create_table(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS report_meta (
+                    owner_key TEXT NOT NULL,
+                    report_id INTEGER NOT NULL,
+                    meta_encrypted TEXT NOT NULL,
+                    PRIMARY KEY (owner_key, report_id)
+                )
+            """)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _to_meta(self, report):
+        return {
+            "id": report["id"],
+            "created_at": report["created_at"].isoformat(),
+            "doctor_name": (report.get("doctor") or {}).get("name", ""),
+            "patient_name": (report.get("patient") or {}).get("name", ""),
+            "risk_level": report_risk_level(report),
+        }
+
+    def _encrypt(self, meta):
+        return self.cipher.encrypt(json.dumps(meta).encode()).decode()
+
+    def load(self, owner_key):
+        """Retorna os metadados em cache no mesmo formato usado pela listagem"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT meta_encrypted FROM report_meta WHERE owner_key = ?", (owner_key,)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        reports = []
+        for (encrypted,) in rows:
+            try:
+                meta = json.loads(self.cipher.decrypt(encrypted.encode()).decode())
+            except Exception as e:
+                print(f"❌ Erro ao ler cache de relatórios: {e}")
+                continue
+            reports.append({
+                "id": meta["id"],
+                "created_at": datetime.fromisoformat(meta["created_at"]),
+                "doctor": {"name": meta["doctor_name"]},
+                "patient": {"name": meta["patient_name"]},
+                "risk_level": meta.get("risk_level"),
+                "cached": True,
+            })
+
+        reports.sort(key=lambda r: r["created_at"], reverse=True)
+        return reports
+
+    def replace(self, owner_key, reports):
+        """Substitui todo o cache do usuário pela listagem reconciliada com o banco"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM report_meta WHERE owner_key = ?", (owner_key,))
+            conn.executemany(
+                "INSERT INTO report_meta (owner_key, report_id, meta_encrypted) VALUES (?, ?, ?)",
+                [(owner_key, r["id"], self._encrypt(self._to_meta(r))) for r in reports]
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def remove(self, owner_key, report_id):
+        """Retira um relatório do cache (ex.: substituído por uma nova versão)"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM report_meta WHERE owner_key = ? AND report_id = ?", (owner_key, report_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def upsert(self, owner_key, report):
+        """Insere ou atualiza um único relatório no cache"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO report_meta (owner_key, report_id, meta_encrypted) VALUES (?, ?, ?)",
+                (owner_key, report["id"], self._encrypt(self._to_meta(report)))
+            )
+            conn.commit()
+        finally:
+            conn.close()
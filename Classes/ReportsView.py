@@ -1,11 +1,34 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QPushButton, QHBoxLayout,
     QTableWidget, QTableWidgetItem, QHeaderView, QLineEdit,
-    QLabel, QComboBox, QDateEdit, QFrame, QScrollArea
+    QLabel, QComboBox, QDateEdit, QFrame, QScrollArea, QMessageBox
 )
-from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtCore import Qt, QDate, QObject, pyqtSignal
 
+from Classes.BackgroundThreads import BackgroundThreads
 from Classes.ReportviewDialog import ReportViewDialog
+from Classes.ReportCache import ReportCache
+from Classes.Helpers import report_risk_level
+
+
+class ReportsLoader(QObject):
+    """
+    Worker que busca relatórios no PostgreSQL em uma thread separada
+    (a listagem completa ou um único relatório).
+    """
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, load_function):
+        super().__init__()
+        self.load_function = load_function
+
+    def run(self):
+        try:
+            self.loaded.emit(self.load_function())
+        except Exception as e:
+            print(f"❌ Erro ao carregar relatórios: {e}")
+            self.failed.emit(str(e))
 
 
 class ReportsView(QWidget):
@@ -14,8 +37,25 @@ class ReportsView(QWidget):
         self.db_manager = db_manager
         self.user = user
         self.all_reports = []
+        self.read_only = False
+
+        # Cache local de metadados para abertura instantânea e modo offline
+        self.report_cache = ReportCache(self.db_manager.cipher)
+        self.cache_key = f"{self.user['user_type']}:{self.user['id']}"
+
+        self.loader_thread = None
         self.init_ui()
 
+        # Atualizações em tempo real via LISTEN/NOTIFY
+        if getattr(self.db_manager, "listener", None):
+            self.db_manager.listener.report_changed.connect(self.on_report_changed)
+
+        # Avaliações da fila offline salvas em segundo plano
+        if getattr(self.db_manager, "offline_drainer", None):
+            self.db_manager.offline_drainer.report_saved.connect(self.on_offline_report_saved)
+            self.db_manager.offline_drainer.assessment_failed.connect(self.on_offline_assessment_failed)
+        self.offline_failures_checked = False
+
     def init_ui(self):
         # Estilo moderno
         self.setStyleSheet("""
@@ -202,6 +242,8 @@ class ReportsView(QWidget):
         scroll_area.setWidget(content_widget)
         main_wrapper_layout.addWidget(scroll_area)
 
+        # Renderiza do cache imediatamente e reconcilia com o banco em segundo plano
+        self.load_cached_reports()
         self.load_reports()
 
     def create_stats_frame(self):
@@ -226,6 +268,10 @@ class ReportsView(QWidget):
         stats_layout.addWidget(self.today_label)
         stats_layout.addStretch()
 
+        self.sync_label = QLabel("")
+        self.sync_label.setStyleSheet("font-size: 9pt; font-style: italic; color: #7f8c8d;")
+        stats_layout.addWidget(self.sync_label)
+
         return stats_frame
 
     def create_filter_frame(self):
@@ -319,26 +365,28 @@ class ReportsView(QWidget):
         self.table.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
 
         if self.user["user_type"] == "patient":
-            self.table.setColumnCount(3)
-            self.table.setHorizontalHeaderLabels(["👨‍⚕️ Médico", "📅 Data e Hora", "⚙️ Ações"])
-        else:
             self.table.setColumnCount(4)
+            self.table.setHorizontalHeaderLabels(["👨‍⚕️ Médico", "📅 Data e Hora", "⚠️ Risco", "⚙️ Ações"])
+        else:
+            self.table.setColumnCount(5)
             self.table.setHorizontalHeaderLabels([
-                "👤 Paciente", "👨‍⚕️ Médico", "📅 Data e Hora", "⚙️ Ações"
+                "👤 Paciente", "👨‍⚕️ Médico", "📅 Data e Hora", "⚠️ Risco", "⚙️ Ações"
             ])
 
         header = self.table.horizontalHeader()
         if self.user["user_type"] == "patient":
             header.setSectionResizeMode(0, QHeaderView.Stretch)
             header.setSectionResizeMode(1, QHeaderView.ResizeToContents)
-            header.setSectionResizeMode(2, QHeaderView.Fixed)
-            self.table.setColumnWidth(2, 150)
+            header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
+            header.setSectionResizeMode(3, QHeaderView.Fixed)
+            self.table.setColumnWidth(3, 150)
         else:
             header.setSectionResizeMode(0, QHeaderView.Stretch)
             header.setSectionResizeMode(1, QHeaderView.Stretch)
             header.setSectionResizeMode(2, QHeaderView.ResizeToContents)
-            header.setSectionResizeMode(3, QHeaderView.Fixed)
-            self.table.setColumnWidth(3, 150)
+            header.setSectionResizeMode(3, QHeaderView.ResizeToContents)
+            header.setSectionResizeMode(4, QHeaderView.Fixed)
+            self.table.setColumnWidth(4, 150)
 
         self.table.verticalHeader().setDefaultSectionSize(50)
 
@@ -361,22 +409,167 @@ class ReportsView(QWidget):
 
         self.apply_filters()
 
+    def fetch_reports(self):
+        """Busca os relatórios no banco de dados com base no tipo de usuário."""
+        if self.user["user_type"] == "patient":
+            # O método get_patient_reports já retorna o 'doctor' em JSON.
+            return self.db_manager.get_patient_reports(self.user["id"])
+        
+        elif self.user["user_type"] == "doctor":
+            # O método get_doctor_reports já retorna o 'patient' em JSON.
+            return self.db_manager.get_doctor_reports(self.user["id"])
+        
+        else: # admin
+            return self.db_manager.get_all_reports()
+
+    def load_cached_reports(self):
+        """Exibe imediatamente os metadados salvos no cache local"""
+        self.all_reports = self.report_cache.load(self.cache_key)
+        if self.all_reports:
+            self.sync_label.setText("🔄 Sincronizando...")
+        self.update_statistics()
+        self.apply_filters()
+
     def load_reports(self):
-            """Carrega os relatórios do banco de dados com base no tipo de usuário."""
-            
-            if self.user["user_type"] == "patient":
-                # O método get_patient_reports já retorna o 'doctor' em JSON.
-                self.all_reports = self.db_manager.get_patient_reports(self.user["id"])
-            
-            elif self.user["user_type"] == "doctor":
-                # O método get_doctor_reports já retorna o 'patient' em JSON.
-                self.all_reports = self.db_manager.get_doctor_reports(self.user["id"])
-            
-            else: # admin
-                self.all_reports = self.db_manager.get_all_reports()
+        """Recarrega os relatórios do banco em segundo plano."""
+        if self.loader_thread is not None:
+            return  # Já existe uma sincronização em andamento
+
+        self.sync_label.setText("🔄 Sincronizando...")
+        self.loader_thread = self.run_in_background(
+            self.fetch_reports, self.on_reports_loaded, self.on_reports_failed,
+            on_finished=self.on_loader_finished
+        )
+
+    def run_in_background(self, load_function, on_loaded, on_failed=None, on_finished=None):
+        """
+        Executa load_function em uma thread do BackgroundThreads; o resultado
+        (ou o erro) chega aos slots na thread da interface. Retorna a QThread.
+        """
+        loader = ReportsLoader(load_function)
+        loader.loaded.connect(on_loaded)
+        if on_failed is not None:
+            loader.failed.connect(on_failed)
+        return BackgroundThreads.instance().start(loader, [loader.loaded, loader.failed], on_finished)
+
+    def on_loader_finished(self):
+        self.loader_thread = None
+
+    def on_reports_loaded(self, reports):
+        """Substitui a listagem pela versão do banco e atualiza o cache"""
+        self.all_reports = reports
+        self.read_only = False
+        self.sync_label.setText("")
+        self.sync_label.setStyleSheet("font-size: 9pt; font-style: italic; color: #7f8c8d;")
+
+        try:
+            self.report_cache.replace(self.cache_key, reports)
+        except Exception as e:
+            print(f"❌ Erro ao atualizar cache de relatórios: {e}")
+
+        self.update_statistics()
+        self.apply_filters()
 
-            self.update_statistics()
-            self.apply_filters()
+        if not self.offline_failures_checked:
+            self.show_offline_failures()
+
+    def on_reports_failed(self, error):
+        """Banco inacessível: mantém os dados do cache em modo somente leitura"""
+        self.read_only = True
+        self.sync_label.setText("📴 Offline - exibindo dados salvos (somente leitura)")
+        self.sync_label.setStyleSheet("font-size: 9pt; font-weight: bold; color: #e67e22;")
+
+    def is_report_visible(self, payload):
+        """Verifica se o relatório notificado pertence à listagem deste usuário"""
+        if self.user["user_type"] == "patient":
+            return payload.get("patient_id") == self.user["id"]
+        elif self.user["user_type"] == "doctor":
+            return payload.get("doctor_id") == self.user["id"]
+        return True  # admin
+
+    def on_report_changed(self, payload):
+        """Aplica a alteração de um único relatório sem recarregar a lista inteira"""
+        if not self.is_report_visible(payload):
+            return
+
+        report_id = payload.get("id")
+        self.run_in_background(lambda: self.db_manager.get_report_by_id(report_id), self.apply_report_change)
+
+    def apply_report_change(self, report):
+        """Atualiza a listagem e o cache com o relatório lido do banco"""
+        if not report:
+            return
+
+        superseded = report.get("supersedes_id")
+        if superseded:
+            # Nova versão (reavaliação): substitui o relatório anterior na listagem
+            self.all_reports = [r for r in self.all_reports if r["id"] != superseded]
+
+        for i, existing in enumerate(self.all_reports):
+            if existing["id"] == report["id"]:
+                self.all_reports[i] = report
+                break
+        else:
+            self.all_reports.insert(0, report)
+            self.all_reports.sort(key=lambda r: r["created_at"], reverse=True)
+
+        try:
+            if superseded:
+                self.report_cache.remove(self.cache_key, superseded)
+            self.report_cache.upsert(self.cache_key, report)
+        except Exception as e:
+            print(f"❌ Erro ao atualizar cache de relatórios: {e}")
+
+        self.update_statistics()
+        self.apply_filters()
+
+    def on_offline_report_saved(self, payload):
+        """Relatório de uma avaliação que estava na fila offline foi salvo"""
+        if not self.is_report_visible(payload):
+            return
+        self.on_report_changed(payload)
+        if self.user["user_type"] == "doctor":
+            pending = self.db_manager.offline_drainer.pending_count(self.user["id"])
+            message = "✅ Avaliação pendente salva automaticamente"
+            if pending:
+                message += f" ({pending} ainda na fila offline)"
+            self.sync_label.setText(message)
+            self.sync_label.setStyleSheet("font-size: 9pt; font-weight: bold; color: #27ae60;")
+
+    def on_offline_assessment_failed(self, payload):
+        """Uma avaliação da fila offline esgotou as tentativas"""
+        if self.user["user_type"] == "doctor" and payload.get("doctor_id") == self.user["id"]:
+            self.show_offline_failures()
+
+    def show_offline_failures(self):
+        """Avisa o médico das avaliações da fila offline que falharam definitivamente"""
+        from datetime import datetime
+
+        drainer = getattr(self.db_manager, "offline_drainer", None)
+        if drainer is None or self.user["user_type"] != "doctor":
+            return
+        self.offline_failures_checked = True
+
+        failed = drainer.failed_items(self.user["id"])
+        if not failed:
+            return
+
+        self.sync_label.setText(f"❌ {len(failed)} avaliação(ões) da fila offline não concluída(s)")
+        self.sync_label.setStyleSheet("font-size: 9pt; font-weight: bold; color: #e74c3c;")
+        details = "\n".join(
+            f"• Guardada em {datetime.fromtimestamp(item['created_at']).strftime('%d/%m/%Y às %H:%M')}: "
+            f"{item['last_error']}"
+            for item in failed
+        )
+        answer = QMessageBox.question(
+            self, "❌ Avaliações não concluídas",
+            f"As avaliações abaixo não puderam ser feitas automaticamente:\n\n{details}\n\n"
+            "Refaça-as na tela de avaliação. Deseja removê-las da fila offline?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if answer == QMessageBox.Yes:
+            drainer.discard_failed(self.user["id"])
+            self.sync_label.setText("")
 
     def update_statistics(self):
         """Atualiza as estatísticas"""
@@ -453,17 +646,21 @@ class ReportsView(QWidget):
         self.table.setRowCount(len(reports))
 
         for i, report in enumerate(reports):
+            # Linhas do cache já trazem o nível; as do banco são extraídas do relatório
+            risk_level = report_risk_level(report) or "—"
+
             if self.user["user_type"] == "patient":
                 doctor_name = report["doctor"]["name"]
                 
                 self.table.setItem(i, 0, QTableWidgetItem(doctor_name))
                 self.table.setItem(i, 1, QTableWidgetItem(
                     report["created_at"].strftime("%d/%m/%Y às %H:%M")))
+                self.table.setItem(i, 2, QTableWidgetItem(risk_level))
 
                 view_btn = QPushButton("👁️ Visualizar")
                 view_btn.setObjectName("btn_view")
                 view_btn.clicked.connect(lambda checked, r=report: self.view_report(r))
-                self.table.setCellWidget(i, 2, view_btn)
+                self.table.setCellWidget(i, 3, view_btn)
             else:
                 patient_name = report["patient"]["name"]
                 doctor_name = report["doctor"]["name"]
@@ -472,11 +669,12 @@ class ReportsView(QWidget):
                 self.table.setItem(i, 1, QTableWidgetItem(doctor_name))
                 self.table.setItem(i, 2, QTableWidgetItem(
                     report["created_at"].strftime("%d/%m/%Y às %H:%M")))
+                self.table.setItem(i, 3, QTableWidgetItem(risk_level))
 
                 view_btn = QPushButton("👁️ Visualizar")
                 view_btn.setObjectName("btn_view")
                 view_btn.clicked.connect(lambda checked, r=report: self.view_report(r))
-                self.table.setCellWidget(i, 3, view_btn)
+                self.table.setCellWidget(i, 4, view_btn)
 
         header_height = self.table.horizontalHeader().height()
         rows_height = sum([self.table.rowHeight(i) for i in range(self.table.rowCount())])
@@ -488,5 +686,27 @@ class ReportsView(QWidget):
 
     def view_report(self, report):
         """Abre o diálogo para visualizar o relatório"""
-        dialog = ReportViewDialog(report)
+        if "report_data" in report:
+            self.open_report_dialog(report)
+            return
+
+        # Linha vinda do cache: o conteúdo completo só existe no banco (buscado em segundo plano)
+        report_id = report["id"]
+        self.run_in_background(
+            lambda: self.db_manager.get_report_by_id(report_id),
+            self.open_report_dialog, self.on_full_report_failed
+        )
+
+    def on_full_report_failed(self, error=None):
+        QMessageBox.warning(
+            self, "📴 Modo Offline",
+            "Não foi possível conectar ao banco de dados.\n\n"
+            "Apenas a listagem salva localmente está disponível no momento."
+        )
+
+    def open_report_dialog(self, report):
+        if not report:
+            self.on_full_report_failed()
+            return
+        dialog = ReportViewDialog(report, read_only=self.read_only)
         dialog.exec_()
\ No newline at end of file
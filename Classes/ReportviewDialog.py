@@ -7,9 +7,11 @@ from PyQt5.QtCore import Qt
 from Classes.MedicalReportPDFWriter import MedicalReportPDFWriter
 
 class ReportViewDialog(QDialog):
-    def __init__(self, report):
+    def __init__(self, report, read_only=False):
         super().__init__()
         self.report = report
+        # Sem conexão com o banco: o relatório pode estar desatualizado, então não gera PDF
+        self.read_only = read_only
         self.init_ui()
 
     def init_ui(self):
@@ -158,7 +160,7 @@ class ReportViewDialog(QDialog):
         # Resultado da IA
         ai_result = report_data.get("ai_result", "")
         if ai_result:
-            result_group = self.create_result_section(ai_result)
+            result_group = self.create_result_section(ai_result, report_data.get("ai_model"))
             content_layout.addWidget(result_group)
 
         scroll.setWidget(content_widget)
@@ -172,6 +174,9 @@ class ReportViewDialog(QDialog):
         pdf_btn = QPushButton("📄 Gerar PDF")
         pdf_btn.clicked.connect(self.gerar_pdf)
         pdf_btn.setMinimumHeight(45)
+        if self.read_only:
+            pdf_btn.setEnabled(False)
+            pdf_btn.setToolTip("Indisponível no modo offline (somente leitura)")
         pdf_btn.setStyleSheet("""
             QPushButton {
                 background: qlineargradient(x1: 0, y1: 0, x2: 0, y2: 1,
@@ -384,9 +389,14 @@ class ReportViewDialog(QDialog):
         group.setLayout(layout)
         return group
 
-    def create_result_section(self, ai_result):
-        """Cria seção de resultado da IA"""
-        group = QGroupBox("🤖 Resultado da Avaliação por IA")
+    def create_result_section(self, ai_result, ai_model=None):
+        """Cria seção de resultado da IA (com o modelo que o gerou, se registrado)"""
+        if ai_model == "local":
+            group = QGroupBox("📏 Resultado da Avaliação por Regras Locais")
+        elif ai_model:
+            group = QGroupBox(f"🤖 Resultado da Avaliação por IA ({ai_model})")
+        else:
+            group = QGroupBox("🤖 Resultado da Avaliação por IA")
         layout = QVBoxLayout()
         
         result_text = QTextEdit()
@@ -0,0 +1,157 @@
+import os
+import time
+import heapq
+import random
+import itertools
+import threading
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+
+class SchedulingCancelled(Exception):
+    """O pedido saiu da fila do agendador antes de ser liberado"""
+
+
+class TokenBucket:
+    """Balde de fichas: capacidade por minuto, reabastecido continuamente"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount, now):
+        """Tempo até haver 'amount' fichas (pedidos maiores que a capacidade esperam o balde encher)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+
+class RequestScheduler:
+    """
+    Agendador único das chamadas à IA do processo.
+
+    Limita requisições e tokens por minuto (AI_RATE_RPM, AI_RATE_TPM) com
+    baldes de fichas, libera primeiro os pedidos interativos e depois os de
+    lote e, ao receber limite de taxa (429), suspende todas as liberações
+    por um intervalo que dobra a cada nova recusa e diminui com os sucessos.
+    """
+    MIN_BACKOFF = 2.0
+    MAX_BACKOFF = 60.0
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute or int(os.getenv('AI_RATE_RPM', '60')))
+        self.tokens = TokenBucket(tokens_per_minute or int(os.getenv('AI_RATE_TPM', '250000')))
+        self.backoff = 0.0
+        self.paused_until = 0.0
+
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._metrics = {
+            'granted': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+            'rate_limited': 0,
+            'abandoned': 0,
+        }
+
+    def _position(self, entry):
+        """Posição (1 = próximo) de um pedido na fila, por prioridade e ordem de chegada"""
+        return sum(1 for other in self._heap if other < entry) + 1
+
+    def acquire(self, estimated_tokens, priority=PRIORITY_INTERACTIVE, on_position=None, abandoned=None):
+        """
+        Bloqueia até o pedido poder ser enviado e retorna o tempo de espera.
+
+        on_position(posição) é chamado sempre que a posição na fila muda;
+        abandoned() é consultado periodicamente e, se verdadeiro, o pedido
+        sai da fila com SchedulingCancelled.
+        """
+        started = time.monotonic()
+        entry = (priority, next(self._seq))
+        last_position = None
+
+        with self._cond:
+            heapq.heappush(self._heap, entry)
+            try:
+                while True:
+                    if abandoned is not None and abandoned():
+                        self._metrics['abandoned'] += 1
+                        raise SchedulingCancelled("Pedido abandonado antes do envio")
+
+                    now = time.monotonic()
+                    position = self._position(entry)
+                    if on_position is not None and position != last_position:
+                        last_position = position
+                        on_position(position)
+
+                    wait = 0.5
+                    if position == 1:
+                        wait = max(
+                            self.paused_until - now,
+                            self.requests.seconds_until(1, now),
+                            self.tokens.seconds_until(estimated_tokens, now),
+                        )
+                        if wait <= 0:
+                            self.requests.take(1, now)
+                            self.tokens.take(estimated_tokens, now)
+                            waited = now - started
+                            self._metrics['granted'] += 1
+                            self._metrics['wait_seconds'] += waited
+                            self._metrics['max_wait_seconds'] = max(self._metrics['max_wait_seconds'], waited)
+                            return waited
+
+                    self._cond.wait(timeout=min(wait, 0.5))
+            finally:
+                self._heap.remove(entry)
+                heapq.heapify(self._heap)
+                self._cond.notify_all()
+
+    def report_rate_limited(self):
+        """Recusa por limite de taxa: pausa as liberações com backoff exponencial"""
+        with self._cond:
+            self.backoff = min(self.MAX_BACKOFF, max(self.MIN_BACKOFF, self.backoff * 2))
+            pause = self.backoff * random.uniform(0.8, 1.2)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+            self._metrics['rate_limited'] += 1
+            print(f"⚠️ Limite de requisições da IA atingido: pausando envios por {pause:.1f}s")
+            self._cond.notify_all()
+
+    def report_success(self):
+        """Chamada bem-sucedida: reduz o backoff gradualmente"""
+        with self._cond:
+            self.backoff = self.backoff / 2 if self.backoff >= self.MIN_BACKOFF else 0.0
+
+    def metrics(self):
+        """Tempo de espera no agendador, recusas por limite de taxa e fila atual"""
+        with self._cond:
+            m = dict(self._metrics)
+            m['queued'] = len(self._heap)
+            m['backoff_seconds'] = self.backoff
+            m['paused_seconds'] = max(0.0, self.paused_until - time.monotonic())
+        m['avg_wait_seconds'] = m['wait_seconds'] / m['granted'] if m['granted'] else 0.0
+        return m
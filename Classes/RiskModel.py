@@ -0,0 +1,198 @@
+import os
+import json
+import time
+import warnings
+import numpy as np
+
+from Classes.Helpers import get_cache_dir, report_risk_level, report_risk_score
+from Classes.RiskScoreEngine import RiskScoreEngine, AUTO_FIELDS, EXAM_FIELDS
+
+# Colunas de RiskScoreEngine.to_columns usadas como variáveis do modelo
+FEATURES = AUTO_FIELDS + EXAM_FIELDS + ["imc"]
+
+LEVEL_ORDER = ["BAIXO", "MODERADO", "ALTO", "MUITO ALTO"]
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def _cohen_kappa(expected, predicted):
+    """Concordância entre dois classificadores descontando a concordância ao acaso"""
+    observed = np.mean(expected == predicted)
+    chance = sum(np.mean(expected == level) * np.mean(predicted == level) for level in LEVEL_ORDER)
+    return float((observed - chance) / (1 - chance)) if chance < 1 else 1.0
+
+
+class RiskModel:
+    """
+    Regressão logística treinada com as avaliações da IA já salvas.
+
+    Aprende a pontuação (0-100) atribuída pela IA a partir das mesmas
+    variáveis do RiskScoreEngine, com valores ausentes substituídos pela
+    média de treino e indicadores de ausência. A inferência é um produto
+    vetorial em NumPy: serve como segunda opinião instantânea na tela, sem
+    chamada à API. O nível é obtido da pontuação pelas faixas do
+    RiskScoreEngine.
+
+    Os parâmetros ficam em um arquivo .npz (AI_RISK_MODEL_PATH ou
+    risk_model.npz no diretório de cache), sem dados de pacientes.
+    """
+
+    def __init__(self, weights, bias, mean, std, trained_at=None, metrics=None):
+        self.weights = np.asarray(weights, dtype=float)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=float)
+        self.std = np.asarray(std, dtype=float)
+        self.trained_at = trained_at
+        self.metrics = metrics or {}
+
+    @staticmethod
+    def default_path():
+        return os.getenv("AI_RISK_MODEL_PATH") or os.path.join(get_cache_dir(), "risk_model.npz")
+
+    @staticmethod
+    def raw_features(records):
+        """Matriz (pacientes x FEATURES) com NaN nos valores ausentes"""
+        columns = RiskScoreEngine.to_columns(records)
+        if not records:
+            return np.zeros((0, len(FEATURES)))
+        return np.column_stack([columns[name] for name in FEATURES])
+
+    def design_matrix(self, raw):
+        """Padroniza as variáveis, preenche ausentes com a média e acrescenta os indicadores de ausência"""
+        missing = np.isnan(raw)
+        scaled = np.where(missing, 0.0, (raw - self.mean) / self.std)
+        return np.hstack([scaled, missing.astype(float)])
+
+    @staticmethod
+    def training_set(reports):
+        """
+        Extrai de relatórios salvos (com report_data descriptografado) as
+        entradas, a pontuação e o nível da IA e o paciente de cada um.
+        Relatórios das regras locais ou sem pontuação legível são ignorados.
+        """
+        records, scores, levels, patients = [], [], [], []
+        for report in reports:
+            report_data = report.get("report_data") or {}
+            if report_data.get("ai_model") == "local":
+                continue
+            input_data = report_data.get("input_data") or {}
+            auto = input_data.get("avaliacaoagil") or input_data.get("autoavaliacao")
+            score = report_risk_score(report)
+            if not auto or score is None:
+                continue
+            records.append({"avaliacaoagil": auto, "exames": input_data.get("exames")})
+            scores.append(score)
+            levels.append(report_risk_level(report) or str(RiskScoreEngine.levels([score])[0]))
+            patients.append(report.get("patient_id"))
+        return records, np.array(scores, dtype=float), np.array(levels), np.array(patients)
+
+    @classmethod
+    def fit(cls, records, scores, epochs=2000, learning_rate=0.5, l2=1e-3):
+        """
+        Ajusta a regressão logística por gradiente descendente em lote, com a
+        pontuação da IA dividida por 100 como alvo (entropia cruzada com
+        rótulos fracionários) e regularização L2.
+        """
+        raw = cls.raw_features(records)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # Colunas sem nenhum valor informado
+            mean = np.nanmean(raw, axis=0)
+            std = np.nanstd(raw, axis=0)
+        # Colunas vazias ou constantes não são escaladas
+        mean = np.where(np.isnan(mean), 0.0, mean)
+        std = np.where(np.isnan(std) | (std == 0), 1.0, std)
+
+        model = cls(np.zeros(2 * len(FEATURES)), 0.0, mean, std)
+        X = model.design_matrix(raw)
+        y = np.clip(np.asarray(scores, dtype=float) / 100.0, 0.0, 1.0)
+        n = len(y)
+
+        weights = np.zeros(X.shape[1])
+        bias = float(np.log((y.mean() + 1e-6) / (1 - y.mean() + 1e-6)))
+        for _ in range(epochs):
+            error = _sigmoid(X @ weights + bias) - y
+            weights -= learning_rate * (X.T @ error / n + l2 * weights)
+            bias -= learning_rate * error.mean()
+
+        model.weights = weights
+        model.bias = bias
+        model.trained_at = time.time()
+        return model
+
+    def predict_scores(self, records):
+        """Pontuações (0-100) previstas para uma coorte inteira"""
+        X = self.design_matrix(self.raw_features(records))
+        return np.rint(100 * _sigmoid(X @ self.weights + self.bias)).astype(int)
+
+    def predict(self, data):
+        """Segunda opinião para uma avaliação: {'score', 'level'}"""
+        score = int(self.predict_scores([data])[0])
+        return {"score": score, "level": str(RiskScoreEngine.levels([score])[0])}
+
+    def evaluate(self, records, scores, levels):
+        """
+        Relatório de avaliação offline contra a IA: erro médio da pontuação,
+        concordância de nível (exata, até um nível de distância e kappa),
+        matriz de confusão e, para comparação, a mesma concordância das
+        regras fixas do RiskScoreEngine.
+        """
+        scores = np.asarray(scores, dtype=float)
+        levels = np.asarray(levels)
+        predicted = self.predict_scores(records)
+        predicted_levels = RiskScoreEngine.levels(predicted)
+        rule_scores, rule_levels = RiskScoreEngine.score_batch(records)
+
+        rank = {level: i for i, level in enumerate(LEVEL_ORDER)}
+        distance = np.abs(np.vectorize(rank.get)(levels) - np.vectorize(rank.get)(predicted_levels))
+        return {
+            "samples": len(scores),
+            "mae_score": float(np.mean(np.abs(predicted - scores))),
+            "level_agreement": float(np.mean(levels == predicted_levels)),
+            "within_one_level": float(np.mean(distance <= 1)),
+            "kappa": _cohen_kappa(levels, predicted_levels),
+            "confusion": {
+                expected: {level: int(np.sum((levels == expected) & (predicted_levels == level)))
+                           for level in LEVEL_ORDER}
+                for expected in LEVEL_ORDER
+            },
+            "rules_mae_score": float(np.mean(np.abs(rule_scores - scores))),
+            "rules_level_agreement": float(np.mean(levels == rule_levels)),
+            "rules_kappa": _cohen_kappa(levels, rule_levels),
+        }
+
+    def save(self, path=None):
+        path = path or self.default_path()
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                weights=self.weights,
+                bias=self.bias,
+                mean=self.mean,
+                std=self.std,
+                features=np.array(FEATURES),
+                trained_at=self.trained_at or time.time(),
+                metrics=json.dumps(self.metrics),
+            )
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        """Carrega o modelo treinado, ou None se não existir ou for de outra versão das variáveis"""
+        path = path or cls.default_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as saved:
+                if list(saved["features"]) != FEATURES:
+                    print("⚠️ Modelo de risco treinado com outras variáveis; treine novamente")
+                    return None
+                return cls(
+                    saved["weights"], saved["bias"], saved["mean"], saved["std"],
+                    trained_at=float(saved["trained_at"]),
+                    metrics=json.loads(str(saved["metrics"]))
+                )
+        except Exception as e:
+            print(f"❌ Erro ao carregar modelo de risco: {e}")
+            return None
@@ -0,0 +1,147 @@
+import numpy as np
+
+
+# Pontuação mínima de cada nível, na mesma escala 0-100 da IA
+RISK_LEVELS = [
+    (75, "MUITO ALTO"),
+    (50, "ALTO"),
+    (25, "MODERADO"),
+    (0, "BAIXO"),
+]
+
+# Colunas numéricas extraídas de 'avaliacaoagil' e 'exames'.
+# Valores ausentes viram NaN e não pontuam (comparações com NaN são falsas).
+AUTO_FIELDS = [
+    "idade_anos", "sexo_masculino", "historico_familiar_hipertensao",
+    "altura_cm", "peso_kg", "porcoes_frutas_vegetais_dia",
+    "minutos_exercicio_semana", "fuma_atualmente", "bebidas_alcoolicas_semana",
+    "nivel_estresse_0_10", "sono_qualidade_ruim",
+]
+EXAM_FIELDS = [
+    "colesterol_ldl_mg_dL", "colesterol_hdl_mg_dL", "triglicerideos_mg_dL",
+    "glicemia_jejum_mg_dL", "hba1c_percent", "creatinina_mg_dL",
+    "proteinuria_positiva", "diagnostico_apneia_sono", "cortisol_serico_ug_dL",
+    "mutacao_genetica_hipertensao", "bpm_repouso", "indice_pm25",
+]
+
+
+def _imc(c):
+    altura_m = c["altura_cm"] / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        imc = c["peso_kg"] / (altura_m ** 2)
+    return np.where((c["altura_cm"] > 0) & (c["peso_kg"] > 0), imc, np.nan)
+
+
+def _steps(values, thresholds):
+    """Pontos pelo maior limite atingido: thresholds = [(limite, pontos), ...] em ordem crescente"""
+    points = np.zeros(values.shape)
+    for limit, pts in thresholds:
+        points = np.where(values >= limit, pts, points)
+    return points
+
+
+# (descrição do fator, função das colunas -> pontos por paciente)
+RULES = [
+    ("Idade", lambda c: _steps(c["idade_anos"], [(30, 5), (45, 10), (60, 15)])),
+    ("Sexo masculino", lambda c: np.where(c["sexo_masculino"] > 0, 3, 0)),
+    ("Histórico familiar de hipertensão", lambda c: np.where(c["historico_familiar_hipertensao"] > 0, 10, 0)),
+    ("Sobrepeso/obesidade (IMC)", lambda c: _steps(c["imc"], [(25, 5), (30, 10)])),
+    ("Baixo consumo de frutas e vegetais", lambda c: np.where(c["porcoes_frutas_vegetais_dia"] < 5, 3, 0)),
+    ("Sedentarismo", lambda c: np.where(c["minutos_exercicio_semana"] < 150, 5, 0)),
+    ("Tabagismo", lambda c: np.where(c["fuma_atualmente"] > 0, 8, 0)),
+    ("Consumo de álcool elevado", lambda c: np.where(c["bebidas_alcoolicas_semana"] > 7, 5, 0)),
+    ("Estresse elevado", lambda c: np.where(c["nivel_estresse_0_10"] >= 7, 4, 0)),
+    ("Qualidade do sono ruim", lambda c: np.where(c["sono_qualidade_ruim"] > 0, 3, 0)),
+    ("LDL elevado", lambda c: _steps(c["colesterol_ldl_mg_dL"], [(130, 3), (160, 5)])),
+    ("HDL baixo", lambda c: np.where(c["colesterol_hdl_mg_dL"] < 40, 2, 0)),
+    ("Triglicerídeos elevados", lambda c: np.where(c["triglicerideos_mg_dL"] >= 150, 2, 0)),
+    ("Glicemia alterada", lambda c: np.maximum(
+        _steps(c["glicemia_jejum_mg_dL"], [(100, 3), (126, 6)]),
+        _steps(c["hba1c_percent"], [(5.7, 3), (6.5, 6)]))),
+    ("Creatinina elevada", lambda c: np.where(c["creatinina_mg_dL"] > 1.3, 4, 0)),
+    ("Proteinúria", lambda c: np.where(c["proteinuria_positiva"] > 0, 5, 0)),
+    ("Apneia do sono", lambda c: np.where(c["diagnostico_apneia_sono"] > 0, 5, 0)),
+    ("Cortisol elevado", lambda c: np.where(c["cortisol_serico_ug_dL"] > 23, 2, 0)),
+    ("Predisposição genética", lambda c: np.where(c["mutacao_genetica_hipertensao"] > 0, 5, 0)),
+    ("Frequência cardíaca de repouso elevada", lambda c: np.where(c["bpm_repouso"] > 80, 2, 0)),
+    ("Exposição a poluição (PM2.5)", lambda c: np.where(c["indice_pm25"] > 35, 2, 0)),
+]
+
+
+def _number(value):
+    if value is None or value == "":
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class RiskScoreEngine:
+    """
+    Pontuação de risco de hipertensão por regras, determinística e local.
+
+    Não depende da IA: serve como pré-avaliação instantânea na tela enquanto
+    o relatório é gerado (ou quando a API está fora do ar) e, por ser
+    vetorizada com NumPy, pontua coortes inteiras de uma só vez.
+    """
+
+    @staticmethod
+    def to_columns(records):
+        """
+        Converte uma lista de avaliações ({'avaliacaoagil', 'exames'}) em
+        colunas NumPy, uma por campo.
+        """
+        columns = {}
+        for field in AUTO_FIELDS:
+            columns[field] = np.array(
+                [_number((r.get("avaliacaoagil") or r.get("autoavaliacao") or {}).get(field)) for r in records],
+                dtype=float
+            )
+        for field in EXAM_FIELDS:
+            columns[field] = np.array(
+                [_number((r.get("exames") or {}).get(field)) for r in records],
+                dtype=float
+            )
+        columns["imc"] = _imc(columns)
+        return columns
+
+    @staticmethod
+    def points_matrix(records):
+        """Matriz (pacientes x regras) com os pontos de cada fator"""
+        columns = RiskScoreEngine.to_columns(records)
+        if not records:
+            return np.zeros((0, len(RULES)))
+        return np.column_stack([rule(columns) for _, rule in RULES]).astype(float)
+
+    @staticmethod
+    def levels(scores):
+        """Classifica um vetor de pontuações nos níveis BAIXO/MODERADO/ALTO/MUITO ALTO"""
+        scores = np.asarray(scores)
+        return np.select(
+            [scores >= limit for limit, _ in RISK_LEVELS],
+            [name for _, name in RISK_LEVELS],
+            default="BAIXO"
+        )
+
+    @staticmethod
+    def score_batch(records):
+        """Pontuações (0-100) e níveis de uma coorte inteira"""
+        points = RiskScoreEngine.points_matrix(records)
+        scores = np.clip(points.sum(axis=1), 0, 100).astype(int)
+        return scores, RiskScoreEngine.levels(scores)
+
+    @staticmethod
+    def score(data):
+        """
+        Pontua uma única avaliação.
+        Retorna {'score', 'level', 'factors'} com os fatores que pontuaram.
+        """
+        points = RiskScoreEngine.points_matrix([data])[0]
+        score = int(np.clip(points.sum(), 0, 100))
+        factors = [name for (name, _), pts in zip(RULES, points) if pts > 0]
+        return {
+            "score": score,
+            "level": str(RiskScoreEngine.levels([score])[0]),
+            "factors": factors,
+        }
@@ -0,0 +1,172 @@
+import os
+import time
+import sqlite3
+from datetime import datetime
+
+from Classes.Helpers import get_cache_dir
+
+# error_class gravado quando o usuário cancela a avaliação (não é falha da IA)
+CANCELLED_ERROR_CLASS = "AssessmentCancelled"
+
+
+def percentile(sorted_values, p):
+    """Percentil p (0-100) de uma lista já ordenada, ou None se vazia"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class TelemetryStore:
+    """
+    Telemetria local (SQLite) das avaliações com IA.
+
+    Cada chamada a AssessmentService gera uma linha com início/fim, tempo até
+    o primeiro trecho, tokens, modelo, acerto de cache e classe do erro, sem
+    dados clínicos. Linhas mais antigas que AI_TELEMETRY_DAYS são descartadas.
+    """
+
+    COLUMNS = (
+        "started_at", "ended_at", "ttft_seconds", "input_tokens", "output_tokens",
+        "cached_tokens", "model", "backend", "cache_hit", "coalesced",
+        "error_class", "user_id", "source",
+    )
+
+    def __init__(self, path=None, retention_days=None):
+        self.path = path or os.path.join(get_cache_dir(), "telemetry.sqlite3")
+        self.retention_seconds = (retention_days or float(os.getenv('AI_TELEMETRY_DAYS', '30'))) * 86400
+        self.create_table()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    def create_table(self):
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_calls (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    started_at REAL NOT NULL,
+                    ended_at REAL NOT NULL,
+                    ttft_seconds REAL,
+                    input_tokens INTEGER,
+                    output_tokens INTEGER,
+                    cached_tokens INTEGER,
+                    model TEXT,
+                    backend TEXT,
+                    cache_hit INTEGER NOT NULL DEFAULT 0,
+                    coalesced INTEGER NOT NULL DEFAULT 0,
+                    error_class TEXT,
+                    user_id INTEGER,
+                    source TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_calls_started ON ai_calls(started_at)")
+            conn.execute("DELETE FROM ai_calls WHERE started_at < ?", (time.time() - self.retention_seconds,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def record(self, **call):
+        """Grava uma chamada; campos ausentes ficam nulos. Falhas não interrompem a avaliação."""
+        call['cache_hit'] = bool(call.get('cache_hit'))
+        call['coalesced'] = bool(call.get('coalesced'))
+        values = [call.get(column) for column in self.COLUMNS]
+        try:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    f"INSERT INTO ai_calls ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                    [int(v) if isinstance(v, bool) else v for v in values]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            print(f"❌ Erro ao gravar telemetria da IA: {e}")
+
+    def _rows(self, since, until, user_id):
+        query = ("SELECT started_at, ended_at, ttft_seconds, input_tokens, output_tokens, "
+                 "cache_hit, error_class, user_id, coalesced "
+                 "FROM ai_calls WHERE started_at >= ? AND started_at < ?")
+        params = [since, until]
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        conn = self._connect()
+        try:
+            return conn.execute(query + " ORDER BY started_at", params).fetchall()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _summarize(rows, window_seconds):
+        """
+        Agrega as linhas: volume, erros, percentis de latência e vazão.
+        Cancelamentos pelo usuário são contados à parte, fora dos erros; chamadas
+        agrupadas (coalesced) esperaram a requisição de outra e ficam fora das
+        medidas de latência.
+        """
+        requests = [r for r in rows if not r[5] and not r[8]]
+        latencies = sorted(r[1] - r[0] for r in requests if r[6] is None)
+        ttfts = [r[2] for r in requests if r[2] is not None]
+        cancelled = sum(1 for r in rows if r[6] == CANCELLED_ERROR_CLASS)
+        errors = sum(1 for r in rows if r[6] is not None) - cancelled
+        completed = sum(1 for r in rows if r[6] is None)
+        attempted = len(rows) - cancelled
+        return {
+            'calls': len(rows),
+            'completed': completed,
+            'errors': errors,
+            'cancelled': cancelled,
+            'error_rate': errors / attempted if attempted else 0.0,
+            'cache_hits': sum(1 for r in rows if r[5]),
+            'coalesced': sum(1 for r in rows if r[8]),
+            'p50_seconds': percentile(latencies, 50),
+            'p95_seconds': percentile(latencies, 95),
+            'p99_seconds': percentile(latencies, 99),
+            'avg_ttft_seconds': sum(ttfts) / len(ttfts) if ttfts else None,
+            'input_tokens': sum(r[3] or 0 for r in rows),
+            'output_tokens': sum(r[4] or 0 for r in rows),
+            'throughput_per_minute': completed / (window_seconds / 60) if window_seconds > 0 else 0.0,
+        }
+
+    def summary(self, since=None, until=None, user_id=None):
+        """
+        Resumo das chamadas na janela [since, until) (timestamps; padrão: últimas
+        24h até agora), opcionalmente de um único usuário. Os percentis de
+        latência consideram apenas requisições à IA concluídas (sem cache, sem
+        agrupamento e sem erro).
+        """
+        until = until or time.time()
+        since = since if since is not None else until - 86400
+        summary = self._summarize(self._rows(since, until, user_id), until - since)
+        summary['since'] = since
+        summary['until'] = until
+        return summary
+
+    def summary_by(self, group='day', since=None, until=None):
+        """Resumos separados por dia ('day', AAAA-MM-DD) ou por usuário ('user')"""
+        until = until or time.time()
+        since = since if since is not None else until - 7 * 86400
+
+        groups = {}
+        for row in self._rows(since, until, None):
+            if group == 'day':
+                key = datetime.fromtimestamp(row[0]).strftime('%Y-%m-%d')
+            elif group == 'user':
+                key = row[7]
+            else:
+                raise ValueError(f"Agrupamento desconhecido: {group} (opções: day, user)")
+            groups.setdefault(key, []).append(row)
+
+        if group == 'day':
+            # Vazão pela duração do dia (ou do trecho dele dentro da janela)
+            result = {}
+            for key, rows in groups.items():
+                day_start = datetime.strptime(key, '%Y-%m-%d').timestamp()
+                window = min(until, day_start + 86400) - max(since, day_start)
+                result[key] = self._summarize(rows, window)
+            return result
+        return {key: self._summarize(rows, until - since) for key, rows in groups.items()}
@@ -13,8 +13,14 @@ class UserManagement(QWidget):
         super().__init__()
         self.db_manager = db_manager
         self.user = user
+        self.table_users = {}  # user_type -> lista exibida na tabela
+        self.loaded_state = {}  # user_type -> (include_inactive, users_version exibida)
         self.init_ui()
 
+        # Atualizações em tempo real via LISTEN/NOTIFY
+        if self.user["user_type"] == "admin" and getattr(self.db_manager, "listener", None):
+            self.db_manager.listener.user_changed.connect(self.on_user_changed)
+
     def init_ui(self):
         # Estilo moderno
         self.setStyleSheet("""
@@ -324,106 +330,117 @@ class UserManagement(QWidget):
             self.refresh_table("doctor")
             self.refresh_table("patient")
 
-    def refresh_table(self, user_type):
+    def refresh_table(self, user_type, force=False, primary=False):
         table = getattr(self, f"{user_type}_table")
-        count_label = getattr(self, f"{user_type}_count")
         show_inactive = getattr(self, f"{user_type}_show_inactive", None)
         
         include_inactive = show_inactive.isChecked() if show_inactive else False
-        users = self.db_manager.get_users_by_type(user_type, include_inactive)
+
+        # Nada mudou desde a última carga: mantém a tabela como está
+        version = self.db_manager.users_version(user_type)
+        if not force and self.loaded_state.get(user_type) == (include_inactive, version):
+            return
+
+        users = self.db_manager.get_users_by_type(user_type, include_inactive, primary=primary)
+        self.table_users[user_type] = users
+        self.loaded_state[user_type] = (include_inactive, version)
 
         table.setRowCount(len(users))
         
-        active_count = 0
-        inactive_count = 0
-        
         for i, user in enumerate(users):
-            is_active = user.get("is_active", True)
+            self.fill_user_row(table, i, user, user_type)
+        
+        self.update_count_label(user_type, include_inactive)
+
+    def fill_user_row(self, table, i, user, user_type):
+        """Preenche uma linha da tabela com os dados do usuário"""
+        is_active = user.get("is_active", True)
+        
+        # ID (oculto)
+        table.setItem(i, 0, QTableWidgetItem(str(user["id"])))
+        
+        # Nome
+        name_item = QTableWidgetItem(user["name"])
+        if not is_active:
+            name_item.setForeground(QColor("#95a5a6"))
+        table.setItem(i, 1, name_item)
+        
+        # Email
+        email_item = QTableWidgetItem(user["email"])
+        if not is_active:
+            email_item.setForeground(QColor("#95a5a6"))
+        table.setItem(i, 2, email_item)
+        
+        # CPF
+        cpf_item = QTableWidgetItem(user.get("cpf", "N/A"))
+        if not is_active:
+            cpf_item.setForeground(QColor("#95a5a6"))
+        table.setItem(i, 3, cpf_item)
+        
+        if user_type == "admin":
+            # Data de criação
+            date_item = QTableWidgetItem(user["created_at"].strftime("%d/%m/%Y %H:%M"))
+            if not is_active:
+                date_item.setForeground(QColor("#95a5a6"))
+            table.setItem(i, 4, date_item)
+                
+        elif user_type == "doctor":
+            # CRM
+            crm_item = QTableWidgetItem(user.get("crm", "N/A"))
+            if not is_active:
+                crm_item.setForeground(QColor("#95a5a6"))
+            table.setItem(i, 4, crm_item)
             
-            if is_active:
-                active_count += 1
-            else:
-                inactive_count += 1
+            # Especialidade
+            specialty_item = QTableWidgetItem(user.get("specialty", "N/A"))
+            if not is_active:
+                specialty_item.setForeground(QColor("#95a5a6"))
+            table.setItem(i, 5, specialty_item)
             
-            # ID (oculto)
-            table.setItem(i, 0, QTableWidgetItem(str(user["id"])))
+            # Status
+            status_item = QTableWidgetItem("✅ Ativo" if is_active else "❌ Inativo")
+            status_item.setForeground(QColor("#27ae60") if is_active else QColor("#e74c3c"))
+            table.setItem(i, 6, status_item)
             
-            # Nome
-            name_item = QTableWidgetItem(user["name"])
+            # Data de criação
+            date_item = QTableWidgetItem(user["created_at"].strftime("%d/%m/%Y"))
             if not is_active:
-                name_item.setForeground(QColor("#95a5a6"))
-            table.setItem(i, 1, name_item)
-            
-            # Email
-            email_item = QTableWidgetItem(user["email"])
+                date_item.setForeground(QColor("#95a5a6"))
+            table.setItem(i, 7, date_item)
+                
+        else:  # patient
+            # Data de nascimento
+            birth_date = user.get("birth_date")
+            birth_str = birth_date.strftime("%d/%m/%Y") if birth_date else "N/A"
+            birth_item = QTableWidgetItem(birth_str)
             if not is_active:
-                email_item.setForeground(QColor("#95a5a6"))
-            table.setItem(i, 2, email_item)
+                birth_item.setForeground(QColor("#95a5a6"))
+            table.setItem(i, 4, birth_item)
             
-            # CPF
-            cpf_item = QTableWidgetItem(user.get("cpf", "N/A"))
+            # Telefone
+            phone_item = QTableWidgetItem(user.get("phone", "N/A"))
             if not is_active:
-                cpf_item.setForeground(QColor("#95a5a6"))
-            table.setItem(i, 3, cpf_item)
+                phone_item.setForeground(QColor("#95a5a6"))
+            table.setItem(i, 5, phone_item)
             
-            if user_type == "admin":
-                # Data de criação
-                date_item = QTableWidgetItem(user["created_at"].strftime("%d/%m/%Y %H:%M"))
-                if not is_active:
-                    date_item.setForeground(QColor("#95a5a6"))
-                table.setItem(i, 4, date_item)
-                    
-            elif user_type == "doctor":
-                # CRM
-                crm_item = QTableWidgetItem(user.get("crm", "N/A"))
-                if not is_active:
-                    crm_item.setForeground(QColor("#95a5a6"))
-                table.setItem(i, 4, crm_item)
-                
-                # Especialidade
-                specialty_item = QTableWidgetItem(user.get("specialty", "N/A"))
-                if not is_active:
-                    specialty_item.setForeground(QColor("#95a5a6"))
-                table.setItem(i, 5, specialty_item)
-                
-                # Status
-                status_item = QTableWidgetItem("✅ Ativo" if is_active else "❌ Inativo")
-                status_item.setForeground(QColor("#27ae60") if is_active else QColor("#e74c3c"))
-                table.setItem(i, 6, status_item)
-                
-                # Data de criação
-                date_item = QTableWidgetItem(user["created_at"].strftime("%d/%m/%Y"))
-                if not is_active:
-                    date_item.setForeground(QColor("#95a5a6"))
-                table.setItem(i, 7, date_item)
-                    
-            else:  # patient
-                # Data de nascimento
-                birth_date = user.get("birth_date")
-                birth_str = birth_date.strftime("%d/%m/%Y") if birth_date else "N/A"
-                birth_item = QTableWidgetItem(birth_str)
-                if not is_active:
-                    birth_item.setForeground(QColor("#95a5a6"))
-                table.setItem(i, 4, birth_item)
-                
-                # Telefone
-                phone_item = QTableWidgetItem(user.get("phone", "N/A"))
-                if not is_active:
-                    phone_item.setForeground(QColor("#95a5a6"))
-                table.setItem(i, 5, phone_item)
-                
-                # Status
-                status_item = QTableWidgetItem("✅ Ativo" if is_active else "❌ Inativo")
-                status_item.setForeground(QColor("#27ae60") if is_active else QColor("#e74c3c"))
-                table.setItem(i, 6, status_item)
-                
-                # Data de criação
-                date_item = QTableWidgetItem(user["created_at"].strftime("%d/%m/%Y"))
-                if not is_active:
-                    date_item.setForeground(QColor("#95a5a6"))
-                table.setItem(i, 7, date_item)
-        
-        # Atualiza contagem
+            # Status
+            status_item = QTableWidgetItem("✅ Ativo" if is_active else "❌ Inativo")
+            status_item.setForeground(QColor("#27ae60") if is_active else QColor("#e74c3c"))
+            table.setItem(i, 6, status_item)
+            
+            # Data de criação
+            date_item = QTableWidgetItem(user["created_at"].strftime("%d/%m/%Y"))
+            if not is_active:
+                date_item.setForeground(QColor("#95a5a6"))
+            table.setItem(i, 7, date_item)
+
+    def update_count_label(self, user_type, include_inactive):
+        """Atualiza o label de contagem a partir dos usuários carregados"""
+        count_label = getattr(self, f"{user_type}_count")
+        users = self.table_users.get(user_type, [])
+        active_count = sum(1 for u in users if u.get("is_active", True))
+        inactive_count = len(users) - active_count
+
         if include_inactive:
             count_label.setText(
                 f"Total: {len(users)} registro(s) - "
@@ -432,6 +449,35 @@ class UserManagement(QWidget):
         else:
             count_label.setText(f"Total: {active_count} registro(s) ativos")
 
+    def on_user_changed(self, payload):
+        """Aplica a alteração de um único usuário notificada pelo banco"""
+        user_type = payload.get("user_type")
+        table = getattr(self, f"{user_type}_table", None)
+        if table is None:
+            return
+
+        show_inactive = getattr(self, f"{user_type}_show_inactive", None)
+        include_inactive = show_inactive.isChecked() if show_inactive else False
+        users = self.table_users.get(user_type, [])
+        row = next((i for i, u in enumerate(users) if u["id"] == payload.get("id")), None)
+        still_visible = include_inactive or payload.get("is_active", True)
+
+        # Lê do primário: a réplica pode ainda não ter recebido a alteração notificada
+        # Inserções e linhas que entram/saem do filtro mudam a ordenação: recarrega a aba
+        if row is None or not still_visible:
+            self.refresh_table(user_type, force=True, primary=True)
+            return
+
+        user = self.db_manager.get_user_by_id(payload["id"], primary=True)
+        if not user:
+            self.refresh_table(user_type, force=True, primary=True)
+            return
+
+        users[row] = dict(user)
+        self.fill_user_row(table, row, users[row], user_type)
+        self.update_count_label(user_type, include_inactive)
+        self.loaded_state[user_type] = (include_inactive, self.db_manager.users_version(user_type))
+
     def add_user(self, user_type):
         dialog = UserDialog(self.db_manager, user_type, current_user=self.user)
         if dialog.exec_():
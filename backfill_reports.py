@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Reavaliação de Relatórios (Backfill)
+Refaz pela IA os relatórios gerados com uma versão anterior do prompt ou
+com outro modelo e salva os resultados como novas versões, retomando de
+onde parou se for interrompido.
+
+Exemplos:
+    python backfill_reports.py --dry-run
+    python backfill_reports.py --concurrency 8 --limit 500
+    python backfill_reports.py --doctor-id 3 --mock-url http://localhost:8765
+"""
+
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+# Carrega variáveis de ambiente
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reavaliação de relatórios após mudança de prompt ou modelo")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Apenas estima quantidade, tokens, custo e duração, sem chamar a IA")
+    parser.add_argument("--doctor-id", type=int, help="Reavalia apenas os relatórios deste médico")
+    parser.add_argument("--concurrency", type=int, default=4, help="Avaliações simultâneas (padrão: 4)")
+    parser.add_argument("--page-size", type=int, default=20,
+                        help="Relatórios por página entre checkpoints (padrão: 20)")
+    parser.add_argument("--limit", type=int, help="Máximo de relatórios reavaliados nesta execução")
+    parser.add_argument("--checkpoint", default="backfill_checkpoint.json",
+                        help="Arquivo de progresso para retomar o backfill")
+    parser.add_argument("--price-input", type=float, default=float(os.getenv("AI_PRICE_INPUT_PER_MTOK", "0.10")),
+                        help="Preço em US$ por milhão de tokens de entrada (estimativa)")
+    parser.add_argument("--price-output", type=float, default=float(os.getenv("AI_PRICE_OUTPUT_PER_MTOK", "0.40")),
+                        help="Preço em US$ por milhão de tokens de saída (estimativa)")
+    parser.add_argument("--mock-url", help="Usa o servidor de IA simulada (Classes/MockAIServer.py)")
+    args = parser.parse_args()
+
+    if args.mock_url:
+        # Precisa ser definido antes da criação do cliente da IA
+        os.environ["HIPAI_AI_BACKEND"] = "mock"
+        os.environ["AI_MOCK_URL"] = args.mock_url
+
+    from Classes.DatabaseManager import DatabaseManager
+    from Classes.ReportBackfillRunner import ReportBackfillRunner
+
+    db_manager = DatabaseManager()
+    if not db_manager.connection_pool:
+        print("❌ ERRO: Não foi possível inicializar o pool de conexões!")
+        return 1
+
+    try:
+        runner = ReportBackfillRunner(
+            db_manager,
+            concurrency=args.concurrency,
+            page_size=args.page_size,
+            doctor_id=args.doctor_id,
+            # A simulação não deve criar nem alterar o checkpoint
+            checkpoint_path=None if args.dry_run else args.checkpoint
+        )
+        target = runner.target
+        print(f"🎯 Versão alvo: prompt {target['prompt_version']} · modelo {target['model']}")
+
+        if args.dry_run:
+            estimate = runner.estimate(args.price_input, args.price_output)
+            print("\n" + "=" * 60)
+            print(f"📋 Relatórios a reavaliar: {estimate['reports']}")
+            print(f"🔢 Tokens estimados: {estimate['input_tokens']:,} entrada · {estimate['output_tokens']:,} saída")
+            print(f"💰 Custo estimado: US$ {estimate['cost_usd']:.2f}")
+            print(f"⏱️ Duração mínima pelos limites de taxa: {estimate['min_minutes']:.1f} min")
+            print("=" * 60)
+            return 0
+
+        summary = runner.run(limit=args.limit)
+
+        print("\n" + "=" * 60)
+        print(f"✅ Reavaliados: {summary['completed']}  ❌ Falhas: {summary['failed']}  "
+              f"📍 Checkpoint: relatório #{summary['last_id']}")
+        print(f"⏱️ Tempo total: {summary['elapsed_seconds']:.1f}s  ·  "
+              f"🚀 {summary['throughput_per_minute']:.1f} relatórios/min")
+        if summary["p50_seconds"] is not None:
+            print(f"📊 Latência por relatório: p50 {summary['p50_seconds']:.1f}s · p95 {summary['p95_seconds']:.1f}s")
+        if summary["input_tokens"] is not None:
+            print(f"🔢 Tokens no período: {summary['input_tokens']:,} entrada · {summary['output_tokens']:,} saída")
+        print("=" * 60)
+        if summary["failed"]:
+            # As falhas ficam no checkpoint e são refeitas primeiro na próxima execução
+            print("💡 Para tentar de novo os que falharam, execute o mesmo comando outra vez")
+        return 0 if summary["failed"] == 0 else 2
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    finally:
+        db_manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
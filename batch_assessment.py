@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Avaliação de Risco em Lote
+Avalia um painel de pacientes sem interface gráfica, a partir do último
+relatório de cada um, e salva os resultados no banco.
+
+Exemplos:
+    python batch_assessment.py --doctor-id 3 --ids 10 11 12
+    python batch_assessment.py --doctor-id 3 --file pacientes.txt --concurrency 8 --rpm 60
+    python batch_assessment.py --doctor-id 3 --cpfs 12345678901 --mock-url http://localhost:8765
+"""
+
+import os
+import sys
+import argparse
+from dotenv import load_dotenv
+
+# Carrega variáveis de ambiente
+load_dotenv()
+
+
+def read_patient_file(path):
+    """Lê um arquivo com um ID ou CPF por linha (CPFs têm 11 dígitos)"""
+    ids, cpfs = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            value = line.strip().replace(".", "").replace("-", "")
+            if not value or value.startswith("#"):
+                continue
+            if len(value) == 11:
+                cpfs.append(value)
+            else:
+                ids.append(int(value))
+    return ids, cpfs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Avaliação de risco de hipertensão em lote")
+    parser.add_argument("--doctor-id", type=int, required=True, help="Médico responsável pelos relatórios")
+    parser.add_argument("--ids", type=int, nargs="*", default=[], help="IDs dos pacientes")
+    parser.add_argument("--cpfs", nargs="*", default=[], help="CPFs dos pacientes")
+    parser.add_argument("--file", help="Arquivo com um ID ou CPF por linha")
+    parser.add_argument("--concurrency", type=int, default=4, help="Avaliações simultâneas (padrão: 4)")
+    parser.add_argument("--rpm", type=int,
+                        help="Máximo de chamadas à IA por minuto (padrão: AI_RATE_RPM)")
+    parser.add_argument("--checkpoint", default="batch_checkpoint.json",
+                        help="Arquivo de progresso para retomar o lote")
+    parser.add_argument("--mock-url", help="Usa o servidor de IA simulada (Classes/MockAIServer.py)")
+    args = parser.parse_args()
+
+    if args.mock_url:
+        # Precisa ser definido antes da criação do cliente da IA
+        os.environ["HIPAI_AI_BACKEND"] = "mock"
+        os.environ["AI_MOCK_URL"] = args.mock_url
+    if args.rpm:
+        # Limite único: o agendador de requisições lê AI_RATE_RPM ao ser criado
+        os.environ["AI_RATE_RPM"] = str(args.rpm)
+
+    from Classes.DatabaseManager import DatabaseManager
+    from Classes.BatchAssessmentRunner import BatchAssessmentRunner
+
+    ids, cpfs = list(args.ids), list(args.cpfs)
+    if args.file:
+        file_ids, file_cpfs = read_patient_file(args.file)
+        ids += file_ids
+        cpfs += file_cpfs
+
+    if not ids and not cpfs:
+        print("❌ Nenhum paciente informado (use --ids, --cpfs ou --file)")
+        return 1
+
+    db_manager = DatabaseManager()
+    if not db_manager.connection_pool:
+        print("❌ ERRO: Não foi possível inicializar o pool de conexões!")
+        return 1
+
+    try:
+        doctor = db_manager.get_user_by_id(args.doctor_id)
+        if not doctor or doctor["user_type"] != "doctor":
+            print(f"❌ Médico ID {args.doctor_id} não encontrado")
+            return 1
+
+        runner = BatchAssessmentRunner(
+            db_manager,
+            args.doctor_id,
+            concurrency=args.concurrency,
+            checkpoint_path=args.checkpoint
+        )
+        summary = runner.run(ids, cpfs)
+
+        print("\n" + "=" * 60)
+        print(f"✅ Concluídos: {summary['completed']}  ❌ Falhas: {summary['failed']}  "
+              f"↪️ Já processados: {summary['skipped']}")
+        print(f"⏱️ Tempo total: {summary['elapsed_seconds']:.1f}s")
+        print("=" * 60)
+        return 0 if summary["failed"] == 0 else 2
+    finally:
+        db_manager.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
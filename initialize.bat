@@ -217,6 +217,7 @@ if %errorlevel% neq 0 (
     pip install cryptography==41.0.5
     pip install python-dotenv==1.0.0
     pip install reportlab==4.4.5
+    pip install numpy==1.26.4
     if %errorlevel% neq 0 (
         echo [ERRO] Falha ao instalar as dependencias Python.
         pause
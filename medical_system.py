@@ -29,6 +29,12 @@ def main():
         # 2. Apenas texto atualizado
         print("Conexão PostgreSQL OK")
 
+        # Escuta alterações em relatórios/usuários para atualizar as telas abertas
+        db_manager.start_listener()
+
+        # Refaz e salva as avaliações que ficaram pendentes por falta de conexão
+        db_manager.start_offline_drainer()
+
         # Mostra tela de login
         print("Abrindo tela de login...")
         login_window = LoginWindow(db_manager)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Treinamento do Modelo de Risco Local
+Ajusta uma regressão logística às pontuações da IA nos relatórios salvos,
+avalia a concordância com a IA em pacientes separados para teste e grava
+o modelo usado como segunda opinião na tela de avaliação.
+
+Exemplos:
+    python train_risk_model.py
+    python train_risk_model.py --test-fraction 0.3 --report avaliacao_modelo.json
+"""
+
+import sys
+import json
+import argparse
+import numpy as np
+from dotenv import load_dotenv
+
+# Carrega variáveis de ambiente
+load_dotenv()
+
+MIN_SAMPLES = 30
+
+
+def split_by_patient(patients, test_fraction, seed):
+    """Máscara de teste sorteada por paciente: relatórios do mesmo paciente ficam do mesmo lado"""
+    unique = np.unique(patients)
+    rng = np.random.default_rng(seed)
+    test_patients = rng.choice(unique, size=max(1, int(round(len(unique) * test_fraction))), replace=False)
+    return np.isin(patients, test_patients)
+
+
+def print_report(evaluation):
+    print("\n" + "=" * 60)
+    print(f"📋 Avaliação em {evaluation['samples']} relatório(s) de teste")
+    print(f"{'':24}{'Modelo':>12}{'Regras':>12}")
+    print(f"{'Erro médio (pontos)':24}{evaluation['mae_score']:>12.1f}{evaluation['rules_mae_score']:>12.1f}")
+    print(f"{'Mesmo nível da IA':24}{evaluation['level_agreement']:>12.1%}{evaluation['rules_level_agreement']:>12.1%}")
+    print(f"{'Kappa':24}{evaluation['kappa']:>12.2f}{evaluation['rules_kappa']:>12.2f}")
+    print(f"{'Até um nível de distância':24}{evaluation['within_one_level']:>12.1%}")
+    print("\nMatriz de confusão (linhas: IA, colunas: modelo)")
+    levels = list(evaluation["confusion"])
+    print(f"{'':12}" + "".join(f"{level:>12}" for level in levels))
+    for expected, row in evaluation["confusion"].items():
+        print(f"{expected:12}" + "".join(f"{row[level]:>12}" for level in levels))
+    print("=" * 60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Treina o modelo de risco local com os relatórios da IA")
+    parser.add_argument("--test-fraction", type=float, default=0.2,
+                        help="Fração dos pacientes separada para avaliação (padrão: 0.2)")
+    parser.add_argument("--epochs", type=int, default=2000, help="Iterações do gradiente descendente")
+    parser.add_argument("--learning-rate", type=float, default=0.5)
+    parser.add_argument("--l2", type=float, default=1e-3, help="Regularização L2")
+    parser.add_argument("--seed", type=int, default=42, help="Semente da separação treino/teste")
+    parser.add_argument("--output", help="Arquivo do modelo (padrão: AI_RISK_MODEL_PATH ou o diretório de cache)")
+    parser.add_argument("--report", help="Grava o relatório de avaliação em JSON")
+    args = parser.parse_args()
+
+    from Classes.DatabaseManager import DatabaseManager
+    from Classes.RiskModel import RiskModel
+
+    db_manager = DatabaseManager()
+    if not db_manager.connection_pool:
+        print("❌ ERRO: Não foi possível inicializar o pool de conexões!")
+        return 1
+
+    try:
+        print("📥 Lendo relatórios salvos...")
+        records, scores, levels, patients = RiskModel.training_set(db_manager.iter_current_reports())
+    finally:
+        db_manager.close()
+
+    if len(records) < MIN_SAMPLES:
+        print(f"❌ Apenas {len(records)} relatório(s) com pontuação da IA; são necessários ao menos {MIN_SAMPLES}")
+        return 1
+
+    test = split_by_patient(patients, args.test_fraction, args.seed)
+    train = ~test
+    print(f"🧮 Treinando com {train.sum()} relatório(s); {test.sum()} reservado(s) para teste")
+
+    def subset(mask):
+        return [r for r, keep in zip(records, mask) if keep]
+
+    model = RiskModel.fit(subset(train), scores[train], args.epochs, args.learning_rate, args.l2)
+    evaluation = model.evaluate(subset(test), scores[test], levels[test])
+    print_report(evaluation)
+
+    # O modelo final usa todos os relatórios; as métricas guardadas são as do teste acima
+    model = RiskModel.fit(records, scores, args.epochs, args.learning_rate, args.l2)
+    model.metrics = evaluation
+    path = model.save(args.output)
+    print(f"✅ Modelo salvo em {path}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(evaluation, f, ensure_ascii=False, indent=2)
+        print(f"📄 Relatório de avaliação salvo em {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())